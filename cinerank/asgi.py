@@ -13,4 +13,6 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cinerank.settings')
 
+# Las vistas de lectura asíncronas (Motor) solo se usan con CINERANK_VISTAS_ASYNC=1: ver VISTAS_ASYNC en settings
+
 application = get_asgi_application()
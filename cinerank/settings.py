@@ -4,7 +4,7 @@ Django settings for cinerank project.
 
 from pathlib import Path
 import os
-import mongoengine
+
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -35,6 +35,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.metricas.MetricasMongoMiddleware',  # Lo antes posible para medir la petición entera
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -84,11 +85,122 @@ DATABASES = {
 
 # 3. Conecta a MongoDB directamente con MongoEngine
 # Esto va al final de tu settings.py
-mongoengine.connect(
-    db='peliculas_db',
-    host='localhost',
-    port=27017
-)
+MONGO_DB = os.environ.get('MONGO_DB', 'peliculas_db')
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017')
+
+# Opciones del cliente (las mismas para MongoEngine y para Motor en core/asincrono.py):
+# tamaño del pool por proceso, cuánto se espera por una conexión libre o por un servidor disponible,
+# timeouts de socket (0 = sin límite) y compresión en el cable ('zstd,snappy,zlib'; vacío = sin comprimir)
+MONGO_OPCIONES = {opcion: valor for opcion, valor in {
+    'maxPoolSize': int(os.environ.get('MONGO_POOL_MAX', 100)),
+    'minPoolSize': int(os.environ.get('MONGO_POOL_MIN', 0)),
+    'maxIdleTimeMS': int(os.environ.get('MONGO_POOL_INACTIVIDAD_MS', 0)) or None,
+    'waitQueueTimeoutMS': int(os.environ.get('MONGO_ESPERA_POOL_MS', 5000)) or None,
+    'serverSelectionTimeoutMS': int(os.environ.get('MONGO_SELECCION_SERVIDOR_MS', 5000)),
+    'connectTimeoutMS': int(os.environ.get('MONGO_CONEXION_MS', 5000)),
+    'socketTimeoutMS': int(os.environ.get('MONGO_SOCKET_MS', 0)) or None,
+    'compressors': [c for c in os.environ.get('MONGO_COMPRESION', '').split(',') if c] or None,
+    'appname': 'cinerank',
+}.items() if valor is not None}
+
+# Preferencia de lectura de las vistas del catálogo, rankings y estadísticas (core/conexion.py):
+# primary, primaryPreferred, secondary, secondaryPreferred o nearest. Las escrituras, las lecturas de lo
+# que acaba de escribir el usuario, los contadores de generación y lo que se cachea bajo ellos van
+# siempre al primario.
+MONGO_LECTURA_CATALOGO = os.environ.get('MONGO_LECTURA_CATALOGO', 'primary')
+
+# La conexión de MongoEngine se registra en CoreConfig.ready() (core/apps.py), junto con los listeners
+# de métricas: el cliente no se crea hasta la primera consulta, así los comandos de gestión que no usan
+# Mongo no lo necesitan.
+
+# Vistas de lectura asíncronas (core/vistas_async.py con Motor): solo con CINERANK_VISTAS_ASYNC=1 y
+# sirviendo con ASGI (un cliente de Motor no sirve fuera de su bucle). No son las de por defecto: medidas
+# con mongomock dan la mitad de peticiones por segundo que las síncronas con gunicorn; antes de activarlas
+# en producción hay que medirlas contra un mongod de verdad.
+VISTAS_ASYNC = os.environ.get('CINERANK_VISTAS_ASYNC') == '1'
+if VISTAS_ASYNC:
+    ROOT_URLCONF = 'cinerank.urls_async'
+
+# Métricas de Mongo por petición: fracción de peticiones medidas (0 las desactiva), cuántos comandos
+# lentos se detallan y si se devuelven en la cabecera Server-Timing además de en el log.
+# Server-Timing enseña nombres de comandos y colecciones a cualquiera: por defecto solo con DEBUG.
+METRICAS_MONGO_MUESTREO = float(os.environ.get('METRICAS_MONGO_MUESTREO', 0.1))
+METRICAS_MONGO_LENTOS = int(os.environ.get('METRICAS_MONGO_LENTOS', 3))
+METRICAS_MONGO_SERVER_TIMING = os.environ.get('METRICAS_MONGO_SERVER_TIMING', '1' if DEBUG else '0') == '1'
+
+# Token para ver el detalle de /salud/mongo/ sin ser superusuario (cabecera 'Authorization: Bearer <token>').
+# Vacío: solo los superusuarios; los demás solo ven si Mongo responde.
+SALUD_MONGO_TOKEN = os.environ.get('SALUD_MONGO_TOKEN', '')
+
+# Segundos que se reutiliza el snapshot del panel de estadísticas.
+# Se invalida antes si entra una valoración nueva.
+ESTADISTICAS_CACHE_TTL = int(os.environ.get('ESTADISTICAS_CACHE_TTL', 300))
+
+# Paginación del catálogo (home y series): tamaño por defecto y máximo admitido en ?por_pagina=
+CATALOGO_TAMANO_PAGINA = int(os.environ.get('CATALOGO_TAMANO_PAGINA', 24))
+CATALOGO_TAMANO_PAGINA_MAX = int(os.environ.get('CATALOGO_TAMANO_PAGINA_MAX', 96))
+
+# Reseñas que se muestran por página en la ficha de un elemento
+DETALLE_RESENAS_POR_PAGINA = int(os.environ.get('DETALLE_RESENAS_POR_PAGINA', 20))
+
+# Búsqueda (?q=): candidatos que se leen del índice como máximo antes de ordenarlos por relevancia
+BUSQUEDA_MAX_CANDIDATOS = int(os.environ.get('BUSQUEDA_MAX_CANDIDATOS', 500))
+
+# Autocompletado: sugerencias por defecto y máximo en ?limite=, claves recorridas por sugerencia pedida
+# y cada cuántos segundos se mira en Mongo si otro proceso ha cambiado el catálogo
+AUTOCOMPLETAR_LIMITE = int(os.environ.get('AUTOCOMPLETAR_LIMITE', 8))
+AUTOCOMPLETAR_LIMITE_MAX = int(os.environ.get('AUTOCOMPLETAR_LIMITE_MAX', 25))
+AUTOCOMPLETAR_RECORRIDO = int(os.environ.get('AUTOCOMPLETAR_RECORRIDO', 20))
+AUTOCOMPLETAR_VERSION_INTERVALO = float(os.environ.get('AUTOCOMPLETAR_VERSION_INTERVALO', 2))
+
+# Títulos que se muestran de cada categoría en /categorias/ (ampliable con ?top= hasta el máximo)
+CATEGORIAS_TOP_ELEMENTOS = int(os.environ.get('CATEGORIAS_TOP_ELEMENTOS', 12))
+CATEGORIAS_TOP_ELEMENTOS_MAX = int(os.environ.get('CATEGORIAS_TOP_ELEMENTOS_MAX', 60))
+
+# Títulos por categoría en el panel de ranking (?por_pagina= hasta el máximo); el resto, paginando la categoría
+PANEL_RANKING_POR_PAGINA = int(os.environ.get('PANEL_RANKING_POR_PAGINA', 25))
+PANEL_RANKING_POR_PAGINA_MAX = int(os.environ.get('PANEL_RANKING_POR_PAGINA_MAX', 200))
+
+# Segundos que se reutiliza la lista de géneros de la barra lateral de cada tipo
+CATEGORIAS_CACHE_TTL = int(os.environ.get('CATEGORIAS_CACHE_TTL', 600))
+
+# Cada cuántos segundos mira cada proceso si las categorías han cambiado (contador de generación en Mongo)
+CATEGORIAS_VERSION_INTERVALO = float(os.environ.get('CATEGORIAS_VERSION_INTERVALO', 2))
+
+# Ranking global: modo por defecto (ponderada, bayesiana, wilson o promedio) y elementos guardados por clasificación
+RANKING_MODO = os.environ.get('RANKING_MODO', 'ponderada')
+RANKING_TAMANO = int(os.environ.get('RANKING_TAMANO', 100))
+
+# Votos "de la media del catálogo" que se suman a cada elemento en la nota ponderada (la m de IMDb)
+# y votos ficticios por estrella del prior de la media bayesiana
+RANKING_VOTOS_MINIMOS = int(os.environ.get('RANKING_VOTOS_MINIMOS', 10))
+RANKING_PRIOR_BAYESIANO = int(os.environ.get('RANKING_PRIOR_BAYESIANO', 2))
+
+# Caché compartida: locmem (por defecto, un proceso), file (varios procesos en la misma máquina)
+# o redis (varias máquinas). Con locmem cada worker tiene su propia copia de las páginas cacheadas.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+if CACHE_BACKEND == 'redis':
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'redis://127.0.0.1:6379'),
+    }}
+elif CACHE_BACKEND == 'file':
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', str(BASE_DIR / 'cache')),
+    }}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Segundos que se guardan las páginas de anónimos y los fragmentos HTML cacheados.
+# Caducan antes si cambia el catálogo, las categorías o las valoraciones (contadores de generación).
+PAGINAS_CACHE_TTL = int(os.environ.get('PAGINAS_CACHE_TTL', 600))
+
+# Procesos con los que importar_csv reparte cada archivo subido (1 = en el propio hilo de la importación)
+IMPORTACION_PROCESOS = int(os.environ.get('IMPORTACION_PROCESOS', 1))
+
+# Segundos sin latido tras los que una importación pendiente o en curso se da por perdida (worker reciclado)
+IMPORTACION_LATIDO_MAXIMO = int(os.environ.get('IMPORTACION_LATIDO_MAXIMO', 300))
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -135,4 +247,16 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Al final de settings.py
 LOGIN_REDIRECT_URL = '/'  # Al entrar, ir a la portada
-LOGOUT_REDIRECT_URL = '/' # Al salir, ir a la portada
\ No newline at end of file
+LOGOUT_REDIRECT_URL = '/' # Al salir, ir a la portada
+
+# La línea JSON de core.metricas sale por consola (el resto de loggers, como venía por defecto)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.metricas': {'handlers': ['console'], 'level': os.environ.get('METRICAS_MONGO_LOG', 'INFO')},
+    },
+}
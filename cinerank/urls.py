@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.urls import path
 from django.conf import settings
 from django.conf.urls.static import static
-from core import views
+from core import api, views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -10,17 +10,30 @@ urlpatterns = [
     # --- RUTAS PRINCIPALES ---
     path('', views.home, name='home'),
     path('series/', views.lista_series, name='series'),
+    path('autocompletar/', views.autocompletar, name='autocompletar'),
     path('ranking/', views.ranking_global, name='ranking_global'),
     path('categorias/', views.lista_categorias, name='lista_categorias'),
 
     path('ranking-gestion/', views.panel_ranking, name='panel_ranking'),
     path('ranking-gestion/cambiar/<str:item_id>/<str:accion>/', views.cambiar_ranking, name='cambiar_ranking'),
+    path('ranking-gestion/ordenar/<str:categoria_id>/', views.ordenar_categoria, name='ordenar_categoria'),
 
     path('mis-listas/', views.mis_rankings, name='mis_rankings'),
     path('agregar-a-ranking/<id_elemento>/', views.agregar_a_ranking, name='agregar_a_ranking'),
     path('mis-listas/<str:ranking_id>/', views.detalle_ranking_personal, name='detalle_ranking_personal'),
+    path('mis-listas/<str:ranking_id>/quitar/<str:elemento_id>/', views.quitar_de_ranking, name='quitar_de_ranking'),
+    path('mis-listas/<str:ranking_id>/mover/<str:elemento_id>/', views.mover_en_ranking, name='mover_en_ranking'),
 
     path('estadisticas/', views.panel_estadisticas, name='estadisticas'),
+    path('salud/mongo/', views.salud_mongo, name='salud_mongo'),
+
+    # --- API JSON (v1, solo lectura) ---
+    path('api/v1/elementos/', api.elementos, name='api_elementos'),
+    path('api/v1/elementos/<str:elemento_id>/', api.elemento, name='api_elemento'),
+    path('api/v1/elementos/<str:elemento_id>/valoraciones/', api.valoraciones, name='api_valoraciones'),
+    path('api/v1/categorias/', api.categorias, name='api_categorias'),
+    path('api/v1/rankings/global/', api.ranking_global, name='api_ranking_global'),
+    path('api/v1/rankings/mios/', api.mis_rankings, name='api_mis_rankings'),
 
 
     # MongoDB usa IDs alfanuméricos, así que usamos 'str' en lugar de 'int'
@@ -35,6 +48,7 @@ urlpatterns = [
     path('admin-panel/crear-elemento/', views.crear_elemento, name='crear_elemento'),
     path('admin-panel/crear-categoria/', views.crear_categoria, name='crear_categoria'),
     path('admin-panel/importar-csv/', views.importar_csv, name='importar_csv'),
+    path('admin-panel/importar-csv/estado/<str:trabajo_id>/', views.estado_importacion, name='estado_importacion'),
 
     path('eliminar-elemento/<str:elemento_id>/', views.eliminar_elemento, name='eliminar_elemento'),
     path('eliminar-categoria/<str:categoria_id>/', views.eliminar_categoria, name='eliminar_categoria'),
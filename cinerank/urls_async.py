@@ -0,0 +1,17 @@
+from django.urls import path
+
+from core import vistas_async
+
+from .urls import urlpatterns as urlpatterns_sincronas
+
+# Mismas rutas que cinerank/urls.py, pero las lecturas del catálogo van por las vistas asíncronas.
+# Se activa con CINERANK_VISTAS_ASYNC=1 (ver VISTAS_ASYNC en settings).
+asincronas = [
+    path('', vistas_async.home, name='home'),
+    path('series/', vistas_async.lista_series, name='series'),
+    path('ranking/', vistas_async.ranking_global, name='ranking_global'),
+    path('elemento/<str:elemento_id>/', vistas_async.detalle_elemento, name='detalle'),
+]
+
+_sustituidas = {ruta.name for ruta in asincronas}
+urlpatterns = asincronas + [ruta for ruta in urlpatterns_sincronas if getattr(ruta, 'name', None) not in _sustituidas]
@@ -0,0 +1,265 @@
+import datetime
+import hashlib
+import json
+from functools import wraps
+from urllib.parse import urlencode
+
+from bson import ObjectId
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+
+from .cache_paginas import (GEN_CATALOGO, GEN_CATEGORIAS, GEN_VALORACIONES, dependencias_ranking, gen_elemento,
+                            gen_rankings_usuario, versiones)
+from .categorias import obtener_categoria, obtener_categorias
+from .conexion import desde_primario, lectura_catalogo
+from .models import Elemento, Ranking, Valoracion
+from .paginacion import paginar_por_cursor, paginar_por_fecha, tamano_pagina
+from .rankings import MODOS, clasificacion_en_vivo, obtener_clasificacion
+
+try:
+    import orjson  # Dependencia opcional: serializa bastante más rápido que json
+except ImportError:
+    orjson = None
+
+# --- API JSON DE SOLO LECTURA (v1) ---
+# Cada respuesta lleva un ETag fuerte calculado con los contadores de generación de los que depende
+# (y la ruta con sus parámetros). Si el cliente manda el mismo en If-None-Match se responde 304 sin
+# leer nada más de Mongo; si no, el cuerpo también se guarda en caché bajo ese ETag.
+
+CAMPOS_ELEMENTO = ('titulo', 'anio', 'descripcion', 'imagen_url', 'tipo', 'categoria', 'director', 'actores',
+                   'orden', 'fecha_creacion', 'resumen')
+
+
+class ErrorAPI(Exception):
+    def __init__(self, mensaje, estado=400):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+# --- SERIALIZACIÓN ---
+def _por_defecto(valor):
+    if isinstance(valor, ObjectId):
+        return str(valor)
+    if isinstance(valor, (datetime.datetime, datetime.date)):
+        return valor.isoformat()
+    raise TypeError(f"No se puede serializar {type(valor).__name__}")
+
+
+def a_json(datos):
+    if orjson is not None:
+        return orjson.dumps(datos, default=_por_defecto)
+    return json.dumps(datos, default=_por_defecto, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def _respuesta(cuerpo, estado=200):
+    return HttpResponse(cuerpo, status=estado, content_type='application/json')
+
+
+def _error(mensaje, estado):
+    return _respuesta(a_json({'error': mensaje}), estado)
+
+
+# --- ETAG Y GET CONDICIONAL ---
+def api_condicional(*dependencias, privada=False, ranking=False, por_elemento=False, por_campo=None):
+    """GET con ETag fuerte por generaciones: 304 si no ha cambiado, cuerpo cacheado si ya se generó
+
+    Con privada=True la respuesta es de cada usuario (hace falta sesión) y depende además de sus listas.
+    Con ranking=True depende de las clasificaciones, o de cada voto mientras no haya ninguna.
+    Con por_elemento=True depende de las valoraciones del elemento de la URL, no de las de todo el catálogo.
+    Con por_campo={campo: clave} depende de 'clave' solo si ?fields= pide ese campo (o no viene).
+    """
+    def decorador(vista):
+        @require_GET
+        @wraps(vista)
+        def envoltorio(request, *args, **kwargs):
+            claves = list(dependencias_ranking(request, *dependencias) if ranking else dependencias)
+            if por_elemento:
+                claves.append(gen_elemento(kwargs['elemento_id']))
+            claves += [clave for campo, clave in (por_campo or {}).items() if _pide_campo(request, campo)]
+            usuario = ''
+            if privada:
+                if not request.user.is_authenticated:
+                    return _error('Hace falta iniciar sesión', 401)
+                usuario = request.user.id
+                claves.append(gen_rankings_usuario(usuario))
+
+            consulta = urlencode(sorted(request.GET.lists()), doseq=True)
+            huella = f"{vista.__name__}|{request.path}?{consulta}|{usuario}|{versiones(request, claves)}"
+            etag = '"%s"' % hashlib.sha1(huella.encode()).hexdigest()
+            control = 'private, no-cache' if privada else 'public, no-cache'
+
+            if etag in [valor.strip() for valor in request.headers.get('If-None-Match', '').split(',')]:
+                response = HttpResponse(status=304)
+            else:
+                clave = f'core:api:{etag}'
+                cuerpo = cache.get(clave)
+                if cuerpo is None:
+                    try:
+                        with desde_primario():  # Se cachea bajo la ETag de las generaciones leídas
+                            cuerpo = a_json(vista(request, *args, **kwargs))
+                    except ErrorAPI as e:
+                        return _error(str(e), e.estado)
+                    cache.set(clave, cuerpo, settings.PAGINAS_CACHE_TTL)
+                response = _respuesta(cuerpo)
+            response['ETag'] = etag
+            response['Cache-Control'] = control
+            return response
+        return envoltorio
+    return decorador
+
+
+# --- PROYECCIÓN (?fields=) ---
+def campos_pedidos(request, permitidos):
+    """Campos de ?fields=titulo,anio (todos si no viene); ErrorAPI si alguno no existe"""
+    valor = request.GET.get('fields')
+    if not valor:
+        return list(permitidos)
+    campos = [campo.strip() for campo in valor.split(',') if campo.strip()]
+    desconocidos = [campo for campo in campos if campo not in permitidos and campo != 'id']
+    if desconocidos:
+        raise ErrorAPI(f"Campos desconocidos: {', '.join(desconocidos)}")
+    return [campo for campo in campos if campo != 'id']
+
+
+def _pide_campo(request, campo):
+    # Sin validar: si hay campos desconocidos la vista responde 400 igualmente
+    valor = request.GET.get('fields')
+    return not valor or campo in {pedido.strip() for pedido in valor.split(',')}
+
+
+def _categoria(categoria_id):
+    categoria = obtener_categoria(categoria_id) if categoria_id else None
+    return {'id': categoria.id, 'nombre': categoria.nombre} if categoria else None
+
+
+def _resumen(resumen):
+    resumen = resumen or {}
+    votos = resumen.get('votos', 0)
+    return {
+        'votos': votos,
+        'promedio': round(resumen.get('suma', 0) / votos, 2) if votos else None,
+        'histograma': {k: v for k, v in (resumen.get('histograma') or {}).items() if v},
+    }
+
+
+def serializar_elemento(doc, campos):
+    """Documento crudo de Elemento -> dict con 'id' y los campos pedidos"""
+    datos = {'id': doc['_id']}
+    for campo in campos:
+        if campo == 'categoria':
+            datos['categoria'] = _categoria(doc.get('categoria'))
+        elif campo == 'resumen':
+            datos['resumen'] = _resumen(doc.get('resumen'))
+        else:
+            datos[campo] = doc.get(campo)
+    return datos
+
+
+def _id_valido(valor):
+    if not ObjectId.is_valid(valor):
+        raise ErrorAPI('No existe', 404)
+    return ObjectId(valor)
+
+
+# --- ELEMENTOS ---
+# Los votos solo cambian 'resumen': con ?fields= sin él, votar no invalida las páginas del catálogo
+@api_condicional(GEN_CATALOGO, GEN_CATEGORIAS, por_campo={'resumen': GEN_VALORACIONES})
+def elementos(request):
+    """Catálogo paginado por cursor (?despues= / ?antes=), filtrable por ?tipo= y ?categoria="""
+    campos = campos_pedidos(request, CAMPOS_ELEMENTO)
+    consulta = lectura_catalogo(Elemento.objects)
+    tipo = request.GET.get('tipo')
+    if tipo:
+        if tipo not in dict(Elemento.TIPO_CHOICES):
+            raise ErrorAPI('Tipo no válido')
+        consulta = consulta.filter(tipo=tipo)
+    if request.GET.get('categoria'):
+        categoria = obtener_categoria(request.GET['categoria'])
+        if categoria is None:
+            raise ErrorAPI('Categoría no válida')
+        consulta = consulta.filter(categoria=categoria.id)
+
+    por_pagina = tamano_pagina(request.GET.get('por_pagina'),
+                               settings.CATALOGO_TAMANO_PAGINA, settings.CATALOGO_TAMANO_PAGINA_MAX)
+    pagina, anterior, siguiente = paginar_por_cursor(consulta.only('id', *campos), despues=request.GET.get('despues'),
+                                                     antes=request.GET.get('antes'), tamano=por_pagina)
+    return {
+        'resultados': [serializar_elemento(el.to_mongo(), campos) for el in pagina],
+        'anterior': anterior,
+        'siguiente': siguiente,
+    }
+
+
+@api_condicional(GEN_CATALOGO, GEN_CATEGORIAS, por_elemento=True)
+def elemento(request, elemento_id):
+    campos = campos_pedidos(request, CAMPOS_ELEMENTO)
+    doc = Elemento._get_collection().find_one({'_id': _id_valido(elemento_id)}, dict.fromkeys(['_id', *campos], 1))
+    if doc is None:
+        raise ErrorAPI('No existe', 404)
+    return serializar_elemento(doc, campos)
+
+
+@api_condicional(GEN_CATALOGO, por_elemento=True)
+def valoraciones(request, elemento_id):
+    """Reseñas de un elemento, de la más reciente a la más antigua (?despues= con el cursor anterior)"""
+    elemento_id = _id_valido(elemento_id)
+    if not Elemento.objects(id=elemento_id).count(with_limit_and_skip=True):
+        raise ErrorAPI('No existe', 404)
+    por_pagina = tamano_pagina(request.GET.get('por_pagina'),
+                               settings.DETALLE_RESENAS_POR_PAGINA, settings.CATALOGO_TAMANO_PAGINA_MAX)
+    pagina, siguiente = paginar_por_fecha(
+        Valoracion.objects(elemento=elemento_id).only('usuario_id', 'puntuacion', 'comentario', 'fecha'),
+        despues=request.GET.get('despues'), tamano=por_pagina)
+    return {
+        'resultados': [{'id': v.id, 'usuario_id': v.usuario_id, 'puntuacion': v.puntuacion,
+                        'comentario': v.comentario, 'fecha': v.fecha} for v in pagina],
+        'siguiente': siguiente,
+    }
+
+
+# --- CATEGORÍAS ---
+@api_condicional(GEN_CATEGORIAS)
+def categorias(request):
+    # Salen de la caché de categorías del proceso, sin consultar Mongo
+    return {'resultados': [{'id': cat.id, 'nombre': cat.nombre, 'descripcion': cat.descripcion}
+                           for cat in obtener_categorias()]}
+
+
+# --- RANKINGS ---
+@api_condicional(GEN_CATALOGO, GEN_CATEGORIAS, ranking=True)
+def ranking_global(request):
+    """Clasificación precalculada (?tipo=, ?modo=, ?categoria=, ?limite=)"""
+    tipo = request.GET.get('tipo', 'P')
+    modo = request.GET.get('modo', settings.RANKING_MODO)
+    if tipo not in dict(Elemento.TIPO_CHOICES) or modo not in MODOS:
+        raise ErrorAPI(f"Tipo o modo no válidos (modos: {', '.join(MODOS)})")
+    categoria = None
+    if request.GET.get('categoria'):
+        categoria = obtener_categoria(request.GET['categoria'])
+        if categoria is None:
+            raise ErrorAPI('Categoría no válida')
+    limite = tamano_pagina(request.GET.get('limite'), 50, settings.RANKING_TAMANO)
+
+    categoria_id = categoria.id if categoria else None
+    entradas = obtener_clasificacion(modo, tipo, categoria_id, limite=limite)
+    if entradas is None:
+        entradas = clasificacion_en_vivo(tipo, categoria_id, limite=limite)
+    return {'tipo': tipo, 'modo': modo, 'categoria': categoria_id, 'resultados': entradas}
+
+
+@api_condicional(GEN_CATALOGO, privada=True)
+def mis_rankings(request):
+    """Listas personales del usuario con sus elementos en orden (id y título)"""
+    rankings = list(Ranking._get_collection().find({'usuario_id': request.user.id}).sort('_id', 1))
+    ids = {elemento_id for r in rankings for elemento_id in r.get('elementos', [])}
+    # Los títulos de todas las listas en una sola consulta
+    titulos = {doc['_id']: doc['titulo']
+               for doc in Elemento._get_collection().find({'_id': {'$in': list(ids)}}, {'titulo': 1})}
+    return {'resultados': [{
+        'id': r['_id'],
+        'nombre': r.get('nombre'),
+        'fecha_creacion': r.get('fecha_creacion'),
+        'elementos': [{'id': e, 'titulo': titulos[e]} for e in r.get('elementos', []) if e in titulos],
+    } for r in rankings]}
@@ -1,5 +1,19 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        import mongoengine
+        from pymongo import monitoring
+
+        from .metricas import MedidorMongo, MedidorPool
+
+        # Los comandos se miden en todos los clientes que se creen a partir de aquí (MongoEngine y Motor);
+        # el pool, en cada cliente por separado (core/asincrono.py pasa el suyo a Motor).
+        monitoring.register(MedidorMongo())
+        # Solo registra la conexión: el cliente se crea con la primera consulta
+        mongoengine.register_connection('default', db=settings.MONGO_DB, host=settings.MONGO_URI,
+                                        event_listeners=[MedidorPool('mongoengine')], **settings.MONGO_OPCIONES)
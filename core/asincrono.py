@@ -0,0 +1,32 @@
+import asyncio
+
+from django.conf import settings
+
+from .conexion import lectura_catalogo
+from .metricas import MedidorPool
+
+# --- CLIENTE MOTOR (VISTAS ASÍNCRONAS) ---
+# Un cliente por bucle de eventos: Motor ata sus conexiones al bucle en el que se crea.
+# Con uvicorn/daphne hay un bucle por proceso, así que en la práctica es un cliente por worker.
+_clientes = {}
+
+
+def cliente():
+    import motor.motor_asyncio  # Dependencia opcional, solo para servir con ASGI
+
+    bucle = asyncio.get_running_loop()
+    if bucle not in _clientes:
+        # Mismas opciones de pool y timeouts que la conexión de MongoEngine (MONGO_OPCIONES en settings).
+        # MedidorMongo ya está registrado para todos los clientes (CoreConfig.ready)
+        _clientes[bucle] = motor.motor_asyncio.AsyncIOMotorClient(
+            settings.MONGO_URI, event_listeners=[MedidorPool('motor')], **settings.MONGO_OPCIONES)
+    return _clientes[bucle]
+
+
+def coleccion(modelo, catalogo=False):
+    """Colección de Motor del documento de MongoEngine (misma base de datos y nombre de colección)
+
+    Con catalogo=True lee con la preferencia de MONGO_LECTURA_CATALOGO (puede ir a un secundario).
+    """
+    destino = cliente()[settings.MONGO_DB][modelo._get_collection_name()]
+    return lectura_catalogo(destino) if catalogo else destino
@@ -0,0 +1,193 @@
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+
+from .busqueda import normalizar, palabras
+from .models import Elemento, Generacion
+
+CLAVE_GENERACION = 'autocompletar'
+
+# Prioridad de cada tipo de coincidencia (menor = sale antes)
+TITULO, PALABRA_TITULO, PERSONA, APELLIDO = range(4)
+COINCIDENCIAS = {TITULO: 'titulo', PALABRA_TITULO: 'titulo', PERSONA: 'reparto', APELLIDO: 'reparto'}
+
+# --- ÍNDICE DE PREFIJOS EN MEMORIA DEL PROCESO ---
+# Array ordenado de tuplas (clave normalizada, prioridad, id). Cada título entra entero y desde cada una de
+# sus palabras ("gran accion" para "La gran acción"); director y actores, igual. Un prefijo se resuelve con
+# bisect y un recorrido corto, sin ir a Mongo. Las vistas de administración lo actualizan en este proceso y
+# los demás lo reconstruyen al ver que ha cambiado la generación 'autocompletar'.
+#
+# Un índice publicado en _estado no se modifica nunca: los cambios se hacen sobre una copia (o un índice
+# nuevo) que sustituye al anterior de una vez. Así las sugerencias leen sin lock y nunca esperan a Mongo;
+# _lock solo ordena a quienes publican, y nadie lo tiene cogido mientras habla con Mongo.
+_estado = {'version': None, 'comprobado': 0.0, 'claves': [], 'fichas': {}, 'por_elemento': {}}
+_lock = threading.Lock()
+_reconstruccion = threading.Lock()  # Un solo hilo por proceso comprueba la generación y reconstruye
+
+CAMPOS = {'titulo': 1, 'director': 1, 'actores': 1, 'tipo': 1, 'anio': 1}
+
+
+def _sufijos(texto, prioridad):
+    """'La gran acción' -> 'la gran accion' (prioridad) y 'gran accion', 'accion' (prioridad + 1)"""
+    trozos = palabras(texto)
+    return [(' '.join(trozos[i:]), prioridad if i == 0 else prioridad + 1) for i in range(len(trozos))]
+
+
+def _claves(doc):
+    id_ = str(doc['_id'])
+    claves = _sufijos(doc.get('titulo'), TITULO)
+
+    director = doc.get('director')
+    if director and director != Elemento.director.default:
+        claves += _sufijos(director, PERSONA)
+    actores = doc.get('actores')
+    if actores and actores != Elemento.actores.default:
+        for actor in actores.split(','):
+            claves += _sufijos(actor, PERSONA)
+
+    # Si una clave sale repetida nos quedamos con su mejor prioridad
+    mejores = {}
+    for clave, prioridad in claves:
+        mejores[clave] = min(prioridad, mejores.get(clave, prioridad))
+    return [(clave, prioridad, id_) for clave, prioridad in mejores.items()]
+
+
+def _ficha(doc):
+    return {'id': str(doc['_id']), 'titulo': doc.get('titulo'), 'tipo': doc.get('tipo'), 'anio': doc.get('anio')}
+
+
+def _construir(version):
+    claves = []
+    fichas = {}
+    por_elemento = {}
+    for doc in Elemento._get_collection().find({}, CAMPOS):
+        propias = _claves(doc)
+        claves.extend(propias)
+        fichas[str(doc['_id'])] = _ficha(doc)
+        por_elemento[str(doc['_id'])] = propias
+    claves.sort()
+    return {'version': version, 'comprobado': time.monotonic(), 'claves': claves,
+            'fichas': fichas, 'por_elemento': por_elemento}
+
+
+def _version_actual():
+    return Generacion.objects(clave=CLAVE_GENERACION).scalar('valor').first() or 0
+
+
+def _al_dia(estado):
+    return estado['version'] is not None and \
+        time.monotonic() - estado['comprobado'] < settings.AUTOCOMPLETAR_VERSION_INTERVALO
+
+
+def _vigente():
+    """Devuelve el índice, reconstruyéndolo si otro proceso ha cambiado el catálogo
+
+    Mientras un hilo lo reconstruye, los demás siguen con el índice anterior; solo se espera si aún no hay ninguno.
+    """
+    global _estado
+    estado = _estado
+    if _al_dia(estado):
+        return estado
+    if not _reconstruccion.acquire(blocking=not estado['claves']):
+        return estado
+
+    try:
+        estado = _estado
+        if _al_dia(estado):
+            return estado
+        version = _version_actual()
+        if version == estado['version']:
+            nuevo = dict(estado, comprobado=time.monotonic())
+        else:
+            nuevo = _construir(version)
+        with _lock:
+            # Si entretanto se ha publicado un cambio de este proceso, manda ese (y su versión dirá si vale)
+            if _estado is estado:
+                _estado = nuevo
+            return _estado
+    finally:
+        _reconstruccion.release()
+
+
+def _subir_version():
+    """Sube la generación en Mongo y devuelve la nueva (sin lock: es un $inc atómico)"""
+    return Generacion.objects(clave=CLAVE_GENERACION).modify(inc__valor=1, upsert=True, new=True).valor
+
+
+def _publicar(estado, nueva):
+    """Sustituye el índice (con _lock cogido); si solo hemos tocado nosotros la generación, sigue valiendo"""
+    global _estado
+    estado['version'] = nueva if _estado['version'] == nueva - 1 else None
+    _estado = estado
+
+
+# --- CONSULTA ---
+def sugerencias(texto, limite=8, tipo=None):
+    """Elementos cuyo título, director o actores empiezan (por alguna palabra) por 'texto'"""
+    prefijo = normalizar(texto)
+    if not prefijo:
+        return []
+
+    # Un índice publicado no cambia: se recorre sin lock
+    estado = _vigente()
+    claves = estado['claves']
+    fichas = estado['fichas']
+    mejores = {}
+    i = bisect_left(claves, (prefijo,))
+    # Acotamos el recorrido: con prefijos muy cortos basta con las primeras coincidencias
+    fin = min(len(claves), i + limite * settings.AUTOCOMPLETAR_RECORRIDO)
+    while i < fin and claves[i][0].startswith(prefijo):
+        _, prioridad, id_ = claves[i]
+        i += 1
+        if tipo and fichas[id_]['tipo'] != tipo:
+            continue
+        if prioridad < mejores.get(id_, (len(COINCIDENCIAS),))[0]:
+            mejores[id_] = (prioridad, fichas[id_])
+
+    ordenados = sorted(mejores.values(), key=lambda m: (m[0], normalizar(m[1]['titulo'])))
+    return [dict(ficha, coincide=COINCIDENCIAS[prioridad]) for prioridad, ficha in ordenados[:limite]]
+
+
+# --- ACTUALIZACIÓN INCREMENTAL (vistas de administración) ---
+def _copia_sin(estado, id_):
+    """Copia del índice sin las claves de un elemento (copiar es solo memoria: cada edición de un administrador)"""
+    copia = dict(estado, claves=list(estado['claves']), fichas=dict(estado['fichas']),
+                 por_elemento=dict(estado['por_elemento']))
+    for clave in copia['por_elemento'].pop(id_, []):
+        posicion = bisect_left(copia['claves'], clave)
+        if posicion < len(copia['claves']) and copia['claves'][posicion] == clave:
+            del copia['claves'][posicion]
+    copia['fichas'].pop(id_, None)
+    return copia
+
+
+def indexar_elemento(elemento):
+    """Añade o reemplaza un elemento en el índice tras crearlo o editarlo"""
+    doc = {'_id': elemento.id, 'titulo': elemento.titulo, 'director': elemento.director,
+           'actores': elemento.actores, 'tipo': elemento.tipo, 'anio': elemento.anio}
+    propias = _claves(doc)
+    nueva = _subir_version()
+    with _lock:
+        estado = _copia_sin(_estado, str(elemento.id))
+        for clave in propias:
+            insort(estado['claves'], clave)
+        estado['fichas'][str(elemento.id)] = _ficha(doc)
+        estado['por_elemento'][str(elemento.id)] = propias
+        _publicar(estado, nueva)
+
+
+def retirar_elemento(elemento_id):
+    """Quita un elemento borrado del índice"""
+    nueva = _subir_version()
+    with _lock:
+        _publicar(_copia_sin(_estado, str(elemento_id)), nueva)
+
+
+def invalidar_autocompletar():
+    """Tras cambios masivos (importaciones, borrado de categorías) todos los procesos reconstruyen"""
+    global _estado
+    Generacion.objects(clave=CLAVE_GENERACION).update_one(inc__valor=1, upsert=True)
+    with _lock:
+        _estado = dict(_estado, version=None)
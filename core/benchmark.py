@@ -0,0 +1,162 @@
+import csv
+import datetime
+import os
+import random
+import resource
+import statistics
+import tempfile
+import time
+
+from bson import ObjectId
+
+from .busqueda import palabras_busqueda, titulo_busqueda
+from .metricas import MedicionMongo, _medicion
+from .models import Categoria, Elemento, Ranking, Valoracion
+
+BASE_DATOS = 'cinerank_benchmark'
+MONGO_LOCAL = 'mongodb://localhost:27017'
+ESCALAS = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+
+GENEROS = ['Acción', 'Aventura', 'Ciencia Ficción', 'Comedia', 'Crimen', 'Drama', 'Fantasía',
+           'Terror', 'Thriller', 'Romance', 'Animación', 'Documental', 'Bélica', 'Histórica']
+PALABRAS = ['noche', 'último', 'corazón', 'ciudad', 'guerra', 'sueño', 'río', 'estrella', 'misión',
+            'fantasma', 'océano', 'invierno', 'ladrón', 'canción', 'héroe', 'jardín', 'máquina', 'isla']
+PERSONAS = ['Pedro Almodóvar', 'Icíar Bollaín', 'Alejandro Amenábar', 'Penélope Cruz', 'Javier Bardem',
+            'Fernando Trueba', 'Isabel Coixet', 'Belén Rueda', 'Luis Tosar', 'Carmen Maura']
+
+
+# --- CATÁLOGO SINTÉTICO ---
+def generar_catalogo(n, usuarios, valoraciones_por_elemento=5, semilla=42, tamano_lote=5000):
+    """Crea n elementos, valoraciones con popularidad en ley de potencias y rankings personales"""
+    azar = random.Random(semilla)
+    categorias = [Categoria(nombre=nombre).save() for nombre in GENEROS]
+
+    # Popularidad del elemento i proporcional a 1 / (i + 1) ** 0.8: unos pocos títulos se llevan casi todo
+    pesos = [1 / (i + 1) ** 0.8 for i in range(n)]
+    escala = n * valoraciones_por_elemento / sum(pesos)
+    ahora = datetime.datetime.now()
+
+    elementos = []
+    valoraciones = []
+    ids = []
+    for i in range(n):
+        id_ = ObjectId()
+        ids.append(id_)
+        titulo = ' '.join(azar.sample(PALABRAS, azar.randint(1, 3))).capitalize() + f' {i}'
+        director = azar.choice(PERSONAS)
+        actores = ', '.join(azar.sample(PERSONAS, 2))
+
+        votos = min(usuarios, int(pesos[i] * escala))
+        histograma = {}
+        for usuario_id in azar.sample(range(1, usuarios + 1), votos):
+            puntuacion = min(5, max(1, round(azar.gauss(3.5, 1))))
+            histograma[str(puntuacion)] = histograma.get(str(puntuacion), 0) + 1
+            valoraciones.append({'usuario_id': usuario_id, 'elemento': id_, 'puntuacion': puntuacion,
+                                 'comentario': f'Opinión {i}-{usuario_id}',
+                                 'fecha': ahora - datetime.timedelta(minutes=azar.randint(0, 500_000))})
+
+        elementos.append({
+            '_id': id_, 'titulo': titulo, 'anio': azar.randint(1950, 2025), 'descripcion': 'Sinopsis sintética',
+            'tipo': 'P' if azar.random() < 0.8 else 'S', 'categoria': azar.choice(categorias).id,
+            'director': director, 'actores': actores, 'orden': azar.randint(0, 100), 'fecha_creacion': ahora,
+            'palabras_busqueda': palabras_busqueda(titulo, director, actores), 'titulo_busqueda': titulo_busqueda(titulo),
+            'resumen': {'suma': sum(int(p) * v for p, v in histograma.items()), 'votos': votos,
+                        'histograma': histograma, 'actualizado': ahora},
+        })
+        if len(elementos) >= tamano_lote:
+            Elemento._get_collection().insert_many(elementos, ordered=False)
+            elementos = []
+        if len(valoraciones) >= tamano_lote:
+            Valoracion._get_collection().insert_many(valoraciones, ordered=False)
+            valoraciones = []
+    if elementos:
+        Elemento._get_collection().insert_many(elementos, ordered=False)
+    if valoraciones:
+        Valoracion._get_collection().insert_many(valoraciones, ordered=False)
+
+    rankings = [{'usuario_id': usuario_id, 'nombre': f'Lista {j}', 'fecha_creacion': ahora,
+                 'elementos': azar.sample(ids, min(n, azar.randint(5, 50)))}
+                for usuario_id in range(1, usuarios + 1) for j in range(azar.randint(0, 3))]
+    if rankings:
+        Ranking._get_collection().insert_many(rankings, ordered=False)
+
+    return {'elementos': n, 'usuarios': usuarios, 'categorias': len(categorias),
+            'valoraciones': Valoracion.objects.count(), 'rankings': len(rankings), 'mas_popular': str(ids[0])}
+
+
+def escribir_csv(ruta, filas, semilla=7):
+    """CSV sintético con el formato de peliculas.csv para medir cargar_csv"""
+    azar = random.Random(semilla)
+    with open(ruta, 'w', newline='', encoding='utf-8') as archivo:
+        writer = csv.writer(archivo)
+        writer.writerow(['titulo', 'anio', 'categoria', 'descripcion', 'imagen_url', 'tipo', 'director', 'actores'])
+        for i in range(filas):
+            writer.writerow([f'Importada {i}', azar.randint(1950, 2025), ' - '.join(azar.sample(GENEROS, 2)),
+                             'Sinopsis', f'https://example.com/{i}.jpg', 'P', azar.choice(PERSONAS),
+                             ', '.join(azar.sample(PERSONAS, 2))])
+
+
+# --- MEDICIÓN ---
+def rss_maximo_mb():
+    # ru_maxrss va en KB en Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def medir(funcion, repeticiones):
+    """Ejecuta 'funcion' varias veces: latencias en ms y comandos Mongo de cada ejecución"""
+    tiempos = []
+    comandos = []
+    for _ in range(repeticiones):
+        medicion = MedicionMongo()
+        token = _medicion.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            resultado = funcion()
+        finally:
+            _medicion.reset(token)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        comandos.append(medicion.comandos)
+        estado = getattr(resultado, 'status_code', None)
+        if estado is not None and estado >= 400:
+            raise RuntimeError(f"La petición ha devuelto {estado}")
+
+    tiempos_ordenados = sorted(tiempos)
+    return {
+        'repeticiones': repeticiones,
+        'primera_ms': round(tiempos[0], 2),
+        'p50_ms': round(statistics.median(tiempos), 2),
+        'p95_ms': round(tiempos_ordenados[min(len(tiempos) - 1, int(len(tiempos) * 0.95))], 2),
+        'comandos_primera': comandos[0],
+        'comandos_p50': statistics.median(comandos),
+        'rss_max_mb': rss_maximo_mb(),
+    }
+
+
+def escenarios(cliente, catalogo):
+    """Peticiones que se miden, por nombre (las vistas reales a través del cliente de pruebas)"""
+    detalle = f"/elemento/{catalogo['mas_popular']}/"
+    return {
+        'home': lambda: cliente.get('/'),
+        'home_busqueda': lambda: cliente.get('/?q=corazon'),
+        'series': lambda: cliente.get('/series/'),
+        'autocompletar': lambda: cliente.get('/autocompletar/?q=alm'),
+        'ranking_global': lambda: cliente.get('/ranking/'),
+        'panel_estadisticas': lambda: cliente.get('/estadisticas/'),
+        'lista_categorias': lambda: cliente.get('/categorias/'),
+        'detalle_elemento': lambda: cliente.get(detalle),
+        'mis_rankings': lambda: cliente.get('/mis-listas/'),
+    }
+
+
+def medir_importacion(filas):
+    """Tiempo de cargar_csv sobre un CSV sintético de 'filas' filas"""
+    from django.core.management import call_command
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, 'benchmark.csv')
+        escribir_csv(ruta, filas)
+        with open(os.devnull, 'w') as nulo:
+            resultado = medir(lambda: call_command('cargar_csv', archivo=ruta, stdout=nulo), 1)
+    resultado['filas'] = filas
+    resultado['filas_por_segundo'] = round(filas / (resultado['p50_ms'] / 1000), 1)
+    return resultado
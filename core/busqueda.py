@@ -0,0 +1,105 @@
+import re
+import unicodedata
+
+from django.conf import settings
+
+
+# --- NORMALIZACIÓN DEL TEXTO ---
+# Guardamos en cada Elemento las palabras de título, director y actores ya en minúsculas y sin tildes,
+# así "accion" encuentra "Acción" y las búsquedas por prefijo (^palabra) pueden usar el índice.
+
+def normalizar(texto):
+    """Minúsculas, sin tildes y con los espacios colapsados: 'La  Acción' -> 'la accion'"""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.casefold().split())
+
+
+def palabras(texto):
+    """Palabras normalizadas de un texto, en orden y con repeticiones"""
+    return re.findall(r'\w+', normalizar(texto))
+
+
+def titulo_busqueda(titulo):
+    """Título normalizado palabra a palabra, para buscar los títulos que empiezan por la consulta"""
+    return ' '.join(palabras(titulo))
+
+
+def palabras_busqueda(titulo, director=None, actores=None):
+    """Conjunto ordenado de palabras por las que se puede encontrar un elemento"""
+    return sorted(set(palabras(titulo)) | set(palabras(director)) | set(palabras(actores)))
+
+
+def filtro_busqueda(terminos):
+    """Filtro Mongo que exige que cada término sea prefijo de alguna palabra; ^ anclado usa el índice por rango"""
+    return {'$and': [{'palabras_busqueda': re.compile('^' + re.escape(t))} for t in dict.fromkeys(terminos)]}
+
+
+# --- RELEVANCIA ---
+def _puntuar(terminos, consulta, elemento):
+    """Puntúa un candidato: pesa más el título que el reparto y la palabra exacta que el prefijo"""
+    titulo = titulo_busqueda(elemento.titulo)
+    en_titulo = titulo.split()
+    en_reparto = palabras(elemento.director) + palabras(elemento.actores)
+
+    puntos = 0
+    for termino in terminos:
+        if termino in en_titulo:
+            puntos += 4
+        elif any(p.startswith(termino) for p in en_titulo):
+            puntos += 3
+        elif termino in en_reparto:
+            puntos += 2
+        elif any(p.startswith(termino) for p in en_reparto):
+            puntos += 1
+
+    if titulo == consulta:
+        puntos += 10
+    elif titulo.startswith(consulta):
+        puntos += 5
+    return puntos
+
+
+def _posicion(valor):
+    return int(valor) if valor and valor.isdigit() else None
+
+
+# --- BÚSQUEDA ---
+def buscar(queryset, texto, despues=None, antes=None, tamano=24):
+    """Busca por prefijo de palabra usando el índice y ordena por relevancia: (elementos, anterior, siguiente)
+
+    Los cursores son posiciones dentro de los candidatos ordenados; hay como mucho
+    BUSQUEDA_MAX_CANDIDATOS, así que saltar dentro de ellos es barato.
+    """
+    terminos = palabras(texto)
+    if not terminos:
+        return [], None, None
+
+    consulta = ' '.join(terminos)
+    campos = ('id', 'titulo', 'anio', 'imagen_url', 'director', 'actores', 'categoria', 'tipo')
+    maximo = settings.BUSQUEDA_MAX_CANDIDATOS
+
+    # 1. Los títulos que empiezan por la consulta, que son los que más puntúan (la coincidencia exacta
+    #    sale la primera en el índice), para que el límite de candidatos nunca los deje fuera
+    candidatos = list(
+        queryset.filter(titulo_busqueda=re.compile('^' + re.escape(consulta)))
+        .order_by('titulo_busqueda').only(*campos).limit(maximo)
+    )
+    # 2. El resto de elementos con todas las palabras, hasta completar los candidatos
+    if len(candidatos) < maximo:
+        candidatos += list(
+            queryset.filter(__raw__=filtro_busqueda(terminos))
+            .filter(id__nin=[e.id for e in candidatos])
+            .only(*campos).limit(maximo - len(candidatos))
+        )
+
+    candidatos.sort(key=lambda e: (-_puntuar(terminos, consulta, e), normalizar(e.titulo), str(e.id)))
+
+    antes = _posicion(antes)
+    inicio = max(0, antes - tamano) if antes is not None else (_posicion(despues) or 0)
+    pagina = candidatos[inicio:inicio + tamano]
+    fin = inicio + len(pagina)
+
+    cursor_anterior = str(inicio) if inicio > 0 else None
+    cursor_siguiente = str(fin) if fin < len(candidatos) else None
+    return pagina, cursor_anterior, cursor_siguiente
@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+from functools import wraps
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.safestring import mark_safe
+
+from .conexion import desde_primario
+from .models import Generacion
+
+# Contadores de generación de los que depende el HTML cacheado. Al subir uno, las claves antiguas
+# dejan de pedirse (y caducan solas), así que no hay que ir borrando entradas sueltas.
+GEN_CATALOGO = 'catalogo'  # Altas, ediciones y borrados de elementos (vistas de administración e importación)
+GEN_CATEGORIAS = 'categorias'  # La misma que usa la caché de categorías (core/categorias.py)
+GEN_VALORACIONES = 'valoraciones'  # Cualquier cambio en los resúmenes de valoraciones
+GEN_CLASIFICACIONES = 'clasificaciones'  # Cada vez que se recalculan las clasificaciones (core/rankings.py)
+
+
+def gen_rankings_usuario(usuario_id):
+    """Contador de las listas personales de un usuario (lo sube core/listas.py en cada cambio)"""
+    return f'rankings:{usuario_id}'
+
+
+def gen_elemento(elemento_id):
+    """Contador de las valoraciones de un elemento (lo sube core/valoraciones.py en cada alta, edición o borrado)"""
+    return f'elemento:{str(elemento_id).lower()}'  # El id puede venir de la URL
+
+
+# --- CONTADORES DE GENERACIÓN ---
+def versiones(request, claves):
+    """Versión actual de cada contador; se leen juntas una vez por petición"""
+    memoria = request.__dict__.setdefault('_generaciones', {})
+    faltan = [clave for clave in claves if clave not in memoria]
+    if faltan:
+        leidas = dict(Generacion.objects(clave__in=faltan).scalar('clave', 'valor'))
+        memoria.update({clave: leidas.get(clave, 0) for clave in faltan})
+    return tuple(memoria[clave] for clave in claves)
+
+
+async def aversiones(request, claves):
+    """Como versiones(), para las vistas asíncronas (lee con Motor)"""
+    from .asincrono import coleccion
+
+    memoria = request.__dict__.setdefault('_generaciones', {})
+    faltan = [clave for clave in claves if clave not in memoria]
+    if faltan:
+        leidas = {doc['clave']: doc['valor'] async for doc in
+                  coleccion(Generacion).find({'clave': {'$in': faltan}}, {'clave': 1, 'valor': 1})}
+        memoria.update({clave: leidas.get(clave, 0) for clave in faltan})
+    return tuple(memoria[clave] for clave in claves)
+
+
+def subir_generacion(*claves):
+    for clave in claves:
+        Generacion.objects(clave=clave).update_one(inc__valor=1, upsert=True)
+
+
+# --- RANKING: CLASIFICACIÓN PRECALCULADA O EN VIVO ---
+# Hasta que se calcula la primera clasificación el ranking se hace en vivo (clasificacion_en_vivo) y
+# cambia con cada voto; desde entonces solo cambia al recalcularlas. Sus claves siguen la misma regla.
+def _segun_clasificaciones(dependencias, clasificaciones):
+    extra = (GEN_CLASIFICACIONES,) if clasificaciones else (GEN_CLASIFICACIONES, GEN_VALORACIONES)
+    return tuple(dependencias) + extra
+
+
+def dependencias_ranking(request, *dependencias):
+    """'dependencias' más las del ranking (todas se leen en una sola consulta)"""
+    versiones(request, (*dependencias, GEN_CLASIFICACIONES, GEN_VALORACIONES))
+    return _segun_clasificaciones(dependencias, versiones(request, (GEN_CLASIFICACIONES,))[0])
+
+
+async def adependencias_ranking(request, *dependencias):
+    """Como dependencias_ranking(), para las vistas asíncronas"""
+    await aversiones(request, (*dependencias, GEN_CLASIFICACIONES, GEN_VALORACIONES))
+    return _segun_clasificaciones(dependencias, (await aversiones(request, (GEN_CLASIFICACIONES,)))[0])
+
+
+def _clave(prefijo, generaciones, variantes):
+    huella = hashlib.md5(urlencode(sorted(variantes.items()), doseq=True).encode()).hexdigest()
+    return f"core:{prefijo}:{'.'.join(map(str, generaciones))}:{huella}"
+
+
+# --- FRAGMENTOS ---
+def fragmento(request, nombre, dependencias, variantes, generar):
+    """HTML de un trozo de página, cacheado por vista, filtros y generaciones de las que depende
+
+    'generar' solo se llama si no está en caché: es donde van las consultas y el render_to_string.
+    Lee del primario, como todo lo que se guarda bajo una generación (core/conexion.py).
+    """
+    clave = _clave(f'fragmento:{nombre}', versiones(request, dependencias), variantes)
+    html = cache.get(clave)
+    if html is None:
+        with desde_primario():
+            html = generar()
+        cache.set(clave, html, settings.PAGINAS_CACHE_TTL)
+    return mark_safe(html)
+
+
+async def afragmento(request, nombre, dependencias, variantes, generar):
+    """Como fragmento(), con 'generar' asíncrono"""
+    clave = _clave(f'fragmento:{nombre}', await aversiones(request, dependencias), variantes)
+    html = await cache.aget(clave)
+    if html is None:
+        with desde_primario():
+            html = await generar()
+        await cache.aset(clave, html, settings.PAGINAS_CACHE_TTL)
+    return mark_safe(html)
+
+
+# --- PÁGINAS COMPLETAS PARA ANÓNIMOS ---
+def _respuesta_cacheada(guardada):
+    contenido, tipo_contenido = guardada
+    response = HttpResponse(contenido, content_type=tipo_contenido)
+    response['X-Cache'] = 'HIT'
+    return response
+
+
+def _variantes(request, vista):
+    return dict(request.GET.lists(), vista=vista.__name__, ruta=request.path)
+
+
+def cachear_pagina_anonima(*dependencias, ranking=False):
+    """Sirve la página entera desde caché a los anónimos (GET sin mensajes pendientes)
+
+    Vale para vistas síncronas y asíncronas (core/vistas_async.py); la página que se va a cachear se
+    genera desde el primario. Con ranking=True la página depende
+    además de las clasificaciones, o de cada voto mientras no haya ninguna (dependencias_ranking).
+    """
+    def decorador(vista):
+        if asyncio.iscoroutinefunction(vista):
+            @wraps(vista)
+            async def envoltorio_async(request, *args, **kwargs):
+                usuario = await request.auser()
+                # Leer los mensajes carga la sesión, que va por el ORM: fuera del bucle de eventos
+                pendientes = await sync_to_async(lambda: len(get_messages(request)))()
+                if request.method != 'GET' or usuario.is_authenticated or pendientes:
+                    return await vista(request, *args, **kwargs)
+
+                claves = await adependencias_ranking(request, *dependencias) if ranking else dependencias
+                clave = _clave('pagina', await aversiones(request, claves), _variantes(request, vista))
+                guardada = await cache.aget(clave)
+                if guardada is not None:
+                    return _respuesta_cacheada(guardada)
+
+                with desde_primario():
+                    response = await vista(request, *args, **kwargs)
+                if response.status_code == 200 and not response.streaming:
+                    await cache.aset(clave, (response.content, response['Content-Type']), settings.PAGINAS_CACHE_TTL)
+                    response['X-Cache'] = 'MISS'
+                return response
+            return envoltorio_async
+
+        @wraps(vista)
+        def envoltorio(request, *args, **kwargs):
+            if request.method != 'GET' or request.user.is_authenticated or len(get_messages(request)):
+                return vista(request, *args, **kwargs)
+
+            claves = dependencias_ranking(request, *dependencias) if ranking else dependencias
+            clave = _clave('pagina', versiones(request, claves), _variantes(request, vista))
+            guardada = cache.get(clave)
+            if guardada is not None:
+                return _respuesta_cacheada(guardada)
+
+            with desde_primario():
+                response = vista(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                cache.set(clave, (response.content, response['Content-Type']), settings.PAGINAS_CACHE_TTL)
+                response['X-Cache'] = 'MISS'
+            return response
+        return envoltorio
+    return decorador
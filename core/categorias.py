@@ -0,0 +1,76 @@
+import threading
+import time
+
+from bson import ObjectId
+from django.conf import settings
+
+from .models import Categoria, Generacion
+
+CLAVE_GENERACION = 'categorias'
+
+# --- CACHÉ DE CATEGORÍAS EN MEMORIA DEL PROCESO ---
+# Categoria es pequeña y casi nunca cambia: la cargamos entera una vez por proceso y solo
+# volvemos a Mongo si el contador de generación 'categorias' ha cambiado (se mira cada pocos segundos).
+_estado = {'version': None, 'comprobado': 0.0, 'por_id': {}, 'por_nombre': {}, 'ordenadas': []}
+_lock = threading.Lock()
+
+
+def _version_actual():
+    return Generacion.objects(clave=CLAVE_GENERACION).scalar('valor').first() or 0
+
+
+def _al_dia(estado):
+    intervalo = getattr(settings, 'CATEGORIAS_VERSION_INTERVALO', 2)
+    return estado['version'] is not None and time.monotonic() - estado['comprobado'] < intervalo
+
+
+def _vigente():
+    """Devuelve el estado de la caché, recargándola si otro proceso ha cambiado las categorías"""
+    global _estado
+    if _al_dia(_estado):
+        return _estado
+
+    with _lock:
+        if _al_dia(_estado):
+            return _estado
+        version = _version_actual()
+        if version == _estado['version']:
+            # Nada ha cambiado: solo apuntamos cuándo lo hemos comprobado
+            _estado = dict(_estado, comprobado=time.monotonic())
+        else:
+            ordenadas = list(Categoria.objects.order_by('nombre'))
+            _estado = {
+                'version': version,
+                'comprobado': time.monotonic(),
+                'por_id': {cat.id: cat for cat in ordenadas},
+                'por_nombre': {cat.nombre: cat.id for cat in ordenadas},
+                'ordenadas': ordenadas,
+            }
+        return _estado
+
+
+def obtener_categorias():
+    """Todas las categorías ordenadas por nombre"""
+    return list(_vigente()['ordenadas'])
+
+
+def obtener_categoria(categoria_id):
+    """Categoría por id (ObjectId, str o referencia), o None si no existe"""
+    categoria_id = getattr(categoria_id, 'id', categoria_id)
+    if isinstance(categoria_id, str):
+        if not ObjectId.is_valid(categoria_id):
+            return None
+        categoria_id = ObjectId(categoria_id)
+    return _vigente()['por_id'].get(categoria_id)
+
+
+def id_de_categoria(nombre):
+    return _vigente()['por_nombre'].get(nombre)
+
+
+def invalidar_categorias():
+    """Sube la generación en Mongo para que todos los procesos recarguen sus categorías"""
+    global _estado
+    Generacion.objects(clave=CLAVE_GENERACION).update_one(inc__valor=1, upsert=True)
+    with _lock:
+        _estado = dict(_estado, version=None)
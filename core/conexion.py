@@ -0,0 +1,48 @@
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+from pymongo import ReadPreference
+
+# --- PREFERENCIA DE LECTURA ---
+# Las vistas del catálogo, los rankings y las estadísticas toleran leer de un secundario con unos
+# segundos de retraso; el resto (escrituras, lo que acaba de guardar el usuario, contadores de
+# generación) va al primario, que es la preferencia de la conexión.
+#
+# Excepción: lo que se guarda en caché bajo una generación (fragmentos, páginas, cuerpos de la API,
+# estadísticas) se regenera desde el primario. Si no, la primera petición tras un cambio leería la
+# generación nueva del primario, renderizaría desde un secundario que aún no la tiene y dejaría ese
+# HTML viejo cacheado bajo la clave nueva hasta que caducase (PAGINAS_CACHE_TTL).
+PREFERENCIAS = {
+    'primary': ReadPreference.PRIMARY,
+    'primaryPreferred': ReadPreference.PRIMARY_PREFERRED,
+    'secondary': ReadPreference.SECONDARY,
+    'secondaryPreferred': ReadPreference.SECONDARY_PREFERRED,
+    'nearest': ReadPreference.NEAREST,
+}
+
+
+_regenerando = contextvars.ContextVar('regenerando_cache', default=False)
+
+
+@contextmanager
+def desde_primario():
+    """Dentro del bloque lectura_catalogo() lee del primario (para generar lo que se cachea por generación)"""
+    token = _regenerando.set(True)
+    try:
+        yield
+    finally:
+        _regenerando.reset(token)
+
+
+def preferencia_catalogo():
+    if _regenerando.get():
+        return ReadPreference.PRIMARY
+    return PREFERENCIAS.get(settings.MONGO_LECTURA_CATALOGO, ReadPreference.PRIMARY)
+
+
+def lectura_catalogo(destino):
+    """Queryset o colección (pymongo o Motor) con la preferencia de lectura del catálogo"""
+    if hasattr(destino, 'with_options'):
+        return destino.with_options(read_preference=preferencia_catalogo())
+    return destino.read_preference(preferencia_catalogo())
@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache_paginas import GEN_CATALOGO, GEN_CATEGORIAS, GEN_VALORACIONES, versiones
+from .conexion import desde_primario, lectura_catalogo
+from .models import Elemento, Categoria
+from .rankings import calcular_ranking_global
+
+# Depende de los elementos, de los nombres de las categorías y de los resúmenes de valoraciones
+DEPENDENCIAS = (GEN_CATALOGO, GEN_CATEGORIAS, GEN_VALORACIONES)
+
+
+# --- SNAPSHOT DEL PANEL DE ESTADÍSTICAS ---
+def calcular_estadisticas():
+    """Calcula totales, promedio por categoría y top 10 con dos agregaciones sobre los resúmenes"""
+    # 1. Elementos, puntos y votos agrupados por categoría en una sola pasada
+    pipeline = [
+        {'$group': {
+            '_id': '$categoria',
+            'cantidad': {'$sum': 1},
+            'puntos': {'$sum': {'$ifNull': ['$resumen.suma', 0]}},
+            'votos': {'$sum': {'$ifNull': ['$resumen.votos', 0]}},
+        }},
+    ]
+    por_categoria = {fila['_id']: fila for fila in lectura_catalogo(Elemento.objects).aggregate(pipeline)}
+
+    total_elementos = sum(fila['cantidad'] for fila in por_categoria.values())
+    total_valoraciones = sum(fila['votos'] for fila in por_categoria.values())
+
+    # Se listan todas las categorías, también las que aún no tienen elementos
+    datos_categorias = []
+    for cat in Categoria.objects.only('nombre'):
+        fila = por_categoria.get(cat.id, {})
+        votos = fila.get('votos', 0)
+        datos_categorias.append({
+            'nombre': cat.nombre,
+            'cantidad': fila.get('cantidad', 0),
+            'promedio': round(fila['puntos'] / votos, 1) if votos > 0 else 0.0
+        })
+
+    # 2. Top 10 global con el mismo motor que el ranking
+    top_elementos = [{
+        'elemento': {'id': str(item['elemento'].id), 'titulo': item['elemento'].titulo},
+        'promedio': item['promedio'],
+        'votos': item['total_votos']
+    } for item in calcular_ranking_global(limite=10)]
+
+    return {
+        'total_elementos': total_elementos,
+        'total_valoraciones': total_valoraciones,
+        'datos_categorias': datos_categorias,
+        'top_elementos': top_elementos
+    }
+
+
+def obtener_estadisticas(request):
+    """Devuelve el snapshot cacheado (ESTADISTICAS_CACHE_TTL segundos) o lo recalcula
+
+    La clave lleva las generaciones de las que depende, como las páginas cacheadas: un cambio en
+    cualquier worker la cambia para todos (borrarla solo la borraría de la caché local de ese worker).
+    """
+    clave = 'core:estadisticas:' + '.'.join(map(str, versiones(request, DEPENDENCIAS)))
+    datos = cache.get(clave)
+    if datos is None:
+        with desde_primario():  # Se guarda bajo las generaciones leídas: no puede venir de un secundario atrasado
+            datos = calcular_estadisticas()
+        cache.set(clave, datos, getattr(settings, 'ESTADISTICAS_CACHE_TTL', 300))
+    return datos
@@ -1,5 +1,6 @@
 from django import forms
 from .models import Elemento, Categoria
+from .categorias import obtener_categorias, obtener_categoria
 
 # --- FORMULARIO DE VALORACIÓN ---
 class ValoracionForm(forms.Form):
@@ -97,14 +98,14 @@ class ElementoForm(forms.Form):
         self.instance = kwargs.pop('instance', None)
         super(ElementoForm, self).__init__(*args, **kwargs)
 
-        # Carga dinámica de categorías
-        categorias = Categoria.objects.all()
+        # Carga dinámica de categorías (desde la caché del proceso, sin ir a Mongo)
+        categorias = obtener_categorias()
         choices = [(str(c.id), c.nombre) for c in categorias]
         self.fields['categoria'].choices = choices
 
     def save(self):
         cat_id = self.cleaned_data['categoria']
-        categoria_obj = Categoria.objects.get(id=cat_id)
+        categoria_obj = obtener_categoria(cat_id) or Categoria.objects.get(id=cat_id)
 
         # Si editamos usamos la instancia, si no, creamos uno nuevo
         elemento = self.instance if self.instance else Elemento()
@@ -0,0 +1,473 @@
+import codecs
+import csv
+import datetime
+import multiprocessing
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import islice
+
+from django.conf import settings
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from .autocompletar import invalidar_autocompletar
+from .cache_paginas import GEN_CATALOGO, subir_generacion
+from .categorias import invalidar_categorias
+from .models import Elemento, Categoria, TrabajoImportacion
+
+TAMANO_LOTE = 1000
+TAMANO_CHUNK = 64 * 1024
+MAX_FALLIDAS_GUARDADAS = 100
+
+# Pipeline común a cargar_csv e importar_csv:
+#   1. leer (filas_csv)  ->  2. normalizar géneros (leer_fila)
+#   3. resolver categorías (resolver_categorias)  ->  4. escribir en bloque (escribir_lote)
+# importar_archivo lo ejecuta en este proceso o repartido por título en un pool de procesos.
+
+# Orden de columnas de peliculas.csv (cargar_csv) y del CSV que se sube desde el panel (importar_csv).
+# Solo se usan si el archivo no trae una cabecera con los nombres de las columnas.
+COLUMNAS_CSV = ('titulo', 'anio', 'categoria', 'descripcion', 'imagen_url', 'tipo', 'director', 'actores')
+COLUMNAS_IMPORTAR_CSV = ('titulo', 'anio', 'descripcion', 'categoria', 'imagen_url', 'tipo', 'director', 'actores')
+
+# Campos que se sobrescriben si el título ya existe (igual que hacía cargar_csv fila a fila).
+# palabras_busqueda y titulo_busqueda las calcula Elemento.clean() al validar.
+CAMPOS_ACTUALIZABLES = ('anio', 'categoria', 'descripcion', 'imagen_url', 'tipo', 'director', 'actores',
+                        'palabras_busqueda', 'titulo_busqueda')
+
+
+class ResultadoImportacion:
+    """Contadores de una importación y filas que no se pudieron cargar"""
+
+    def __init__(self):
+        self.filas = 0
+        self.nuevos = 0
+        self.actualizados = 0
+        self.categorias_creadas = 0
+        self.fallidas = []  # [(número de fila, título, error)]
+        self.inicio = time.monotonic()
+
+    @property
+    def segundos(self):
+        return time.monotonic() - self.inicio
+
+    @property
+    def filas_por_segundo(self):
+        return self.filas / self.segundos if self.segundos else 0
+
+    def sumar(self, parcial):
+        """Acumula el resultado de un proceso del pool"""
+        self.filas += parcial['filas']
+        self.nuevos += parcial['nuevos']
+        self.actualizados += parcial['actualizados']
+        self.categorias_creadas += parcial['categorias_creadas']
+        self.fallidas.extend(parcial['fallidas'])
+
+
+# --- PASO 1: SEPARAR GÉNEROS ---
+def separar_generos(raw_categorias):
+    """Convierte "Biografía - Música" o "Drama, Crimen" en ["Biografía", "Música"]"""
+    generos = re.split(r'\s*[\-\/]\s*|\s*,\s*', (raw_categorias or '').strip())
+    return [g.strip() for g in generos if g.strip()]
+
+
+def leer_fila(row):
+    """Normaliza una fila (dict con los nombres de columna) al formato del importador"""
+    anio = (row.get('anio') or '').strip()
+    return {
+        'titulo': (row.get('titulo') or '').strip(),
+        'generos': separar_generos(row.get('categoria')),
+        'anio': int(anio) if anio.isdigit() else 0,
+        'descripcion': row.get('descripcion'),
+        'imagen_url': row.get('imagen_url'),
+        'tipo': (row.get('tipo') or 'P').strip().upper(),
+        'director': row.get('director', 'Desconocido'),
+        'actores': row.get('actores', 'Varios'),
+    }
+
+
+# --- PASO 2: RESOLVER TODAS LAS CATEGORÍAS DEL LOTE ---
+def resolver_categorias(nombres):
+    """Devuelve {nombre: id} con una consulta $in, creando en bloque las que falten"""
+    nombres = set(nombres)
+    coleccion = Categoria._get_collection()
+    ids = {doc['nombre']: doc['_id'] for doc in coleccion.find({'nombre': {'$in': list(nombres)}}, {'nombre': 1})}
+
+    faltan = nombres - set(ids)
+    creadas = 0
+    if faltan:
+        nuevas = [{'nombre': n, 'descripcion': f"Películas del género {n}"} for n in sorted(faltan)]
+        try:
+            creadas = len(coleccion.insert_many(nuevas, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            # Otro proceso creó alguna a la vez (índice único en 'nombre'): nos quedamos con la suya
+            creadas = e.details.get('nInserted', 0)
+        ids.update({doc['nombre']: doc['_id'] for doc in coleccion.find({'nombre': {'$in': list(faltan)}}, {'nombre': 1})})
+        invalidar_categorias()
+    return ids, creadas
+
+
+# --- PASO 3: ESCRIBIR EL LOTE ---
+def escribir_lote(filas, resultado):
+    """Valida y hace upsert por título de un lote de filas normalizadas con un solo bulk_write"""
+    categorias, creadas = resolver_categorias(g for _, fila in filas for g in fila['generos'])
+    resultado.categorias_creadas += creadas
+
+    # Si un título se repite dentro del lote, gana la última fila (igual que al guardar en orden)
+    por_titulo = {}
+    for numero, fila in filas:
+        try:
+            if not fila['generos']:
+                raise ValueError("la fila no tiene categoría")
+            elemento = Elemento(
+                titulo=fila['titulo'],
+                anio=fila['anio'],
+                categoria=categorias[fila['generos'][0]],  # La primera categoría es la PRINCIPAL
+                descripcion=fila['descripcion'],
+                imagen_url=fila['imagen_url'],
+                tipo=fila['tipo'],
+                director=fila['director'],
+                actores=fila['actores']
+            )
+            elemento.validate()
+        except Exception as e:
+            resultado.fallidas.append((numero, fila.get('titulo'), str(e)))
+            continue
+        por_titulo[elemento.titulo] = elemento.to_mongo().to_dict()
+
+    operaciones = []
+    for titulo, doc in por_titulo.items():
+        doc.pop('_id', None)
+        doc.pop('titulo')  # El upsert lo copia del filtro
+        cambios = {campo: doc.pop(campo) for campo in CAMPOS_ACTUALIZABLES if campo in doc}
+        operaciones.append(UpdateOne({'titulo': titulo}, {'$set': cambios, '$setOnInsert': doc}, upsert=True))
+
+    if operaciones:
+        res = Elemento._get_collection().bulk_write(operaciones, ordered=False)
+        resultado.nuevos += res.upserted_count
+        resultado.actualizados += res.matched_count
+
+
+def importar_filas(filas, tamano_lote=TAMANO_LOTE, progreso=None, primera_fila=2):
+    """Importa un iterable de filas (dict) por lotes; 'progreso' se llama tras cada lote"""
+    # Por defecto la fila 1 es la cabecera
+    return importar_numeradas(enumerate(filas, start=primera_fila), tamano_lote=tamano_lote, progreso=progreso)
+
+
+def importar_numeradas(numeradas, tamano_lote=TAMANO_LOTE, progreso=None):
+    """Como importar_filas, con pares (número de fila en el archivo, fila) ya numerados"""
+    resultado = ResultadoImportacion()
+    numeradas = iter(numeradas)
+    while True:
+        lote = [(numero, leer_fila(row)) for numero, row in islice(numeradas, tamano_lote)]
+        if not lote:
+            break
+        resultado.filas += len(lote)
+        escribir_lote(lote, resultado)
+        if progreso:
+            progreso(resultado)
+
+    return resultado
+
+
+# --- LECTURA EN STREAMING ---
+def lineas_desde_chunks(chunks, encoding='utf-8-sig'):
+    """Decodifica trozos de bytes de forma incremental y los devuelve línea a línea"""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pendiente = ''
+    for chunk in chunks:
+        pendiente += decoder.decode(chunk)
+        lineas = pendiente.split('\n')
+        # La última línea puede estar a medias: la guardamos para el siguiente trozo
+        pendiente = lineas.pop()
+        for linea in lineas:
+            yield linea + '\n'
+    pendiente += decoder.decode(b'', final=True)
+    if pendiente:
+        yield pendiente
+
+
+def _leer_chunks(f, limite=None):
+    """Lee un archivo binario en trozos de TAMANO_CHUNK, como mucho 'limite' bytes"""
+    while limite is None or limite > 0:
+        chunk = f.read(TAMANO_CHUNK if limite is None else min(TAMANO_CHUNK, limite))
+        if not chunk:
+            return
+        if limite is not None:
+            limite -= len(chunk)
+        yield chunk
+
+
+def columnas_de_cabecera(cabecera, columnas_por_defecto):
+    """Si la cabecera trae los nombres de las columnas se usan; si no, el orden por defecto"""
+    nombres = [c.strip().lower() for c in cabecera]
+    return nombres if 'titulo' in nombres else columnas_por_defecto
+
+
+def filas_csv(lineas, columnas_por_defecto=COLUMNAS_CSV):
+    """Lee un CSV (saltando la cabecera) y devuelve cada fila como dict"""
+    reader = csv.reader(lineas, delimiter=',', quotechar='"')
+    columnas = columnas_de_cabecera(next(reader, None) or [], columnas_por_defecto)
+    for row in reader:
+        if row:
+            yield dict(zip(columnas, row))
+
+
+# --- IMPORTACIÓN DE UN ARCHIVO (EN SERIE O EN PARALELO) ---
+def importar_archivo(ruta, columnas_por_defecto=COLUMNAS_CSV, tamano_lote=TAMANO_LOTE, procesos=1, progreso=None):
+    """Importa un CSV del disco en streaming; con procesos > 1 reparte las filas por título en un pool"""
+    try:
+        if procesos > 1:
+            return _importar_en_paralelo(ruta, columnas_por_defecto, tamano_lote, procesos, progreso)
+
+        with open(ruta, 'rb') as f:
+            filas = filas_csv(lineas_desde_chunks(_leer_chunks(f)), columnas_por_defecto)
+            return importar_filas(filas, tamano_lote=tamano_lote, progreso=progreso)
+    finally:
+        # El catálogo ha cambiado en bloque (aunque sea a medias si ha fallado), lo lance el panel o cargar_csv
+        subir_generacion(GEN_CATALOGO)
+        invalidar_autocompletar()
+
+
+def particion_de(titulo, partes):
+    """Partición de un título, la misma en todos los procesos (hash() cambia de un proceso a otro)"""
+    return zlib.crc32((titulo or '').strip().encode('utf-8')) % partes
+
+
+def rangos_csv(ruta, partes):
+    """Fin de la cabecera y 'partes' rangos de bytes (inicio, fin) que empiezan en un registro del CSV
+
+    Un salto de línea separa dos registros si antes de él hay un número par de comillas (una comilla
+    escapada "" cuenta dos), así que basta contarlas: bytes.count va a velocidad de C, mucho más rápido
+    que parsear el archivo. Los campos entre comillas con saltos de línea no se parten.
+    """
+    tamano = os.path.getsize(ruta)
+    objetivos = [0] + [tamano * k // partes for k in range(1, partes)]
+    cortes = []
+    comillas = 0
+    posicion = 0  # Bytes del archivo anteriores al trozo actual
+    with open(ruta, 'rb') as f:
+        for chunk in _leer_chunks(f):
+            contadas = 0  # Hasta dónde se han sumado ya las comillas de este trozo
+            buscar = 0
+            while objetivos:
+                buscar = max(buscar, objetivos[0] - posicion)
+                salto = chunk.find(b'\n', buscar)
+                if salto < 0:
+                    break
+                comillas += chunk.count(b'"', contadas, salto)
+                contadas = buscar = salto + 1
+                if comillas % 2 == 0:
+                    cortes.append(posicion + salto + 1)
+                    objetivos.pop(0)
+            if not objetivos:
+                break
+            comillas += chunk.count(b'"', contadas)
+            posicion += len(chunk)
+
+    cortes += [tamano] * (partes + 1 - len(cortes))  # Archivo con menos registros que partes
+    return cortes[0], list(zip(cortes[:-1], cortes[1:]))
+
+
+def _leer_cabecera(ruta, fin, columnas_por_defecto):
+    with open(ruta, 'rb') as f:
+        lineas = lineas_desde_chunks(_leer_chunks(f, fin))
+        return columnas_de_cabecera(next(csv.reader(lineas), None) or [], columnas_por_defecto)
+
+
+def _inicializar_proceso():
+    # Cada proceso del pool arranca de cero ('spawn'): cargamos Django, que abre su propia conexión a Mongo
+    import django
+    django.setup()
+
+
+def _volcar(carpeta, origen, destino, filas):
+    with open(os.path.join(carpeta, f'{origen}-{destino}.pickle'), 'ab') as f:
+        pickle.dump(filas, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _repartir_rango(ruta, inicio, fin, columnas, indice, partes, carpeta, tamano_lote):
+    """Fase 1: parsea su rango de bytes y aparta cada fila para el proceso dueño de su título
+
+    Las filas van numeradas desde 0 dentro del rango (el número del archivo se sabe al acabar todos los
+    rangos). Devuelve cuántas filas tiene el rango.
+    """
+    pendientes = [[] for _ in range(partes)]
+    numero = -1
+    with open(ruta, 'rb') as f:
+        f.seek(inicio)
+        for numero, row in enumerate(row for row in csv.reader(lineas_desde_chunks(_leer_chunks(f, fin - inicio)))
+                                     if row):
+            fila = dict(zip(columnas, row))
+            destino = particion_de(fila.get('titulo'), partes)
+            pendientes[destino].append((numero, fila))
+            if len(pendientes[destino]) >= tamano_lote:
+                _volcar(carpeta, indice, destino, pendientes[destino])
+                pendientes[destino] = []
+    for destino, filas in enumerate(pendientes):
+        if filas:
+            _volcar(carpeta, indice, destino, filas)
+    return numero + 1
+
+
+def _filas_apartadas(carpeta, destino, primeras):
+    """Las filas de un dueño en el orden del archivo: rango a rango, con su número de fila del archivo"""
+    for origen, primera in enumerate(primeras):
+        try:
+            f = open(os.path.join(carpeta, f'{origen}-{destino}.pickle'), 'rb')
+        except FileNotFoundError:
+            continue
+        with f:
+            while True:
+                try:
+                    filas = pickle.load(f)
+                except EOFError:
+                    break
+                for numero, fila in filas:
+                    yield primera + numero, fila
+
+
+def _importar_particion(carpeta, destino, primeras, tamano_lote):
+    """Fase 2: escribe las filas de los títulos de su partición"""
+    resultado = importar_numeradas(_filas_apartadas(carpeta, destino, primeras), tamano_lote=tamano_lote)
+    return {
+        'filas': resultado.filas,
+        'nuevos': resultado.nuevos,
+        'actualizados': resultado.actualizados,
+        'categorias_creadas': resultado.categorias_creadas,
+        'fallidas': resultado.fallidas,
+    }
+
+
+def _importar_en_paralelo(ruta, columnas_por_defecto, tamano_lote, procesos, progreso):
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto, initializer=_inicializar_proceso) as pool:
+        return importar_con_pool(pool, ruta, columnas_por_defecto, tamano_lote, procesos, progreso)
+
+
+def importar_con_pool(pool, ruta, columnas_por_defecto, tamano_lote, partes, progreso=None):
+    """Importa el archivo en dos fases repartidas entre los procesos de 'pool'
+
+    El upsert es por 'titulo', que no es único (puede haber remakes con el mismo título): si dos procesos
+    escribieran a la vez el mismo título nuevo, los dos lo insertarían. Por eso:
+      1. Cada proceso parsea solo su rango de bytes (rangos_csv) y aparta cada fila en un archivo temporal
+         para el dueño de su título (crc32 del título): el archivo se parsea una sola vez en total.
+      2. Cada dueño escribe las filas de sus títulos en el orden del archivo, con sus números de fila.
+    Lo que se añade es escribir y releer las filas apartadas (pickle en un temporal), bastante menos que
+    parsear el CSV. Las categorías se crean con insert_many sobre el índice único de 'nombre': si dos
+    procesos crean la misma a la vez, una inserción falla y ese proceso relee la que creó el otro.
+    """
+    fin_cabecera, rangos = rangos_csv(ruta, partes)
+    columnas = _leer_cabecera(ruta, fin_cabecera, columnas_por_defecto)
+    resultado = ResultadoImportacion()
+    with tempfile.TemporaryDirectory(prefix='importacion-') as carpeta:
+        repartos = [pool.submit(_repartir_rango, ruta, inicio, fin, columnas, indice, partes, carpeta, tamano_lote)
+                    for indice, (inicio, fin) in enumerate(rangos)]
+        filas_por_rango = [reparto.result() for reparto in repartos]
+        # Número de fila de la primera de cada rango (la 1 es la cabecera)
+        primeras = [2 + sum(filas_por_rango[:indice]) for indice in range(partes)]
+
+        futuros = [pool.submit(_importar_particion, carpeta, destino, primeras, tamano_lote)
+                   for destino in range(partes)]
+        for futuro in as_completed(futuros):
+            resultado.sumar(futuro.result())
+            if progreso:
+                progreso(resultado)
+
+    resultado.fallidas.sort()
+    return resultado
+
+
+# --- IMPORTACIÓN EN SEGUNDO PLANO (importar_csv) ---
+# El hilo vive dentro del worker web: si el worker se recicla o se cae a mitad, nadie marca el trabajo.
+# Mientras importa renueva 'latido'; marcar_trabajos_colgados da por perdidos los que llevan
+# demasiado sin latir y borra su temporal.
+ESTADOS_ACTIVOS = ['pendiente', 'en_curso']
+
+
+def lanzar_importacion(archivo, trabajo, procesos=1):
+    """Vuelca la subida a un temporal trozo a trozo y la importa en un hilo aparte"""
+    # El UploadedFile deja de existir al acabar la petición, así que lo copiamos a disco sin cargarlo en memoria
+    with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as temporal:
+        try:
+            for chunk in archivo.chunks():
+                temporal.write(chunk)
+        except BaseException:
+            temporal.close()
+            os.remove(temporal.name)
+            raise
+
+    TrabajoImportacion.objects(id=trabajo.id).update_one(set__archivo_temporal=temporal.name,
+                                                         set__latido=datetime.datetime.now())
+    hilo = threading.Thread(target=_ejecutar_importacion, args=(temporal.name, trabajo.id, procesos), daemon=True)
+    hilo.start()
+    return hilo
+
+
+def _latir(trabajo, parar):
+    intervalo = max(1, settings.IMPORTACION_LATIDO_MAXIMO // 3)
+    while not parar.wait(intervalo):
+        trabajo.update_one(set__latido=datetime.datetime.now())
+
+
+def _ejecutar_importacion(ruta, trabajo_id, procesos):
+    trabajo = TrabajoImportacion.objects(id=trabajo_id)
+    parar = threading.Event()
+
+    def progreso(resultado):
+        trabajo.update_one(set__filas=resultado.filas, set__nuevos=resultado.nuevos,
+                           set__actualizados=resultado.actualizados,
+                           set__categorias_creadas=resultado.categorias_creadas,
+                           set__total_fallidas=len(resultado.fallidas),
+                           set__latido=datetime.datetime.now())
+
+    try:
+        trabajo.update_one(set__estado='en_curso', set__latido=datetime.datetime.now())
+        threading.Thread(target=_latir, args=(trabajo, parar), daemon=True).start()
+        resultado = importar_archivo(ruta, columnas_por_defecto=COLUMNAS_IMPORTAR_CSV,
+                                     procesos=procesos, progreso=progreso)
+        progreso(resultado)
+        trabajo.update_one(
+            set__estado='terminado',
+            set__fallidas=[f"Fila {n} '{t}': {e}" for n, t, e in resultado.fallidas[:MAX_FALLIDAS_GUARDADAS]],
+            set__mensaje=f"{resultado.filas} filas en {resultado.segundos:.1f}s",
+            set__fecha_fin=datetime.datetime.now()
+        )
+    except Exception as e:
+        trabajo.update_one(set__estado='error', set__mensaje=str(e), set__fecha_fin=datetime.datetime.now())
+    finally:
+        parar.set()
+        _borrar_temporal(ruta)
+        trabajo.update_one(unset__archivo_temporal=True)
+
+
+def _borrar_temporal(ruta):
+    try:
+        os.remove(ruta)
+    except (FileNotFoundError, TypeError):
+        pass
+
+
+def marcar_trabajos_colgados():
+    """Pasa a 'error' los trabajos pendientes o en curso sin latido reciente; devuelve cuántos"""
+    limite = datetime.datetime.now() - datetime.timedelta(seconds=settings.IMPORTACION_LATIDO_MAXIMO)
+    # Los trabajos de antes de que existiera el latido se juzgan por su fecha de creación
+    sin_latir = {'estado': {'$in': ESTADOS_ACTIVOS}, '$or': [
+        {'latido': {'$lt': limite}},
+        {'latido': None, 'fecha_creacion': {'$lt': limite}},
+    ]}
+    colgados = 0
+    for trabajo in TrabajoImportacion.objects(__raw__=sin_latir).only('archivo_temporal'):
+        # Con la misma condición: si el hilo ha vuelto a latir entretanto, no se toca
+        marcado = TrabajoImportacion.objects(__raw__=dict(sin_latir, _id=trabajo.id)).update_one(
+            set__estado='error', set__fecha_fin=datetime.datetime.now(), unset__archivo_temporal=True,
+            set__mensaje="La importación se interrumpió (el proceso que la ejecutaba se detuvo). Vuelve a subir el archivo.")
+        if marcado:
+            colgados += 1
+            _borrar_temporal(trabajo.archivo_temporal)
+    return colgados
@@ -0,0 +1,73 @@
+import re
+
+from bson import ObjectId
+
+from .busqueda import filtro_busqueda
+from .models import Categoria, Clasificacion, Elemento, Generacion, Ranking, TrabajoImportacion, Valoracion
+
+MODELOS = (Categoria, Elemento, Valoracion, Ranking, Generacion, TrabajoImportacion, Clasificacion)
+
+# --- CONSULTAS CRÍTICAS ---
+# Una muestra de cada consulta que lanzan las vistas en caliente. verificar_indices les pasa explain()
+# para comprobar que ninguna recorre la colección entera. Si añades una vista con una consulta nueva,
+# regístrala aquí junto al índice que la sirve.
+_ID = ObjectId()
+
+CONSULTAS_CRITICAS = {
+    'catalogo': lambda: Elemento.objects(tipo='P').order_by('id').limit(25),
+    'catalogo_por_categoria': lambda: Elemento.objects(tipo='P', categoria=_ID).order_by('id').limit(25),
+    'busqueda': lambda: Elemento.objects(tipo='P', __raw__=filtro_busqueda(['acc'])).limit(500),
+    'busqueda_por_titulo': lambda: Elemento.objects(tipo='P', titulo_busqueda=re.compile('^el pa')).order_by('titulo_busqueda').limit(500),
+    'importacion_por_titulo': lambda: Elemento.objects(titulo='Título'),
+    'elementos_de_categoria': lambda: Elemento.objects(categoria=_ID),
+    'panel_ranking': lambda: Elemento.objects(categoria=_ID).order_by('-orden', 'id').limit(25),
+    'resenas_de_elemento': lambda: Valoracion.objects(elemento=_ID).order_by('-fecha', '-id').limit(21),
+    'valoracion_del_usuario': lambda: Valoracion.objects(usuario_id=1, elemento=_ID),
+    'rankings_del_usuario': lambda: Ranking.objects(usuario_id=1),
+    'rankings_con_elemento': lambda: Ranking.objects(elementos=_ID),
+    'generacion': lambda: Generacion.objects(clave='categorias'),
+    'clasificacion': lambda: Clasificacion.objects(modo='ponderada', tipo='P', categoria=None),
+}
+
+
+def _coleccion(modelo):
+    # Sin pasar por _get_collection(), que crearía por su cuenta los índices que falten
+    return modelo._get_db()[modelo._get_collection_name()]
+
+
+def _claves(indice):
+    return [(campo, int(orden) if isinstance(orden, (int, float)) else orden) for campo, orden in indice]
+
+
+def comparar_indices(modelo):
+    """Devuelve (faltan, sobran): índices declarados en el modelo que no están en Mongo y al revés"""
+    declarados = {tuple(_claves(spec['fields'])): spec for spec in modelo._meta.get('index_specs') or []}
+    reales = {tuple(_claves(info['key'])): nombre
+              for nombre, info in _coleccion(modelo).index_information().items() if nombre != '_id_'}
+    faltan = [spec for claves, spec in declarados.items() if claves not in reales]
+    sobran = [nombre for claves, nombre in reales.items() if claves not in declarados]
+    return faltan, sobran
+
+
+def crear_indice(modelo, spec):
+    """Construye un índice declarado; background=True para no bloquear la colección en servidores antiguos"""
+    opciones = {k: v for k, v in spec.items() if k != 'fields'}
+    return _coleccion(modelo).create_index(spec['fields'], background=True, **opciones)
+
+
+def _etapas(plan):
+    """Todas las etapas ('IXSCAN', 'FETCH', 'COLLSCAN', 'SORT'...) de un plan de explain()"""
+    if isinstance(plan, dict):
+        etapas = [plan['stage']] if 'stage' in plan else []
+        for valor in plan.values():
+            etapas += _etapas(valor)
+        return etapas
+    if isinstance(plan, list):
+        return [etapa for valor in plan for etapa in _etapas(valor)]
+    return []
+
+
+def analizar_consulta(consulta):
+    """Etapas del plan ganador de una consulta registrada"""
+    plan = consulta().explain()
+    return _etapas(plan.get('queryPlanner', {}).get('winningPlan', plan))
@@ -0,0 +1,60 @@
+from bson import ObjectId
+
+from .cache_paginas import gen_rankings_usuario, subir_generacion
+from .models import Ranking
+
+# $slice con posición necesita una longitud positiva: con esta nos quedamos con todo el resto del array
+HASTA_EL_FINAL = 2 ** 31 - 1
+
+
+# --- LISTAS PERSONALES: CAMBIOS ATÓMICOS ---
+# Cada operación es un único update en Mongo (sin leer la lista, tocarla en Python y guardarla entera),
+# así dos peticiones simultáneas sobre el mismo ranking no se pisan. Si algo cambia se sube el contador
+# de listas del usuario, del que dependen los ETag de la API.
+
+def _ranking(ranking_id, usuario_id):
+    return Ranking.objects(id=ranking_id, usuario_id=usuario_id)
+
+
+def anadir_a_lista(ranking_id, usuario_id, elemento_id):
+    """Añade el elemento al final si no estaba: True si se añadió, False si ya estaba, None si no hay ranking"""
+    resultado = _ranking(ranking_id, usuario_id).update_one(
+        add_to_set__elementos=ObjectId(elemento_id), full_result=True)
+    if not resultado.matched_count:
+        return None
+    if resultado.modified_count:
+        subir_generacion(gen_rankings_usuario(usuario_id))
+    return resultado.modified_count > 0
+
+
+def quitar_de_lista(ranking_id, usuario_id, elemento_id):
+    """Quita el elemento: True si estaba, False si no, None si no hay ranking"""
+    resultado = _ranking(ranking_id, usuario_id).update_one(
+        pull__elementos=ObjectId(elemento_id), full_result=True)
+    if not resultado.matched_count:
+        return None
+    if resultado.modified_count:
+        subir_generacion(gen_rankings_usuario(usuario_id))
+    return resultado.modified_count > 0
+
+
+def mover_en_lista(ranking_id, usuario_id, elemento_id, posicion):
+    """Lleva el elemento a 'posicion' (desde 0) en una sola actualización; False si no está en la lista"""
+    elemento_id = ObjectId(elemento_id)
+    # La posición viene del formulario: más allá del final es el final. Sin acotarla, por encima de 2^31
+    # $slice la rechaza y por encima de 2^63 ni siquiera se puede codificar en BSON
+    posicion = min(max(0, int(posicion)), HASTA_EL_FINAL)
+    # El servidor quita el elemento y lo vuelve a insertar en su sitio dentro del mismo update,
+    # sin que la lista viaje al cliente
+    resto = {'$filter': {'input': '$elementos', 'cond': {'$ne': ['$$this', elemento_id]}}}
+    resultado = Ranking._get_collection().update_one(
+        {'_id': ObjectId(ranking_id), 'usuario_id': usuario_id, 'elementos': elemento_id},
+        [{'$set': {'elementos': {'$concatArrays': [
+            {'$slice': [resto, posicion]},
+            [elemento_id],
+            {'$slice': [resto, posicion, HASTA_EL_FINAL]},
+        ]}}}]
+    )
+    if resultado.modified_count:
+        subir_generacion(gen_rankings_usuario(usuario_id))
+    return resultado.matched_count > 0
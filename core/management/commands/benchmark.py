@@ -0,0 +1,111 @@
+import datetime
+import json
+import subprocess
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from core import benchmark, soporte_pruebas
+from core.autocompletar import invalidar_autocompletar
+from core.categorias import invalidar_categorias
+from core.rankings import calcular_clasificaciones
+
+
+class Command(BaseCommand):
+    help = ('Genera un catálogo sintético en una base de datos aparte, mide las vistas principales y '
+            'cargar_csv, y guarda un informe JSON comparable entre commits')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escala', default='1k',
+                            help='Elementos a generar: 1k, 100k, 1m o un número (por defecto 1k)')
+        parser.add_argument('--mongo', default=benchmark.MONGO_LOCAL,
+                            help=f"URI del mongod local (por defecto {benchmark.MONGO_LOCAL}) o 'mongomock'")
+        parser.add_argument('--repeticiones', type=int, default=20,
+                            help='Veces que se pide cada vista (por defecto 20)')
+        parser.add_argument('--filas-csv', type=int, default=5000,
+                            help='Filas del CSV sintético para medir cargar_csv (por defecto 5000, 0 para omitirlo)')
+        parser.add_argument('--salida', help='Ruta del informe JSON (por defecto benchmark-<escala>.json)')
+        parser.add_argument('--semilla', type=int, default=42)
+
+    def handle(self, *args, **options):
+        escala = options['escala'].lower()
+        try:
+            n = benchmark.ESCALAS.get(escala) or int(escala)
+        except ValueError:
+            raise CommandError(f"Escala no válida: {escala}")
+        usuarios = max(50, n // 20)
+        salida = options['salida'] or f'benchmark-{escala}.json'
+
+        # Usuarios de Django en una base de datos de pruebas y Mongo en 'cinerank_benchmark': no tocamos datos reales
+        setup_test_environment()
+        nombre_original = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(METRICAS_MONGO_MUESTREO=0):
+                try:
+                    soporte_pruebas.conectar(options['mongo'], benchmark.BASE_DATOS)
+                except ImportError:
+                    raise CommandError("Instala mongomock o indica la URI de un mongod con --mongo")
+                cache.clear()
+                invalidar_categorias()
+                invalidar_autocompletar()
+
+                self.stdout.write(f" Generando {n} elementos y {usuarios} usuarios...")
+                inicio = time.perf_counter()
+                catalogo = benchmark.generar_catalogo(n, usuarios, semilla=options['semilla'])
+                segundos_generacion = time.perf_counter() - inicio
+                self.stdout.write(f"   {catalogo['valoraciones']} valoraciones, {catalogo['rankings']} rankings "
+                                  f"({segundos_generacion:.1f}s)")
+
+                usuario = User.objects.create_user(id=1, username='benchmark', password='benchmark')
+                cliente = Client()
+                cliente.force_login(usuario)
+
+                # Las clasificaciones del ranking global se precalculan, como haría el cron en producción
+                resultados = {'calcular_clasificaciones': benchmark.medir(calcular_clasificaciones, 1)}
+                self._mostrar('calcular_clasificaciones', resultados['calcular_clasificaciones'])
+                for nombre, peticion in benchmark.escenarios(cliente, catalogo).items():
+                    try:
+                        resultados[nombre] = benchmark.medir(peticion, options['repeticiones'])
+                    except Exception as e:
+                        # Con mongomock algunas vistas fallan por operadores que no implementa
+                        resultados[nombre] = {'error': f'{type(e).__name__}: {e}'}
+                        self.stdout.write(self.style.ERROR(f"   {nombre:<20} {resultados[nombre]['error']}"))
+                        continue
+                    self._mostrar(nombre, resultados[nombre])
+                if options['filas_csv']:
+                    resultados['cargar_csv'] = benchmark.medir_importacion(options['filas_csv'])
+                    self._mostrar('cargar_csv', resultados['cargar_csv'])
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            teardown_test_environment()
+
+        informe = {
+            'fecha': datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit': self._commit(),
+            'escala': escala,
+            'mongo': 'mongomock' if options['mongo'] == 'mongomock' else 'mongod',
+            'repeticiones': options['repeticiones'],
+            'catalogo': catalogo,
+            'generacion_s': round(segundos_generacion, 1),
+            'rss_max_mb': benchmark.rss_maximo_mb(),
+            'escenarios': resultados,
+        }
+        with open(salida, 'w', encoding='utf-8') as archivo:
+            json.dump(informe, archivo, indent=2, ensure_ascii=False, sort_keys=True)
+        self.stdout.write(self.style.SUCCESS(f" Informe guardado en {salida}"))
+
+    def _mostrar(self, nombre, resultado):
+        self.stdout.write(f"   {nombre:<20} p50 {resultado['p50_ms']:>8.1f} ms   p95 {resultado['p95_ms']:>8.1f} ms   "
+                          f"{resultado['comandos_p50']:>4} comandos   RSS {resultado['rss_max_mb']} MB")
+
+    def _commit(self):
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
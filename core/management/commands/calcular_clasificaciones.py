@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.rankings import calcular_clasificaciones
+
+
+class Command(BaseCommand):
+    help = ('Recalcula las clasificaciones del ranking global (ponderada, bayesiana, Wilson y media simple) '
+            'por tipo y por categoría. Con --cada se queda en marcha y las recalcula periódicamente')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamano', type=int,
+                            help='Elementos que se guardan en cada clasificación (por defecto RANKING_TAMANO)')
+        parser.add_argument('--cada', type=int, default=0,
+                            help='Segundos entre cálculos; 0 (por defecto) calcula una vez y termina')
+
+    def handle(self, *args, **options):
+        while True:
+            inicio = time.perf_counter()
+            resultado = calcular_clasificaciones(tamano=options['tamano'])
+            self.stdout.write(self.style.SUCCESS(
+                f" {resultado['clasificaciones']} clasificaciones guardadas en {time.perf_counter() - inicio:.1f}s "
+                f"(media del catálogo {resultado['media_global']})"))
+            if not options['cada']:
+                return
+            time.sleep(options['cada'])
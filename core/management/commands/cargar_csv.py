@@ -1,15 +1,23 @@
-import csv
 import os
-import re # Importamos expresiones regulares para separar géneros
 from django.core.management.base import BaseCommand
 from django.conf import settings
-from core.models import Elemento, Categoria
+from core.importacion import importar_archivo, COLUMNAS_CSV, TAMANO_LOTE
+from core.models import Categoria
 
 class Command(BaseCommand):
     help = 'Carga peliculas.csv separando los géneros y creando categorías únicas'
 
-    def handle(self, *args, **kwargs):
-        file_path = os.path.join(settings.BASE_DIR, 'peliculas.csv')
+    def add_arguments(self, parser):
+        parser.add_argument('--archivo', default=os.path.join(settings.BASE_DIR, 'peliculas.csv'),
+                            help='Ruta del CSV a cargar (por defecto peliculas.csv en la raíz del proyecto)')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE,
+                            help=f'Filas por cada bulk_write (por defecto {TAMANO_LOTE})')
+        parser.add_argument('--procesos', type=int, default=1,
+                            help='Procesos en paralelo: cada uno parsea un trozo del archivo y cada título '
+                                 'lo escribe siempre el mismo proceso')
+
+    def handle(self, *args, **options):
+        file_path = options['archivo']
 
         if not os.path.exists(file_path):
             self.stdout.write(self.style.ERROR(f' No encuentro el archivo: {file_path}'))
@@ -17,85 +25,24 @@ class Command(BaseCommand):
 
         self.stdout.write(f" Procesando archivo: {file_path}")
 
-        nuevos = 0
-        actualizados = 0
-        cats_creadas = 0
+        def progreso(resultado):
+            self.stdout.write(f"   {resultado.filas} filas ({resultado.filas_por_segundo:.0f} filas/s)")
 
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-
-                for row in reader:
-                    try:
-                        titulo = row['titulo'].strip()
-                        # Obtenemos la cadena completa de categorías (ej: "Thriller - Crimen")
-                        raw_categorias = row['categoria'].strip()
-
-                        # --- PASO 1: SEPARAR GÉNEROS ---
-                        # Usamos regex para separar por " - ", " / ", o ","
-                        # Esto convierte "Biografía - Música" en ["Biografía", "Música"]
-                        lista_generos = re.split(r'\s*[\-\/]\s*|\s*,\s*', raw_categorias)
-
-                        # Filtramos vacíos y limpiamos espacios
-                        lista_generos = [g.strip() for g in lista_generos if g.strip()]
-
-                        categoria_principal = None
-
-                        # --- PASO 2: CREAR TODAS LAS CATEGORÍAS ENCONTRADAS ---
-                        for index, nombre_cat in enumerate(lista_generos):
-                            # Buscar si existe (insensible a mayúsculas/minúsculas para evitar duplicados como "Drama" y "drama")
-                            # Nota: Mongo es case-sensitive por defecto, así que buscamos exacto primero.
-                            cat_obj = Categoria.objects(nombre=nombre_cat).first()
-
-                            if not cat_obj:
-                                cat_obj = Categoria(
-                                    nombre=nombre_cat,
-                                    descripcion=f"Películas del género {nombre_cat}"
-                                )
-                                cat_obj.save()
-                                cats_creadas += 1
-                                self.stdout.write(self.style.SUCCESS(f"   Categoría creada: {nombre_cat}"))
-
-                            # La primera categoría de la lista será la PRINCIPAL para la película
-                            if index == 0:
-                                categoria_principal = cat_obj
-
-                        # --- PASO 3: GUARDAR PELÍCULA ---
-                        anio = int(row['anio']) if row['anio'].isdigit() else 0
-
-                        elemento = Elemento.objects(titulo=titulo).first()
-
-                        if elemento:
-                            elemento.anio = anio
-                            elemento.categoria = categoria_principal # Asignamos la primera (ej: "Biografía")
-                            elemento.descripcion = row['descripcion']
-                            elemento.imagen_url = row['imagen_url']
-                            elemento.tipo = row.get('tipo', 'P').strip().upper()
-                            elemento.director = row.get('director', 'Desconocido')
-                            elemento.actores = row.get('actores', 'Varios')
-                            elemento.save()
-                            actualizados += 1
-                        else:
-                            Elemento(
-                                titulo=titulo,
-                                anio=anio,
-                                categoria=categoria_principal,
-                                descripcion=row['descripcion'],
-                                imagen_url=row['imagen_url'],
-                                tipo=row.get('tipo', 'P').strip().upper(),
-                                director=row.get('director', 'Desconocido'),
-                                actores=row.get('actores', 'Varios')
-                            ).save()
-                            nuevos += 1
-                            self.stdout.write(f"  [+] Película: {titulo} ({categoria_principal.nombre})")
-
-                    except Exception as e:
-                        self.stdout.write(self.style.ERROR(f"️ Error fila '{row.get('titulo')}': {e}"))
-
+            # El archivo se lee en streaming y se importa por lotes (en paralelo si se pide)
+            resultado = importar_archivo(file_path, columnas_por_defecto=COLUMNAS_CSV, tamano_lote=options['lote'],
+                                         procesos=options['procesos'], progreso=progreso)
         except Exception as e:
             self.stdout.write(self.style.ERROR(f" Error archivo: {e}"))
+            return
 
         self.stdout.write(self.style.SUCCESS(f"\n FIN DEL PROCESO "))
         self.stdout.write(f" Categorías únicas aseguradas: {Categoria.objects.count()}")
-        self.stdout.write(f" Categorías nuevas en esta ejecución: {cats_creadas}")
-        self.stdout.write(f" Películas procesadas: {nuevos + actualizados}")
\ No newline at end of file
+        self.stdout.write(f" Categorías nuevas en esta ejecución: {resultado.categorias_creadas}")
+        self.stdout.write(f" Películas nuevas: {resultado.nuevos} | actualizadas: {resultado.actualizados}")
+        self.stdout.write(f" Tiempo: {resultado.segundos:.1f}s ({resultado.filas_por_segundo:.0f} filas/s)")
+
+        if resultado.fallidas:
+            self.stdout.write(self.style.ERROR(f" Filas con error: {len(resultado.fallidas)}"))
+            for numero, titulo, error in resultado.fallidas:
+                self.stdout.write(self.style.ERROR(f"   Fila {numero} '{titulo}': {error}"))
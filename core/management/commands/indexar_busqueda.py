@@ -0,0 +1,103 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from mongoengine.context_managers import switch_collection
+from pymongo import UpdateOne
+
+from core.busqueda import buscar, filtro_busqueda, palabras, palabras_busqueda, titulo_busqueda
+from core.models import Elemento
+
+# Vocabulario para el catálogo sintético del benchmark (con tildes a propósito)
+PALABRAS_TITULO = ['acción', 'último', 'corazón', 'noche', 'camión', 'sueño', 'guerra', 'pájaro', 'río',
+                   'ciudad', 'héroe', 'misión', 'fantasma', 'jardín', 'océano', 'ladrón', 'canción',
+                   'invierno', 'estrella', 'demonio', 'águila', 'isla', 'tren', 'máquina', 'espíritu']
+NOMBRES = ['Pedro', 'Almudena', 'Álex', 'Icíar', 'Fernando', 'Penélope', 'Javier', 'Belén', 'Íñigo', 'Ramón']
+APELLIDOS = ['Almodóvar', 'Bollaín', 'Amenábar', 'Cruz', 'Bardem', 'Trueba', 'Coixet', 'Sánchez', 'Muñoz']
+CONSULTAS = ['accion', 'Acción', 'ultimo cora', 'cami', 'almodovar', 'penelope cruz', 'rio noche', 'zzz']
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las claves de búsqueda (palabras y título) de todos los elementos (o mide la búsqueda con --benchmark N)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000,
+                            help='Número de elementos por cada bulk_write (por defecto 1000)')
+        parser.add_argument('--benchmark', type=int, metavar='N',
+                            help='Genera N títulos en una colección temporal y compara icontains con el índice')
+        parser.add_argument('--repeticiones', type=int, default=20,
+                            help='Veces que se lanza cada consulta en el benchmark (por defecto 20)')
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            self.benchmark(options['benchmark'], options['lote'], options['repeticiones'])
+            return
+
+        Elemento.ensure_indexes()
+        coleccion = Elemento._get_collection()
+        operaciones = []
+        total = 0
+        for doc in coleccion.find({}, {'titulo': 1, 'director': 1, 'actores': 1}):
+            clave = palabras_busqueda(doc.get('titulo'), doc.get('director'), doc.get('actores'))
+            operaciones.append(UpdateOne({'_id': doc['_id']}, {'$set': {
+                'palabras_busqueda': clave, 'titulo_busqueda': titulo_busqueda(doc.get('titulo'))}}))
+            if len(operaciones) >= options['lote']:
+                total += coleccion.bulk_write(operaciones, ordered=False).modified_count
+                operaciones = []
+        if operaciones:
+            total += coleccion.bulk_write(operaciones, ordered=False).modified_count
+
+        self.stdout.write(self.style.SUCCESS(f" Palabras de búsqueda actualizadas en {total} elementos."))
+
+    # --- BENCHMARK ---
+    def benchmark(self, n, tamano_lote, repeticiones):
+        azar = random.Random(42)
+        nombre = f'elemento_benchmark_{int(time.time())}'
+        self.stdout.write(f" Generando {n} títulos en la colección temporal '{nombre}'...")
+
+        with switch_collection(Elemento, nombre) as Temporal:
+            coleccion = Temporal._get_collection()
+            try:
+                lote = []
+                for i in range(n):
+                    titulo = ' '.join(azar.sample(PALABRAS_TITULO, azar.randint(2, 4))).capitalize() + f' {i}'
+                    director = f'{azar.choice(NOMBRES)} {azar.choice(APELLIDOS)}'
+                    actores = ', '.join(f'{azar.choice(NOMBRES)} {azar.choice(APELLIDOS)}' for _ in range(3))
+                    lote.append({'titulo': titulo, 'director': director, 'actores': actores, 'tipo': 'P',
+                                 'palabras_busqueda': palabras_busqueda(titulo, director, actores),
+                                 'titulo_busqueda': titulo_busqueda(titulo)})
+                    if len(lote) >= tamano_lote:
+                        coleccion.insert_many(lote, ordered=False)
+                        lote = []
+                if lote:
+                    coleccion.insert_many(lote, ordered=False)
+                Temporal.ensure_indexes()
+
+                self.stdout.write(f" {'consulta':<16} {'icontains p50/p95 ms':>22} {'índice p50/p95 ms':>20}  plan")
+                for consulta in CONSULTAS:
+                    antes = self._medir(repeticiones, lambda: list(
+                        Temporal.objects(tipo='P', titulo__icontains=consulta).limit(24)))
+                    despues = self._medir(repeticiones, lambda: buscar(Temporal.objects(tipo='P'), consulta))
+                    self.stdout.write(f" {consulta:<16} {antes:>22} {despues:>20}  {self._plan(Temporal, consulta)}")
+            finally:
+                coleccion.drop()
+
+    def _medir(self, repeticiones, consulta):
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            consulta()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        tiempos.sort()
+        p95 = tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))]
+        return f'{statistics.median(tiempos):.1f}/{p95:.1f}'
+
+    def _plan(self, modelo, consulta):
+        """Indica si la consulta de búsqueda recorre el índice (IXSCAN) o la colección entera (COLLSCAN)"""
+        filtro = filtro_busqueda(palabras(consulta))
+        try:
+            plan = str(modelo.objects(tipo='P', __raw__=filtro).explain())
+        except Exception:
+            return '?'
+        return 'IXSCAN' if 'IXSCAN' in plan else 'COLLSCAN'
@@ -0,0 +1,87 @@
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ('Prueba de carga HTTP contra un servidor en marcha (p. ej. gunicorn con WSGI y uvicorn con ASGI): '
+            'peticiones por segundo y latencias p50/p95/p99 por ruta')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Servidor (por defecto http://127.0.0.1:8000)')
+        parser.add_argument('--rutas', nargs='+', default=['/', '/series/', '/ranking/'],
+                            help='Rutas que se piden, por turnos (por defecto /, /series/ y /ranking/)')
+        parser.add_argument('--concurrencia', type=int, default=32, help='Clientes simultáneos (por defecto 32)')
+        parser.add_argument('--duracion', type=float, default=20, help='Segundos de prueba (por defecto 20)')
+        parser.add_argument('--sin-cache', action='store_true',
+                            help='Añade ?_=n a cada petición para que no se sirvan páginas cacheadas')
+        parser.add_argument('--salida', help='Guarda el resultado en un JSON para comparar despliegues')
+
+    def handle(self, *args, **options):
+        url = options['url'].rstrip('/')
+        rutas = options['rutas']
+        try:
+            urllib.request.urlopen(url + rutas[0], timeout=10).read()
+        except (OSError, urllib.error.URLError) as e:
+            raise CommandError(f"No se puede conectar con {url}: {e}")
+
+        tiempos = {ruta: [] for ruta in rutas}
+        errores = {ruta: 0 for ruta in rutas}
+        lock = threading.Lock()
+        fin = time.perf_counter() + options['duracion']
+
+        def cliente(numero):
+            contador = 0
+            while time.perf_counter() < fin:
+                ruta = rutas[(numero + contador) % len(rutas)]
+                destino = url + ruta
+                if options['sin_cache']:
+                    destino += ('&' if '?' in ruta else '?') + f'_={numero}-{contador}'
+                contador += 1
+                inicio = time.perf_counter()
+                try:
+                    urllib.request.urlopen(destino, timeout=30).read()
+                except (OSError, urllib.error.URLError):
+                    with lock:
+                        errores[ruta] += 1
+                    continue
+                with lock:
+                    tiempos[ruta].append((time.perf_counter() - inicio) * 1000)
+
+        self.stdout.write(f" {options['concurrencia']} clientes durante {options['duracion']:.0f}s contra {url}...")
+        hilos = [threading.Thread(target=cliente, args=(i,)) for i in range(options['concurrencia'])]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        resultado = {'url': url, 'concurrencia': options['concurrencia'], 'duracion_s': options['duracion'], 'rutas': {}}
+        for ruta in rutas:
+            muestras = sorted(tiempos[ruta])
+            if not muestras:
+                resultado['rutas'][ruta] = {'peticiones': 0, 'errores': errores[ruta]}
+                continue
+            percentil = lambda p: round(muestras[min(len(muestras) - 1, int(len(muestras) * p))], 1)
+            resultado['rutas'][ruta] = {
+                'peticiones': len(muestras),
+                'errores': errores[ruta],
+                'por_segundo': round(len(muestras) / options['duracion'], 1),
+                'p50_ms': round(statistics.median(muestras), 1),
+                'p95_ms': percentil(0.95),
+                'p99_ms': percentil(0.99),
+            }
+            fila = resultado['rutas'][ruta]
+            self.stdout.write(f"   {ruta:<20} {fila['por_segundo']:>8} pet/s   p50 {fila['p50_ms']:>7} ms   "
+                              f"p95 {fila['p95_ms']:>7} ms   p99 {fila['p99_ms']:>7} ms   {fila['errores']} errores")
+        total = sum(len(t) for t in tiempos.values())
+        resultado['por_segundo'] = round(total / options['duracion'], 1)
+        self.stdout.write(self.style.SUCCESS(f" Total: {resultado['por_segundo']} peticiones por segundo"))
+
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump(resultado, archivo, indent=2, ensure_ascii=False)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from core.valoraciones import sincronizar_resumenes
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye (o solo verifica con --verificar) el resumen de valoraciones de cada elemento'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verificar', action='store_true',
+                            help='Solo informa de los resúmenes desfasados, sin corregirlos')
+        parser.add_argument('--lote', type=int, default=1000,
+                            help='Número de elementos por cada bulk_write (por defecto 1000)')
+
+    def handle(self, *args, **options):
+        verificar = options['verificar']
+        self.stdout.write(" Comparando resúmenes con las valoraciones reales...")
+
+        desfasados = sincronizar_resumenes(corregir=not verificar, tamano_lote=options['lote'])
+
+        if not desfasados:
+            self.stdout.write(self.style.SUCCESS(" Todos los resúmenes están al día."))
+            return
+
+        for elemento_id in desfasados[:20]:
+            self.stdout.write(f"   Desfasado: {elemento_id}")
+        if len(desfasados) > 20:
+            self.stdout.write(f"   ... y {len(desfasados) - 20} más")
+
+        if verificar:
+            self.stdout.write(self.style.ERROR(f" {len(desfasados)} resúmenes desfasados."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f" {len(desfasados)} resúmenes reconstruidos."))
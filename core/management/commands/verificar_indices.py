@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.indices import CONSULTAS_CRITICAS, MODELOS, analizar_consulta, comparar_indices, crear_indice
+
+
+class Command(BaseCommand):
+    help = 'Compara los índices declarados con los de Mongo y pasa explain() a las consultas críticas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--crear', action='store_true',
+                            help='Construye en segundo plano los índices declarados que falten')
+        parser.add_argument('--sin-explain', action='store_true',
+                            help='Solo compara índices, sin analizar los planes de las consultas')
+
+    def handle(self, *args, **options):
+        problemas = 0
+
+        self.stdout.write(" Índices declarados frente a los de Mongo:")
+        for modelo in MODELOS:
+            faltan, sobran = comparar_indices(modelo)
+            for spec in faltan:
+                campos = ', '.join(f'{campo} {orden}' for campo, orden in spec['fields'])
+                if options['crear']:
+                    nombre = crear_indice(modelo, spec)
+                    self.stdout.write(self.style.SUCCESS(f"   {modelo.__name__}: creado {nombre}"))
+                else:
+                    problemas += 1
+                    self.stdout.write(self.style.ERROR(f"   {modelo.__name__}: falta ({campos})"))
+            for nombre in sobran:
+                # No los borramos: pueden ser de otra versión aún desplegada
+                self.stdout.write(self.style.WARNING(f"   {modelo.__name__}: no declarado {nombre}"))
+            if not faltan and not sobran:
+                self.stdout.write(f"   {modelo.__name__}: OK")
+
+        if not options['sin_explain']:
+            self.stdout.write(" Planes de las consultas críticas:")
+            for nombre, consulta in CONSULTAS_CRITICAS.items():
+                try:
+                    etapas = analizar_consulta(consulta)
+                except Exception as e:
+                    self.stdout.write(self.style.WARNING(f"   {nombre}: sin explain ({e})"))
+                    continue
+
+                resumen = ' > '.join(etapas)
+                if 'COLLSCAN' in etapas:
+                    problemas += 1
+                    self.stdout.write(self.style.ERROR(f"   {nombre}: recorre la colección ({resumen})"))
+                elif 'SORT' in etapas:
+                    problemas += 1
+                    self.stdout.write(self.style.ERROR(f"   {nombre}: ordena en memoria ({resumen})"))
+                else:
+                    self.stdout.write(f"   {nombre}: {resumen}")
+
+        if problemas:
+            # Salimos con error para que el despliegue se pare antes de llegar a producción
+            raise CommandError(f"{problemas} problemas de índices")
+        self.stdout.write(self.style.SUCCESS(" Índices al día."))
@@ -0,0 +1,223 @@
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from pymongo import monitoring
+
+logger = logging.getLogger('core.metricas')
+
+# La medición de la petición en curso; los comandos que se lanzan fuera de una petición
+# (importaciones en segundo plano, comandos de gestión) no tienen y no se anotan.
+# Motor lanza cada operación en un hilo de su executor con una copia del contexto: la medición es la
+# misma, pero le pueden llegar eventos de varios hilos a la vez (asyncio.gather), de ahí el lock.
+_medicion = contextvars.ContextVar('medicion_mongo', default=None)
+
+
+# --- MEDICIÓN DE UNA PETICIÓN ---
+class MedicionMongo:
+    """Comandos, tiempo total y comandos más lentos que ha lanzado una petición"""
+
+    def __init__(self, lentos=3):
+        self.comandos = 0
+        self.segundos = 0.0
+        self.lentos = []  # (segundos, comando, colección), de más a menos lento
+        self.max_lentos = lentos
+        self.en_curso = {}
+        self.lock = threading.Lock()
+
+    def empezar(self, request_id, coleccion):
+        with self.lock:
+            self.en_curso[request_id] = coleccion
+
+    def terminar(self, request_id, comando, segundos):
+        with self.lock:
+            coleccion = self.en_curso.pop(request_id, None)
+            self.comandos += 1
+            self.segundos += segundos
+            if len(self.lentos) < self.max_lentos or segundos > self.lentos[-1][0]:
+                self.lentos.append((segundos, comando, coleccion))
+                self.lentos.sort(reverse=True)
+                del self.lentos[self.max_lentos:]
+
+
+class MedidorMongo(monitoring.CommandListener):
+    """Listener de pymongo que suma cada comando a la medición de la petición actual"""
+
+    def started(self, event):
+        medicion = _medicion.get()
+        if medicion is not None:
+            # getMore lleva el id del cursor en su propio campo y la colección aparte
+            coleccion = event.command.get('collection' if event.command_name == 'getMore' else event.command_name)
+            medicion.empezar(event.request_id, coleccion if isinstance(coleccion, str) else None)
+
+    def succeeded(self, event):
+        self._terminar(event)
+
+    def failed(self, event):
+        self._terminar(event)
+
+    def _terminar(self, event):
+        medicion = _medicion.get()
+        if medicion is not None:
+            medicion.terminar(event.request_id, event.command_name, event.duration_micros / 1_000_000)
+
+
+# --- POOL DE CONEXIONES DEL PROCESO ---
+class MedidorPool(monitoring.ConnectionPoolListener):
+    """Cuenta conexiones abiertas, en uso y esperas fallidas del pool de cada servidor de un cliente
+
+    Un medidor por cliente ('cliente' es su nombre en /salud/mongo/: mongoengine, motor); 'max_pool' es el
+    maxPoolSize de ese cliente, que es el límite de cada uno de sus pools.
+    """
+
+    def __init__(self, cliente, max_pool=None):
+        self.cliente = cliente
+        self.max_pool = max_pool if max_pool is not None else settings.MONGO_OPCIONES.get('maxPoolSize', 100)
+        self._lock = threading.Lock()
+        self._servidores = {}
+        _medidores_pool.append(self)
+
+    def _sumar(self, event, **incrementos):
+        servidor = '%s:%s' % event.address
+        with self._lock:
+            datos = self._servidores.setdefault(servidor, dict.fromkeys(
+                ('abiertas', 'en_uso', 'max_en_uso', 'esperas_fallidas', 'vaciados'), 0))
+            for campo, n in incrementos.items():
+                datos[campo] += n
+            datos['max_en_uso'] = max(datos['max_en_uso'], datos['en_uso'])
+
+    def connection_created(self, event):
+        self._sumar(event, abiertas=1)
+
+    def connection_closed(self, event):
+        self._sumar(event, abiertas=-1)
+
+    def connection_checked_out(self, event):
+        self._sumar(event, en_uso=1)
+
+    def connection_checked_in(self, event):
+        self._sumar(event, en_uso=-1)
+
+    def connection_check_out_failed(self, event):
+        self._sumar(event, esperas_fallidas=1)
+
+    def pool_cleared(self, event):
+        self._sumar(event, vaciados=1)
+
+    # El resto de eventos del pool no cambian los contadores
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def estado(self):
+        with self._lock:
+            return {servidor: dict(datos) for servidor, datos in self._servidores.items()}
+
+
+_medidores_pool = []
+
+
+def estado_pools():
+    """Uso de cada pool de este proceso: uno por cliente y servidor, cada uno contra su propio maxPoolSize"""
+    pools = []
+    for medidor in _medidores_pool:
+        servidores = medidor.estado()
+        for datos in servidores.values():
+            datos['utilizacion'] = round(datos['en_uso'] / medidor.max_pool, 3) if medidor.max_pool else None
+        pools.append({'cliente': medidor.cliente, 'max_pool': medidor.max_pool, 'servidores': servidores})
+    return {'pid': os.getpid(), 'pools': pools}
+
+
+# --- MIDDLEWARE ---
+def _server_timing(medicion, total):
+    partes = [f'mongo;dur={medicion.segundos * 1000:.1f};desc="{medicion.comandos} comandos"',
+              f'total;dur={total * 1000:.1f}']
+    for posicion, (segundos, comando, coleccion) in enumerate(medicion.lentos, start=1):
+        partes.append(f'mongo-lento-{posicion};dur={segundos * 1000:.1f};desc="{comando} {coleccion or ""}"')
+    return ', '.join(partes)
+
+
+class MetricasMongoMiddleware:
+    """Mide los comandos Mongo de cada petición muestreada: cabecera Server-Timing y una línea de log JSON
+
+    Funciona en los dos modos: con WSGI (o ASGI y vistas síncronas) es síncrono; con las vistas
+    asíncronas de core/vistas_async.py es asíncrono, para que Django no pase cada petición por un hilo.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.muestreo = settings.METRICAS_MONGO_MUESTREO
+        self.lentos = settings.METRICAS_MONGO_LENTOS
+        self.server_timing = settings.METRICAS_MONGO_SERVER_TIMING
+        self.asincrono = iscoroutinefunction(get_response)
+        if self.asincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.asincrono:
+            return self._acall(request)
+        if not self._muestrear():
+            return self.get_response(request)
+
+        medicion = MedicionMongo(lentos=self.lentos)
+        token = _medicion.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _medicion.reset(token)
+        return self._anotar(request, response, medicion, time.perf_counter() - inicio)
+
+    async def _acall(self, request):
+        if not self._muestrear():
+            return await self.get_response(request)
+
+        # La tarea de la petición y todo lo que lance (gather, sync_to_async, hilos de Motor) ven esta medición
+        medicion = MedicionMongo(lentos=self.lentos)
+        token = _medicion.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medicion.reset(token)
+        return self._anotar(request, response, medicion, time.perf_counter() - inicio)
+
+    def _muestrear(self):
+        return self.muestreo and random.random() < self.muestreo
+
+    def _anotar(self, request, response, medicion, total):
+        if self.server_timing:
+            response['Server-Timing'] = _server_timing(medicion, total)
+
+        coincidencia = getattr(request, 'resolver_match', None)
+        logger.info(json.dumps({
+            'vista': coincidencia.view_name if coincidencia else None,
+            'metodo': request.method,
+            'ruta': request.path,
+            'estado': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'mongo_ms': round(medicion.segundos * 1000, 1),
+            'mongo_comandos': medicion.comandos,
+            'mongo_lentos': [{'comando': comando, 'coleccion': coleccion, 'ms': round(segundos * 1000, 1)}
+                             for segundos, comando, coleccion in medicion.lentos],
+        }, ensure_ascii=False))
+        return response
@@ -1,6 +1,9 @@
-from mongoengine import Document, StringField, IntField, URLField, DateTimeField, ReferenceField, ListField, CASCADE
+from mongoengine import (Document, EmbeddedDocument, StringField, IntField, URLField, DateTimeField,
+                         ReferenceField, ListField, DictField, EmbeddedDocumentField, QuerySet, CASCADE, PULL)
 import datetime
 
+from .busqueda import palabras_busqueda, titulo_busqueda
+
 # 1. Modelo de CATEGORÍAS
 class Categoria(Document):
     # En Mongo, CharField y TextField son lo mismo: StringField
@@ -10,6 +13,18 @@ class Categoria(Document):
     def __str__(self):
         return self.nombre
 
+# Resumen desnormalizado de las valoraciones de un elemento.
+# Se mantiene con $inc en core/valoraciones.py, así la nota se lee sin recorrer las valoraciones.
+class ResumenValoraciones(EmbeddedDocument):
+    suma = IntField(default=0)
+    votos = IntField(default=0)
+    histograma = DictField()  # Votos por estrella: {'1': n, ..., '5': n}
+    actualizado = DateTimeField()
+
+    @property
+    def promedio(self):
+        return round(self.suma / self.votos, 1) if self.votos else 0
+
 # 2. Modelo de ELEMENTOS (Películas/Series)
 class Elemento(Document):
     # ReferenceField es el equivalente a ForeignKey
@@ -36,10 +51,48 @@ class Elemento(Document):
     )
     tipo = StringField(choices=TIPO_CHOICES, default='P')
 
+    resumen = EmbeddedDocumentField(ResumenValoraciones, default=ResumenValoraciones)
+
+    # Palabras de título, director y actores normalizadas (ver core/busqueda.py); se rellena en clean()
+    palabras_busqueda = ListField(StringField())
+    titulo_busqueda = StringField()  # El título normalizado, para poner primero los que empiezan por la consulta
+
+    meta = {
+        'indexes': [
+            'titulo',  # Los importadores hacen upsert por título
+            ('tipo', 'palabras_busqueda'),  # Búsqueda por prefijo de palabra dentro de películas o series
+            ('tipo', 'titulo_busqueda'),  # Títulos que empiezan por la búsqueda
+            ('tipo', 'id'),  # Catálogo de películas o series paginado por cursor
+            ('tipo', 'categoria', 'id'),  # Catálogo filtrado por categoría y géneros presentes por tipo
+            ('categoria', '-orden', 'id'),  # Panel de ranking y /categorias/; también borrado en cascada por categoría
+        ]
+    }
+
+    def clean(self):
+        # save() y validate() pasan por aquí, así la clave de búsqueda nunca se queda atrás
+        self.palabras_busqueda = palabras_busqueda(self.titulo, self.director, self.actores)
+        self.titulo_busqueda = titulo_busqueda(self.titulo)
+
     def __str__(self):
         return f"{self.titulo} ({self.anio})"
 
 # 3. Modelo de VALORACIONES (Fusionado y mejorado)
+class ValoracionQuerySet(QuerySet):
+    def delete(self, write_concern=None, _from_doc_delete=False, cascade_refs=None):
+        # Valoracion.objects(...).delete() no pasa por Valoracion.delete: contamos antes los votos que
+        # se van a borrar, agrupados por elemento y puntuación, y los descontamos todos de una vez
+        if _from_doc_delete or self._skip or self._limit:
+            # Borrado de un documento (ya descontado en Valoracion.delete) o uno a uno con skip/limit
+            return super().delete(write_concern, _from_doc_delete, cascade_refs)
+        from .valoraciones import retirar_valoraciones
+        votos = {(fila['_id']['elemento'], fila['_id']['puntuacion']): fila['votos'] for fila in self.aggregate([
+            {'$group': {'_id': {'elemento': '$elemento', 'puntuacion': '$puntuacion'}, 'votos': {'$sum': 1}}},
+        ]) if fila['_id'].get('elemento')}
+        borrados = super().delete(write_concern, _from_doc_delete, cascade_refs)
+        retirar_valoraciones(votos)
+        return borrados
+
+
 class Valoracion(Document):
     # IMPORTANTE: No podemos enlazar directamente con User (SQLite).
     # Guardamos el ID del usuario como entero.
@@ -60,11 +113,21 @@ class Valoracion(Document):
 
     # Meta para evitar duplicados (unique_together en MongoEngine)
     meta = {
+        'queryset_class': ValoracionQuerySet,
         'indexes': [
-            {'fields': ['usuario_id', 'elemento'], 'unique': True}
+            {'fields': ['usuario_id', 'elemento'], 'unique': True},
+            ('elemento', '-fecha', '-id')  # Reseñas de un elemento, de la más reciente a la más antigua
         ]
     }
 
+    def delete(self, *args, **kwargs):
+        # Descontamos el voto del resumen del elemento.
+        # (Si el borrado viene en cascada desde el Elemento, el resumen desaparece con él)
+        from .valoraciones import retirar_valoracion
+        super().delete(*args, **kwargs)
+        if self._data.get('elemento'):
+            retirar_valoracion(self._data['elemento'].id, self.puntuacion)
+
     def __str__(self):
         return f"Usuario {self.usuario_id} - Puntuación: {self.puntuacion}"
 
@@ -74,9 +137,85 @@ class Ranking(Document):
     nombre = StringField(max_length=100, default="Mis Favoritos")
 
     # ManyToMany en Mongo se hace con una lista de referencias
-    elementos = ListField(ReferenceField(Elemento))
+    # PULL: al borrar un elemento se quita de las listas, así el $size de mis_rankings no cuenta huecos
+    elementos = ListField(ReferenceField(Elemento, reverse_delete_rule=PULL))
+
+    fecha_creacion = DateTimeField(default=datetime.datetime.now)
+
+    meta = {
+        'indexes': [
+            'usuario_id',  # mis_rankings y el desplegable de la ficha
+            'elementos'  # El PULL al borrar un elemento busca las listas que lo contienen
+        ]
+    }
+
+    def __str__(self):
+        return f"{self.nombre} (Usuario ID: {self.usuario_id})"
+
+# 5. Modelo de TRABAJOS DE IMPORTACIÓN (importar_csv se ejecuta en segundo plano)
+class TrabajoImportacion(Document):
+    usuario_id = IntField()
+    archivo = StringField()
+
+    ESTADOS = (
+        ('pendiente', 'Pendiente'),
+        ('en_curso', 'En curso'),
+        ('terminado', 'Terminado'),
+        ('error', 'Error'),
+    )
+    estado = StringField(choices=ESTADOS, default='pendiente')
+
+    filas = IntField(default=0)
+    nuevos = IntField(default=0)
+    actualizados = IntField(default=0)
+    categorias_creadas = IntField(default=0)
+    fallidas = ListField(StringField())  # Solo guardamos las primeras, para no inflar el documento
+    total_fallidas = IntField(default=0)
+    mensaje = StringField()
 
     fecha_creacion = DateTimeField(default=datetime.datetime.now)
+    fecha_fin = DateTimeField()
+
+    # El hilo que importa lo renueva cada poco: si deja de hacerlo, el worker murió a medias
+    latido = DateTimeField(default=datetime.datetime.now)
+    archivo_temporal = StringField()  # Copia de la subida en disco, para borrarla si el trabajo se queda colgado
+
+    meta = {
+        'indexes': [
+            ('estado', 'latido'),  # Trabajos pendientes o en curso sin latido reciente
+        ]
+    }
+
+    def __str__(self):
+        return f"Importación {self.archivo} ({self.estado})"
+
+
+# 6. Contadores de GENERACIÓN (versión de datos cacheados en cada proceso)
+# Cada vez que cambia algo cacheado se hace $inc del contador; los procesos comparan su versión con esta.
+class Generacion(Document):
+    clave = StringField(max_length=100, unique=True, required=True)
+    valor = IntField(default=0)
+
+    def __str__(self):
+        return f"{self.clave}: {self.valor}"
+
+
+# 7. Modelo de CLASIFICACIONES (snapshot del ranking global, lo rellena calcular_clasificaciones)
+# Una por modo de puntuación, tipo y categoría (None = todas); el ranking se lee de aquí sin agregar nada.
+class Clasificacion(Document):
+    modo = StringField(max_length=20, required=True)
+    tipo = StringField(choices=Elemento.TIPO_CHOICES, required=True)
+    categoria = ReferenceField(Categoria)
+
+    # Ya ordenadas: [{'id', 'titulo', 'anio', 'imagen_url', 'categoria', 'puntuacion', 'promedio', 'votos'}, ...]
+    entradas = ListField(DictField())
+    fecha = DateTimeField(default=datetime.datetime.now)
+
+    meta = {
+        'indexes': [
+            {'fields': ['modo', 'tipo', 'categoria'], 'unique': True},  # La lectura del ranking global
+        ]
+    }
 
     def __str__(self):
-        return f"{self.nombre} (Usuario ID: {self.usuario_id})"
\ No newline at end of file
+        return f"Clasificación {self.modo} ({self.tipo}, {len(self.entradas)} elementos)"
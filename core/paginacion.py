@@ -0,0 +1,107 @@
+import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from mongoengine.queryset.visitor import Q
+
+
+# --- PAGINACIÓN POR CURSOR (KEYSET) ---
+def _cursor_valido(valor):
+    return valor if valor and ObjectId.is_valid(valor) else None
+
+
+def paginar_por_cursor(queryset, despues=None, antes=None, tamano=24):
+    """Pagina un queryset por _id sin usar skip: devuelve (elementos, cursor_anterior, cursor_siguiente)"""
+    despues = _cursor_valido(despues)
+    antes = _cursor_valido(antes)
+
+    if antes:
+        # Página anterior: leemos hacia atrás desde el cursor y le damos la vuelta
+        elementos = list(queryset.filter(id__lt=antes).order_by('-id').limit(tamano + 1))
+        hay_mas = len(elementos) > tamano
+        elementos = elementos[:tamano][::-1]
+        cursor_anterior = str(elementos[0].id) if hay_mas else None
+        cursor_siguiente = str(elementos[-1].id) if elementos else None
+    else:
+        if despues:
+            queryset = queryset.filter(id__gt=despues)
+        # Pedimos uno de más para saber si existe página siguiente sin hacer count()
+        elementos = list(queryset.order_by('id').limit(tamano + 1))
+        hay_mas = len(elementos) > tamano
+        elementos = elementos[:tamano]
+        cursor_anterior = str(elementos[0].id) if despues and elementos else None
+        cursor_siguiente = str(elementos[-1].id) if hay_mas else None
+
+    return elementos, cursor_anterior, cursor_siguiente
+
+
+async def apaginar_por_cursor(coleccion, filtro, despues=None, antes=None, tamano=24, proyeccion=None):
+    """Como paginar_por_cursor, sobre una colección de Motor: devuelve documentos sin convertir"""
+    despues = _cursor_valido(despues)
+    antes = _cursor_valido(antes)
+
+    if antes:
+        cursor = coleccion.find(dict(filtro, _id={'$lt': ObjectId(antes)}), proyeccion).sort('_id', -1)
+        docs = await cursor.limit(tamano + 1).to_list(tamano + 1)
+        hay_mas = len(docs) > tamano
+        docs = docs[:tamano][::-1]
+        cursor_anterior = str(docs[0]['_id']) if hay_mas else None
+        cursor_siguiente = str(docs[-1]['_id']) if docs else None
+    else:
+        if despues:
+            filtro = dict(filtro, _id={'$gt': ObjectId(despues)})
+        docs = await coleccion.find(filtro, proyeccion).sort('_id', 1).limit(tamano + 1).to_list(tamano + 1)
+        hay_mas = len(docs) > tamano
+        docs = docs[:tamano]
+        cursor_anterior = str(docs[0]['_id']) if despues and docs else None
+        cursor_siguiente = str(docs[-1]['_id']) if hay_mas else None
+
+    return docs, cursor_anterior, cursor_siguiente
+
+
+# --- PAGINACIÓN POR FECHA (MÁS RECIENTES PRIMERO) ---
+def _cursor_fecha(valor):
+    """'2024-05-01T10:00:00.123456_<id>' -> (fecha, ObjectId), o None si no es válido"""
+    fecha, _, id_ = (valor or '').partition('_')
+    try:
+        return datetime.datetime.fromisoformat(fecha), ObjectId(id_)
+    except (ValueError, TypeError, InvalidId):
+        return None
+
+
+def paginar_por_fecha(queryset, despues=None, tamano=20):
+    """Pagina de más reciente a más antiguo por (fecha, _id): devuelve (elementos, cursor_siguiente)"""
+    cursor = _cursor_fecha(despues)
+    if cursor:
+        fecha, id_ = cursor
+        # El _id desempata las fechas iguales para no saltarse ni repetir ninguno
+        queryset = queryset.filter(Q(fecha__lt=fecha) | Q(fecha=fecha, id__lt=id_))
+
+    elementos = list(queryset.order_by('-fecha', '-id').limit(tamano + 1))
+    hay_mas = len(elementos) > tamano
+    elementos = elementos[:tamano]
+    cursor_siguiente = f"{elementos[-1].fecha.isoformat()}_{elementos[-1].id}" if hay_mas else None
+    return elementos, cursor_siguiente
+
+
+async def apaginar_por_fecha(coleccion, filtro, despues=None, tamano=20, proyeccion=None):
+    """Como paginar_por_fecha, sobre una colección de Motor: devuelve documentos sin convertir"""
+    cursor = _cursor_fecha(despues)
+    if cursor:
+        fecha, id_ = cursor
+        filtro = dict(filtro, **{'$or': [{'fecha': {'$lt': fecha}}, {'fecha': fecha, '_id': {'$lt': id_}}]})
+
+    busqueda = coleccion.find(filtro, proyeccion).sort([('fecha', -1), ('_id', -1)]).limit(tamano + 1)
+    docs = await busqueda.to_list(tamano + 1)
+    hay_mas = len(docs) > tamano
+    docs = docs[:tamano]
+    cursor_siguiente = f"{docs[-1]['fecha'].isoformat()}_{docs[-1]['_id']}" if hay_mas else None
+    return docs, cursor_siguiente
+
+
+def tamano_pagina(valor, por_defecto, maximo):
+    """Interpreta ?por_pagina= acotándolo entre 1 y el máximo configurado"""
+    try:
+        return max(1, min(int(valor), maximo))
+    except (TypeError, ValueError):
+        return por_defecto
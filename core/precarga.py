@@ -0,0 +1,92 @@
+from mongoengine import Document, ListField, ReferenceField
+from mongoengine.base import BaseList
+
+from .categorias import obtener_categoria
+from .models import Categoria
+
+
+# --- PRECARGA DE REFERENCIAS EN BLOQUE ---
+# Cada acceso a un ReferenceField sin resolver (p. ej. item.elemento.categoria.nombre en una plantilla)
+# lanza su propia consulta. precargar() junta los ids de todos los documentos y los resuelve con una
+# sola consulta $in por colección (las categorías, desde la caché del proceso, sin ir a Mongo).
+
+def _id_de(ref):
+    return getattr(ref, 'id', ref)
+
+
+def _pendiente(ref):
+    return ref is not None and not isinstance(ref, Document)
+
+
+def _cargar(modelo, ids):
+    """Devuelve {id: documento} para los ids dados con una sola consulta (o desde caché)"""
+    if not ids:
+        return {}
+    if modelo is Categoria:
+        encontradas = {i: obtener_categoria(i) for i in ids}
+        faltan = [i for i, cat in encontradas.items() if cat is None]
+        if faltan:
+            # Categorías recién creadas por otro proceso que aún no están en la caché
+            encontradas.update({cat.id: cat for cat in Categoria.objects(id__in=faltan)})
+        return {i: cat for i, cat in encontradas.items() if cat is not None}
+    return {doc.id: doc for doc in modelo.objects(id__in=list(ids))}
+
+
+def _resolver(documentos, campo):
+    """Resuelve el campo 'campo' (referencia o lista de referencias) de todos los documentos"""
+    por_clase = {}
+    for doc in documentos:
+        if doc is not None and campo in doc._fields:
+            por_clase.setdefault(type(doc), []).append(doc)
+
+    for clase, docs in por_clase.items():
+        definicion = clase._fields[campo]
+        es_lista = isinstance(definicion, ListField)
+        referencia = definicion.field if es_lista else definicion
+        if not isinstance(referencia, ReferenceField):
+            raise ValueError(f"{clase.__name__}.{campo} no es una referencia")
+
+        ids = set()
+        for doc in docs:
+            valor = doc._data.get(campo)
+            for ref in (valor or []) if es_lista else [valor]:
+                if _pendiente(ref):
+                    ids.add(_id_de(ref))
+        cargados = _cargar(referencia.document_type, ids)
+
+        def resuelto(ref):
+            return cargados.get(_id_de(ref)) if _pendiente(ref) else ref
+
+        for doc in docs:
+            valor = doc._data.get(campo)
+            if es_lista:
+                # Conservamos el orden y descartamos las referencias a documentos borrados
+                lista = BaseList([r for r in map(resuelto, valor or []) if r is not None], doc, campo)
+                lista._dereferenced = True
+                doc._data[campo] = lista
+            elif valor is not None:
+                doc._data[campo] = resuelto(valor)
+
+
+def _valores(documentos, campo):
+    """Documentos a los que apunta 'campo' (ya resuelto), aplanando las listas"""
+    resultado = []
+    for doc in documentos:
+        valor = doc._data.get(campo) if doc is not None else None
+        if isinstance(valor, (list, tuple)):
+            resultado.extend(valor)
+        elif valor is not None:
+            resultado.append(valor)
+    return resultado
+
+
+def precargar(documentos, *rutas):
+    """Resuelve en bloque las referencias indicadas, p. ej. precargar(valoraciones, 'elemento__categoria')"""
+    documentos = list(documentos)
+    for ruta in rutas:
+        # 'elemento__categoria' resuelve primero 'elemento' (lo que falte) y luego sus categorías
+        objetivo = documentos
+        for campo in ruta.split('__'):
+            _resolver(objetivo, campo)
+            objetivo = _valores(objetivo, campo)
+    return documentos
@@ -0,0 +1,174 @@
+import datetime
+import heapq
+import math
+
+from django.conf import settings
+from pymongo import ReplaceOne
+
+from .cache_paginas import GEN_CLASIFICACIONES, subir_generacion
+from .categorias import obtener_categoria
+from .conexion import lectura_catalogo
+from .precarga import precargar
+from .models import Clasificacion, Elemento
+
+# Modos de puntuación de las clasificaciones precalculadas, con el texto que se ve en el ranking
+MODOS = {
+    'ponderada': 'Ponderada (IMDb)',
+    'bayesiana': 'Media bayesiana',
+    'wilson': 'Wilson',
+    'promedio': 'Media simple',
+}
+
+Z_WILSON = 1.96  # Intervalo de confianza del 95%
+
+
+# --- MOTOR DEL RANKING GLOBAL ---
+def calcular_ranking_global(tipo=None, limite=50, categoria=None):
+    """Devuelve el top de un tipo (P/S, o de todo el catálogo) con una sola agregación sobre los resúmenes"""
+    filtro = {'resumen.votos': {'$gt': 0}}
+    if tipo:
+        filtro['tipo'] = tipo
+    if categoria:
+        filtro['categoria'] = categoria
+
+    pipeline = [
+        # 1. Solo elementos (del tipo pedido) que tengan algún voto
+        {'$match': filtro},
+        # 2. Mismo criterio que antes: promedio redondeado a 1 decimal y, si empatan, más votos.
+        #    El _id desempata igual que el orden natural en que se recorrían los elementos.
+        {'$project': {
+            'promedio': {'$round': [{'$divide': ['$resumen.suma', '$resumen.votos']}, 1]},
+            'total_votos': '$resumen.votos',
+        }},
+        {'$sort': {'promedio': -1, 'total_votos': -1, '_id': 1}},
+        {'$limit': limite},
+    ]
+    filas = list(lectura_catalogo(Elemento.objects).aggregate(pipeline))
+
+    # Solo cargamos los elementos ganadores en bloque; sus categorías salen de la caché
+    elementos = {el.id: el for el in lectura_catalogo(Elemento.objects(id__in=[f['_id'] for f in filas]))}
+    precargar(elementos.values(), 'categoria')
+
+    ranking = []
+    for fila in filas:
+        elemento = elementos.get(fila['_id'])
+        if elemento:
+            ranking.append({
+                'elemento': elemento,
+                'promedio': fila['promedio'],
+                'total_votos': fila['total_votos']
+            })
+    return ranking
+
+
+# --- PUNTUACIONES ---
+# Con la media simple un título con un solo voto de 5 estrellas gana a un clásico con miles de votos y
+# media 4.9. Los otros modos tiran de las notas con pocos votos hacia la media del catálogo (o hacia abajo).
+def puntuaciones(suma, votos, media_global, votos_minimos, prior_por_estrella):
+    """Puntuación del elemento en cada modo, en la misma escala de 1 a 5 estrellas"""
+    promedio = suma / votos
+    # IMDb: WR = v / (v + m) * R + m / (v + m) * C
+    ponderada = (votos * promedio + votos_minimos * media_global) / (votos + votos_minimos)
+    # Media a posteriori con un prior de Dirichlet de 'prior_por_estrella' votos en cada estrella (media 3)
+    bayesiana = (suma + prior_por_estrella * 15) / (votos + prior_por_estrella * 5)
+    # Límite inferior de Wilson sobre la fracción de estrellas obtenidas, devuelto a la escala de 1 a 5
+    p = (promedio - 1) / 4
+    z2 = Z_WILSON ** 2
+    wilson = (p + z2 / (2 * votos) - Z_WILSON * math.sqrt((p * (1 - p) + z2 / (4 * votos)) / votos)) / (1 + z2 / votos)
+    return {
+        'ponderada': ponderada,
+        'bayesiana': bayesiana,
+        'wilson': 1 + 4 * max(0.0, wilson),
+        'promedio': round(promedio, 1),  # Como el ranking de siempre: redondeada y desempatando por votos
+    }
+
+
+def _desempate(elemento_id):
+    # En el montículo gana lo mayor; invertir los bytes del ObjectId hace que a igualdad gane el _id menor
+    return bytes(255 - b for b in elemento_id.binary)
+
+
+# --- CÁLCULO DE LAS CLASIFICACIONES ---
+def calcular_clasificaciones(tamano=None):
+    """Recalcula las clasificaciones de todos los modos, por tipo y por tipo y categoría, y las guarda
+
+    Una agregación para la media global y una sola pasada por los elementos con votos: cada elemento se
+    puntúa una vez en todos los modos y entra en los montículos (de 'tamano' como mucho) de sus grupos.
+    """
+    tamano = tamano or settings.RANKING_TAMANO
+    votos_minimos = settings.RANKING_VOTOS_MINIMOS
+    prior = settings.RANKING_PRIOR_BAYESIANO
+    coleccion = Elemento._get_collection()
+
+    totales = list(coleccion.aggregate([
+        {'$group': {'_id': None, 'suma': {'$sum': '$resumen.suma'}, 'votos': {'$sum': '$resumen.votos'}}},
+    ]))
+    media_global = totales[0]['suma'] / totales[0]['votos'] if totales and totales[0]['votos'] else 3.0
+
+    # {(modo, tipo, categoria_id): [(clave de orden, entrada), ...]} con los mejores de cada grupo
+    montones = {}
+    campos = {'titulo': 1, 'anio': 1, 'imagen_url': 1, 'tipo': 1, 'categoria': 1, 'resumen.suma': 1, 'resumen.votos': 1}
+    for doc in coleccion.find({'resumen.votos': {'$gt': 0}}, campos):
+        votos = doc['resumen']['votos']
+        notas = puntuaciones(doc['resumen']['suma'], votos, media_global, votos_minimos, prior)
+        categoria = obtener_categoria(doc.get('categoria')) if doc.get('categoria') else None
+        entrada = {
+            'id': str(doc['_id']),
+            'titulo': doc.get('titulo'),
+            'anio': doc.get('anio'),
+            'imagen_url': doc.get('imagen_url'),
+            'categoria': categoria.nombre if categoria else None,
+            'promedio': notas['promedio'],
+            'votos': votos,
+        }
+        desempate = _desempate(doc['_id'])
+        tipo = doc.get('tipo', 'P')
+        grupos = [None, doc['categoria']] if doc.get('categoria') else [None]
+        for modo, nota in notas.items():
+            orden = (nota, votos, desempate)
+            for categoria_id in grupos:
+                grupo = (modo, tipo, categoria_id)
+                monton = montones.setdefault(grupo, [])
+                if len(monton) < tamano:
+                    heapq.heappush(monton, (orden, dict(entrada, puntuacion=round(nota, 2))))
+                elif orden > monton[0][0]:
+                    heapq.heapreplace(monton, (orden, dict(entrada, puntuacion=round(nota, 2))))
+
+    # Se sustituyen todas de golpe; las de grupos que se han quedado sin votos se borran
+    ahora = datetime.datetime.now()
+    operaciones = [
+        ReplaceOne({'modo': modo, 'tipo': tipo, 'categoria': categoria_id}, {
+            'modo': modo, 'tipo': tipo, 'categoria': categoria_id, 'fecha': ahora,
+            'entradas': [entrada for _, entrada in sorted(monton, key=lambda par: par[0], reverse=True)],
+        }, upsert=True)
+        for (modo, tipo, categoria_id), monton in montones.items()
+    ]
+    destino = Clasificacion._get_collection()
+    if operaciones:
+        destino.bulk_write(operaciones, ordered=False)
+    destino.delete_many({'fecha': {'$lt': ahora}})
+    subir_generacion(GEN_CLASIFICACIONES)
+    return {'clasificaciones': len(operaciones), 'media_global': round(media_global, 3)}
+
+
+def obtener_clasificacion(modo, tipo, categoria=None, limite=50):
+    """Entradas ya ordenadas de una clasificación (una lectura por índice), o None si no se ha calculado"""
+    doc = lectura_catalogo(Clasificacion._get_collection()).find_one(
+        {'modo': modo, 'tipo': tipo, 'categoria': categoria},
+        {'entradas': {'$slice': limite}, 'fecha': 1},
+    )
+    return doc['entradas'] if doc else None
+
+
+def clasificacion_en_vivo(tipo, categoria=None, limite=50):
+    """Media simple calculada al momento, con el formato de las clasificaciones (si aún no hay snapshot)"""
+    return [{
+        'id': str(item['elemento'].id),
+        'titulo': item['elemento'].titulo,
+        'anio': item['elemento'].anio,
+        'imagen_url': item['elemento'].imagen_url,
+        'categoria': item['elemento'].categoria.nombre if item['elemento'].categoria else None,
+        'puntuacion': item['promedio'],
+        'promedio': item['promedio'],
+        'votos': item['total_votos'],
+    } for item in calcular_ranking_global(tipo, limite=limite, categoria=categoria)]
@@ -0,0 +1,167 @@
+import asyncio
+import copy
+import itertools
+import time
+
+import mongoengine
+
+from .metricas import MedidorMongo
+from .models import Categoria, Clasificacion, Elemento, Generacion, Ranking, TrabajoImportacion, Valoracion
+
+# --- SOPORTE DE LOS TESTS Y DEL BENCHMARK ---
+# Solo lo importan core/tests.py y el comando benchmark: la aplicación nunca conecta con mongomock
+# ni parchea nada de pymongo.
+
+MODELOS = (Categoria, Elemento, Valoracion, Ranking, Generacion, Clasificacion, TrabajoImportacion)
+
+
+def conectar(mongo, base_datos):
+    """Cambia la conexión por defecto a una base de datos vacía ('mongomock' o una URI de mongod)
+
+    mongomock no implementa todo lo que usan las vistas ($round, $unionWith...): sirve para contar comandos
+    y comparar órdenes de magnitud, pero las latencias de verdad hay que sacarlas contra un mongod local.
+    """
+    mongoengine.disconnect()
+    if mongo == 'mongomock':
+        import mongomock  # Dependencia opcional, solo para los tests y el benchmark
+        mongoengine.connect(base_datos, host='mongodb://localhost', mongo_client_class=mongomock.MongoClient)
+        _instrumentar_mongomock(MedidorMongo())
+        _completar_lookup()
+    else:
+        mongoengine.connect(base_datos, host=mongo)  # MedidorMongo está registrado para todos (CoreConfig.ready)
+    for modelo in MODELOS:
+        modelo._collection = None  # Que cada modelo vuelva a pedir su colección a la conexión nueva
+        modelo.drop_collection()
+
+
+def _instrumentar_mongomock(listener):
+    """mongomock no emite eventos de pymongo: los simulamos para que se cuenten igual que con mongod
+
+    Parchea la clase Collection de mongomock para todo el proceso (una sola vez): por eso vive aquí y no
+    en un módulo que importe la aplicación.
+    """
+    import mongomock.collection
+
+    if getattr(mongomock.collection.Collection, '_instrumentada', False):
+        return
+    mongomock.collection.Collection._instrumentada = True
+    contador = itertools.count()
+    for nombre in ('find', 'find_one', 'aggregate', 'count_documents', 'distinct', 'insert_one', 'insert_many',
+                   'update_one', 'update_many', 'bulk_write', 'delete_one', 'delete_many', 'find_one_and_update'):
+        original = getattr(mongomock.collection.Collection, nombre)
+
+        def medido(self, *args, _original=original, _nombre=nombre, **kwargs):
+            evento = {'command': {_nombre: self.name}, 'command_name': _nombre, 'request_id': next(contador)}
+            listener.started(type('Evento', (), evento))
+            inicio = time.perf_counter()
+            try:
+                return _original(self, *args, **kwargs)
+            finally:
+                evento['duration_micros'] = int((time.perf_counter() - inicio) * 1_000_000)
+                listener.succeeded(type('Evento', (), evento))
+
+        setattr(mongomock.collection.Collection, nombre, medido)
+
+
+def _completar_lookup():
+    """$lookup con let y pipeline, que mongomock no implementa (solo localField/foreignField)
+
+    Basta para lo que usan las vistas: variables de 'let' que son campos del documento ('$campo'),
+    sustituidas en el sub-pipeline antes de ejecutarlo sobre la colección 'from'.
+    """
+    import mongomock.aggregate
+
+    original = mongomock.aggregate._PIPELINE_HANDLERS['$lookup']
+    if getattr(original, '_completado', False):
+        return
+
+    def lookup(in_collection, database, options):
+        if 'pipeline' not in options:
+            return original(in_collection, database, options)
+        destino = database.get_collection(options['from'])
+        for doc in in_collection:
+            variables = {f'$${nombre}': doc.get(valor[1:]) if isinstance(valor, str) and valor.startswith('$') else valor
+                         for nombre, valor in options.get('let', {}).items()}
+            # Directamente sobre los documentos guardados: no es un comando más para las métricas
+            documentos = [copy.deepcopy(d) for d in destino._iter_documents({})]
+            doc[options['as']] = list(mongomock.aggregate.process_pipeline(
+                documentos, database, _sustituir(options['pipeline'], variables), None))
+        return in_collection
+
+    lookup._completado = True
+    mongomock.aggregate._PIPELINE_HANDLERS['$lookup'] = lookup
+
+
+def _sustituir(valor, variables):
+    if isinstance(valor, dict):
+        return {clave: _sustituir(v, variables) for clave, v in valor.items()}
+    if isinstance(valor, list):
+        return [_sustituir(v, variables) for v in valor]
+    if isinstance(valor, str) and valor in variables:
+        return variables[valor]
+    return valor
+
+
+# --- MOTOR SOBRE LA CONEXIÓN DE PRUEBAS ---
+# Lo justo del API de Motor que usan core/asincrono.py y core/vistas_async.py, por encima de la conexión
+# síncrona de MongoEngine (mongomock o mongod): las vistas asíncronas se prueban sin instalar Motor y
+# leen los mismos datos que las síncronas. Se usa parcheando core.asincrono.cliente.
+class CursorMotor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, n):
+        self._cursor = self._cursor.limit(n)
+        return self
+
+    async def to_list(self, length):
+        await asyncio.sleep(0)  # Como Motor, deja pasar a otras tareas
+        return list(self._cursor)
+
+    def __aiter__(self):
+        self._pendientes = iter(list(self._cursor))
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._pendientes)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class ColeccionMotor:
+    def __init__(self, coleccion):
+        self._coleccion = coleccion
+
+    def with_options(self, **opciones):
+        return ColeccionMotor(self._coleccion.with_options(**opciones))
+
+    async def find_one(self, *args, **kwargs):
+        await asyncio.sleep(0)
+        return self._coleccion.find_one(*args, **kwargs)
+
+    def find(self, *args, **kwargs):
+        return CursorMotor(self._coleccion.find(*args, **kwargs))
+
+    def aggregate(self, pipeline):
+        return CursorMotor(self._coleccion.aggregate(pipeline))
+
+
+class ClienteMotor:
+    def __init__(self):
+        self._cliente = mongoengine.get_connection()
+
+    def __getitem__(self, nombre):
+        return BaseDatosMotor(self._cliente[nombre])
+
+
+class BaseDatosMotor:
+    def __init__(self, base_datos):
+        self._base_datos = base_datos
+
+    def __getitem__(self, nombre):
+        return ColeccionMotor(self._base_datos[nombre])
@@ -1,3 +1,773 @@
-from django.test import TestCase
+import asyncio
+import contextvars
+import datetime
+import json
+import os
+import re
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import AsyncClient, Client, RequestFactory, TestCase, override_settings
+from pymongo import ReadPreference
+
+from . import api, autocompletar, categorias, soporte_pruebas
+from .busqueda import buscar
+from .estadisticas import obtener_estadisticas
+from .cache_paginas import GEN_CATALOGO, GEN_VALORACIONES, gen_rankings_usuario, subir_generacion
+from .conexion import lectura_catalogo
+from .importacion import (COLUMNAS_CSV, _ejecutar_importacion, importar_archivo, importar_con_pool,
+                         marcar_trabajos_colgados, rangos_csv)
+from .listas import anadir_a_lista, mover_en_lista, quitar_de_lista
+from .metricas import MedicionMongo, MedidorPool, MetricasMongoMiddleware, _medicion, estado_pools
+from .models import Categoria, Clasificacion, Elemento, Generacion, Ranking, TrabajoImportacion, Valoracion
+from .rankings import calcular_clasificaciones
+from .views import elementos_por_categoria, obtener_categorias_limpias
+from .valoraciones import registrar_valoracion, sincronizar_resumenes
+
+# Los tests necesitan Mongo: por defecto mongomock (sin servidor); con CINERANK_TEST_MONGO=<uri>
+# se ejecutan contra un mongod de verdad, en la base de datos 'cinerank_test', que se vacía en cada test
+MONGO_TEST = os.environ.get('CINERANK_TEST_MONGO', 'mongomock')
+BASE_DATOS_TEST = 'cinerank_test'
+
+
+@override_settings(METRICAS_MONGO_MUESTREO=0)  # Sin una línea de log por petición (MetricasMongoTests lo activa)
+class MongoTestCase(TestCase):
+    """Conecta MongoEngine a la base de datos de pruebas y la deja vacía antes de cada test"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        try:
+            import mongomock  # noqa: F401  (solo hace falta si MONGO_TEST es 'mongomock')
+        except ImportError:
+            if MONGO_TEST == 'mongomock':
+                raise unittest.SkipTest("Instala mongomock o indica un mongod con CINERANK_TEST_MONGO")
+
+    def setUp(self):
+        soporte_pruebas.conectar(MONGO_TEST, BASE_DATOS_TEST)
+        cache.clear()
+        # Las cachés del proceso recuerdan la versión de la base de datos del test anterior
+        categorias._estado = dict(categorias._estado, version=None)
+        autocompletar._estado = dict(autocompletar._estado, version=None)
+
+    def crear_catalogo(self, n=6, tipo='P'):
+        self.categoria = Categoria(nombre='Drama').save()
+        return [Elemento(titulo=f'Título {i}', tipo=tipo, categoria=self.categoria, anio=2000 + i, orden=i).save()
+                for i in range(n)]
+
+    def votar(self, elemento, usuario_id, puntuacion):
+        return Valoracion(usuario_id=usuario_id, elemento=elemento, puntuacion=puntuacion).save()
+
+
+# --- RESUMEN DE VALORACIONES ---
+class ResumenValoracionesTests(MongoTestCase):
+    def resumen(self, elemento):
+        resumen = Elemento.objects.get(id=elemento.id).resumen
+        return resumen.suma, resumen.votos, {k: v for k, v in resumen.histograma.items() if v}
+
+    def test_borrado_de_un_documento_descuenta_el_voto(self):
+        elemento = self.crear_catalogo(1)[0]
+        valoracion = self.votar(elemento, 1, 4)
+        self.votar(elemento, 2, 2)
+        sincronizar_resumenes()
+
+        valoracion.delete()
+        self.assertEqual(self.resumen(elemento), (2, 1, {'2': 1}))
+
+    def test_borrado_por_queryset_descuenta_los_votos(self):
+        uno, otro = self.crear_catalogo(2)
+        primera = self.votar(uno, 1, 4)
+        self.votar(uno, 2, 2)
+        self.votar(uno, 3, 4)
+        self.votar(otro, 1, 5)
+        sincronizar_resumenes()
+
+        Valoracion.objects(id=primera.id).delete()
+        self.assertEqual(self.resumen(uno), (6, 2, {'2': 1, '4': 1}))
+
+        Valoracion.objects(usuario_id=1).delete()
+        self.assertEqual(self.resumen(otro), (0, 0, {}))
+        self.assertEqual(sincronizar_resumenes(corregir=False), [])
+
+
+# --- IMPORTACIÓN EN SEGUNDO PLANO ---
+class TrabajosImportacionTests(MongoTestCase):
+    def temporal(self, contenido):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as f:
+            f.write(contenido)
+        self.addCleanup(lambda: os.path.exists(f.name) and os.remove(f.name))
+        return f.name
+
+    def test_importacion_termina_y_borra_el_temporal(self):
+        ruta = self.temporal('titulo,anio,categoria\nUna,2001,Drama\nOtra,2002,Drama - Crimen\n')
+        trabajo = TrabajoImportacion(archivo='a.csv', archivo_temporal=ruta).save()
+
+        _ejecutar_importacion(ruta, trabajo.id, 1)
+
+        trabajo.reload()
+        self.assertEqual((trabajo.estado, trabajo.filas, trabajo.nuevos), ('terminado', 2, 2))
+        self.assertIsNone(trabajo.archivo_temporal)
+        self.assertFalse(os.path.exists(ruta))
+
+    def test_cargar_csv_caduca_el_catalogo_y_el_autocompletado(self):
+        self.crear_catalogo(1)
+        self.assertEqual(autocompletar.sugerencias('nueva'), [])
+        generaciones = lambda: {g.clave: g.valor for g in Generacion.objects(clave__in=[GEN_CATALOGO, 'autocompletar'])}
+        antes = generaciones()
+
+        ruta = self.temporal('titulo,anio,categoria\nNueva,2001,Drama\n')
+        call_command('cargar_csv', archivo=ruta, stdout=StringIO())
+
+        despues = generaciones()
+        for clave in (GEN_CATALOGO, 'autocompletar'):
+            self.assertGreater(despues[clave], antes.get(clave, 0))
+        self.assertEqual([s['titulo'] for s in autocompletar.sugerencias('nueva')], ['Nueva'])
+
+    def test_trabajo_sin_latido_se_marca_como_error(self):
+        antiguo = datetime.datetime.now() - datetime.timedelta(seconds=settings.IMPORTACION_LATIDO_MAXIMO + 60)
+        ruta = self.temporal('titulo\n')
+        colgado = TrabajoImportacion(archivo='a.csv', estado='en_curso', latido=antiguo, archivo_temporal=ruta).save()
+        vivo = TrabajoImportacion(archivo='b.csv', estado='en_curso').save()
+        terminado = TrabajoImportacion(archivo='c.csv', estado='terminado', latido=antiguo).save()
+
+        self.assertEqual(marcar_trabajos_colgados(), 1)
+
+        self.assertEqual(TrabajoImportacion.objects.get(id=colgado.id).estado, 'error')
+        self.assertFalse(os.path.exists(ruta))
+        self.assertEqual(TrabajoImportacion.objects.get(id=vivo.id).estado, 'en_curso')
+        self.assertEqual(TrabajoImportacion.objects.get(id=terminado.id).estado, 'terminado')
+
+    def csv_con_repetidos(self):
+        lineas = ['titulo,anio,categoria,descripcion']
+        for i in range(40):
+            # Algunas descripciones llevan saltos de línea entre comillas: un rango no puede empezar ahí dentro
+            descripcion = '"Primera línea\n""segunda"", con coma\n"' if i % 6 == 0 else 'Sinopsis'
+            lineas.append(f'Película {i % 7},{2000 + i},Drama,{descripcion}')
+        lineas.insert(20, 'Sin género,2000,,Nada')
+        return self.temporal('\n'.join(lineas) + '\n')
+
+    def test_rangos_empiezan_en_un_registro(self):
+        ruta = self.csv_con_repetidos()
+        fin_cabecera, rangos = rangos_csv(ruta, 3)
+        # Con trozos de 16 bytes, saltos y comillas caen en trozos distintos: los cortes son los mismos
+        with mock.patch('core.importacion.TAMANO_CHUNK', 16):
+            self.assertEqual(rangos_csv(ruta, 3), (fin_cabecera, rangos))
+        with open(ruta, 'rb') as f:
+            contenido = f.read()
+        self.assertEqual(contenido[:fin_cabecera], b'titulo,anio,categoria,descripcion\n')
+        self.assertEqual(rangos[0][0], fin_cabecera)
+        self.assertEqual(rangos[-1][1], len(contenido))
+        for (_, fin), (inicio, _) in zip(rangos, rangos[1:]):
+            self.assertEqual(fin, inicio)
+            self.assertEqual(contenido[:inicio].count(b'"') % 2, 0)
+            self.assertTrue(contenido[inicio:].startswith(b'Pel') or contenido[inicio:].startswith(b'Sin'))
+
+    def test_en_paralelo_como_en_serie(self):
+        ruta = self.csv_con_repetidos()
+        en_serie = importar_archivo(ruta, tamano_lote=5)
+        esperados = {el.titulo: (el.anio, el.descripcion) for el in Elemento.objects}
+        Elemento.drop_collection()
+
+        # Hilos en lugar de procesos: comparten la conexión de pruebas (el pool de verdad necesita un mongod)
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            en_paralelo = importar_con_pool(pool, ruta, COLUMNAS_CSV, 5, 3)
+
+        self.assertEqual(en_paralelo.filas, en_serie.filas)
+        self.assertEqual(en_paralelo.nuevos, 7)
+        # Cada título lo escribe un solo proceso, en el orden del archivo: gana su última fila
+        self.assertEqual({el.titulo: (el.anio, el.descripcion) for el in Elemento.objects}, esperados)
+        # Los números de fila son los del archivo, aunque cada proceso solo vea parte de las filas
+        self.assertEqual([f[:2] for f in en_paralelo.fallidas], [f[:2] for f in en_serie.fallidas])
+        self.assertEqual([f[0] for f in en_paralelo.fallidas], [21])
+
+
+# --- NÚMERO DE COMANDOS MONGO POR PÁGINA ---
+class ComandosPorPaginaTests(MongoTestCase):
+    """Cada página lanza los mismos comandos Mongo tenga el catálogo 3 títulos en 3 géneros o 40 en 30
+    (sin N+1 al renderizar ni por categoría)"""
+
+    def comandos(self, ruta, cliente=None):
+        cache.clear()  # Medimos la página sin cachear
+        medicion = MedicionMongo()
+        token = _medicion.set(medicion)
+        try:
+            response = (cliente or Client()).get(ruta)
+        finally:
+            _medicion.reset(token)
+        self.assertEqual(response.status_code, 200, ruta)
+        return medicion.comandos
+
+    def catalogo_con_votos(self, n, num_categorias):
+        for modelo in (Categoria, Elemento, Valoracion, Clasificacion):
+            modelo.drop_collection()
+        categorias._estado = dict(categorias._estado, version=None)
+        generos = [Categoria(nombre=f'Género {i}').save() for i in range(num_categorias)]
+        elementos = [Elemento(titulo=f'Título {i}', tipo='P', categoria=generos[i % num_categorias], orden=i).save()
+                     for i in range(n)]
+        for i, elemento in enumerate(elementos):
+            for usuario_id in range(1, i % 5 + 2):
+                self.votar(elemento, usuario_id, usuario_id % 5 + 1)
+        sincronizar_resumenes()
+        calcular_clasificaciones()
+        return elementos
+
+    def test_paginas_con_un_numero_fijo_de_comandos(self):
+        admin = Client()
+        admin.force_login(User.objects.create_superuser('admin', password='x'))
+        por_tamano = {}
+        for n, num_categorias in ((3, 3), (40, 30)):
+            elementos = self.catalogo_con_votos(n, num_categorias)
+            por_tamano[n] = {ruta: self.comandos(ruta) for ruta in ('/', '/series/', '/ranking/', '/categorias/')}
+            # La ficha del título con más reseñas
+            por_tamano[n]['detalle'] = self.comandos(f'/elemento/{elementos[-1].id}/')
+            # Resumen de todas las categorías del panel de ranking
+            por_tamano[n]['panel_ranking'] = self.comandos('/ranking-gestion/', admin)
+
+        self.assertEqual(por_tamano[3], por_tamano[40])
+        for ruta, comandos in por_tamano[40].items():
+            self.assertLessEqual(comandos, 6, ruta)
+
+
+# --- ELEMENTOS POR CATEGORÍA ---
+class ElementosPorCategoriaTests(MongoTestCase):
+    def test_total_y_primeros_por_orden(self):
+        elementos = self.crear_catalogo(6)
+        otra = Categoria(nombre='Comedia').save()
+        Elemento(titulo='Suelta', categoria=otra, orden=3).save()
+
+        agrupados = elementos_por_categoria(4)
+
+        total, primeros = agrupados[self.categoria.id]
+        self.assertEqual(total, 6)
+        self.assertEqual([el['id'] for el in primeros], [el.id for el in reversed(elementos)][:4])
+        self.assertEqual(agrupados[otra.id][0], 1)
+
+    def comandos(self, categorias):
+        for i in range(categorias):
+            categoria = Categoria(nombre=f'Género {i}').save()
+            for j in range(3):
+                Elemento(titulo=f'Título {i}-{j}', categoria=categoria, orden=j).save()
+        medicion = MedicionMongo()
+        token = _medicion.set(medicion)
+        try:
+            agrupados = elementos_por_categoria(2)
+        finally:
+            _medicion.reset(token)
+        self.assertEqual(len(agrupados), categorias)
+        self.assertTrue(all(total == 3 and len(primeros) == 2 for total, primeros in agrupados.values()))
+        return medicion.comandos
+
+    def test_mismas_consultas_con_mas_categorias(self):
+        pocas = self.comandos(3)
+        soporte_pruebas.conectar(MONGO_TEST, BASE_DATOS_TEST)
+        self.assertEqual(self.comandos(30), pocas)
+
+
+# --- CACHÉS POR GENERACIÓN ---
+class CachesPorGeneracionTests(MongoTestCase):
+    # Los cambios se hacen como los haría otro worker: se sube la generación pero no se borra nada de esta caché
+    def test_categorias_por_tipo_cambian_al_subir_el_catalogo(self):
+        elemento = self.crear_catalogo(1)[0]
+        comedia = Categoria(nombre='Comedia').save()
+        factory = RequestFactory()
+        self.assertEqual([c['nombre'] for c in obtener_categorias_limpias(factory.get('/'), 'P')], ['Drama'])
+
+        Elemento.objects(id=elemento.id).update_one(set__categoria=comedia)
+        subir_generacion(GEN_CATALOGO)
+        self.assertEqual([c['nombre'] for c in obtener_categorias_limpias(factory.get('/'), 'P')], ['Comedia'])
+
+    def test_estadisticas_se_recalculan_al_subir_las_valoraciones(self):
+        factory = RequestFactory()
+        with mock.patch('core.estadisticas.calcular_estadisticas', side_effect=[{'n': 1}, {'n': 2}]) as calcular:
+            self.assertEqual(obtener_estadisticas(factory.get('/')), {'n': 1})
+            self.assertEqual(obtener_estadisticas(factory.get('/')), {'n': 1})
+            subir_generacion(GEN_VALORACIONES)
+            self.assertEqual(obtener_estadisticas(factory.get('/')), {'n': 2})
+        self.assertEqual(calcular.call_count, 2)
+
+
+# --- LECTURAS DE SECUNDARIO ---
+@override_settings(MONGO_LECTURA_CATALOGO='secondary')
+class SecundarioAtrasadoTests(MongoTestCase):
+    """Lo que se cachea bajo una generación no puede salir de un secundario que aún no tiene el cambio"""
+
+    def setUp(self):
+        super().setUp()
+        self.elemento = self.crear_catalogo(1)[0]
+        # El secundario se queda con el catálogo tal como está ahora: no replica lo que venga después
+        coleccion = Elemento._get_collection()
+        secundario = coleccion.database['elemento_secundario']
+        secundario.insert_many(list(coleccion.find()))
+        original = type(coleccion).with_options
+
+        def with_options(destino, **opciones):
+            if opciones.get('read_preference') == ReadPreference.SECONDARY and destino.name == coleccion.name:
+                return secundario
+            return original(destino, **opciones)
+
+        parche = mock.patch.object(type(coleccion), 'with_options', with_options)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+        Elemento.objects(id=self.elemento.id).update_one(set__titulo='Título corregido')
+        subir_generacion(GEN_CATALOGO)
+
+    def test_el_secundario_esta_atrasado(self):
+        self.assertEqual(lectura_catalogo(Elemento.objects).get(id=self.elemento.id).titulo, 'Título 0')
+
+    def test_pagina_anonima_se_genera_desde_el_primario(self):
+        response = Client().get('/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'Título corregido')
+        self.assertNotContains(response, 'Título 0')
+
+    def test_api_se_genera_desde_el_primario(self):
+        response = Client().get('/api/v1/elementos/?fields=titulo')
+        self.assertEqual([el['titulo'] for el in response.json()['resultados']], ['Título corregido'])
+
+
+# --- RANKING EN VIVO HASTA LA PRIMERA CLASIFICACIÓN ---
+class RankingEnVivoTests(MongoTestCase):
+    # clasificacion_en_vivo usa $round, que mongomock no tiene: aquí solo importa cuándo caduca
+    def setUp(self):
+        super().setUp()
+        self.elemento = self.crear_catalogo(1)[0]
+        for modulo in ('views', 'api'):
+            parche = mock.patch(f'core.{modulo}.clasificacion_en_vivo', return_value=[])
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def votar(self, elemento, usuario_id, puntuacion):
+        # Como registrar_valoracion en la vista: el resumen se actualiza aparte
+        valoracion = super().votar(elemento, usuario_id, puntuacion)
+        registrar_valoracion(elemento.id, puntuacion)
+        return valoracion
+
+    def test_la_pagina_en_vivo_caduca_con_cada_voto(self):
+        cliente = Client()
+        self.assertEqual(cliente.get('/ranking/')['X-Cache'], 'MISS')
+        self.assertEqual(cliente.get('/ranking/')['X-Cache'], 'HIT')
+        self.votar(self.elemento, 1, 5)
+        self.assertEqual(cliente.get('/ranking/')['X-Cache'], 'MISS')
+
+        # Con la clasificación calculada ya solo caduca al recalcularla
+        calcular_clasificaciones()
+        self.assertEqual(cliente.get('/ranking/')['X-Cache'], 'MISS')
+        self.votar(self.elemento, 2, 3)
+        self.assertEqual(cliente.get('/ranking/')['X-Cache'], 'HIT')
+
+    def test_el_etag_de_la_api_en_vivo_cambia_con_cada_voto(self):
+        cliente = Client()
+        etag = lambda: cliente.get('/api/v1/rankings/global/')['ETag']
+        primero = etag()
+        self.votar(self.elemento, 1, 5)
+        segundo = etag()
+        self.assertNotEqual(primero, segundo)
+
+        calcular_clasificaciones()
+        tercero = etag()
+        self.votar(self.elemento, 2, 3)
+        self.assertEqual(etag(), tercero)
+
+
+# --- ETAG DE LAS VALORACIONES DE UN ELEMENTO ---
+class EtagValoracionesTests(MongoTestCase):
+    def etag(self, elemento):
+        return Client().get(f'/api/v1/elementos/{elemento.id}/valoraciones/')['ETag']
+
+    def test_cambia_con_cada_escritura_del_elemento_y_solo_del_suyo(self):
+        uno, otro = self.crear_catalogo(2)
+        valoracion = self.votar(uno, 1, 4)
+        registrar_valoracion(uno.id, 4)
+        etags = [self.etag(uno)]
+        etag_otro = self.etag(otro)
+
+        # Solo el comentario, como la vista al editar sin tocar la puntuación
+        anterior = Valoracion.objects(id=valoracion.id).modify(set__comentario='Mejor de lo que recordaba')
+        registrar_valoracion(uno.id, 4, anterior=anterior.puntuacion)
+        etags.append(self.etag(uno))
+
+        Valoracion.objects.get(id=valoracion.id).delete()
+        etags.append(self.etag(uno))
+
+        self.assertEqual(len(set(etags)), 3)
+        self.assertEqual(self.etag(otro), etag_otro)
+
+
+# --- API: GET CONDICIONAL Y PROYECCIÓN ---
+class ApiElementosTests(MongoTestCase):
+    def test_304_si_no_ha_cambiado(self):
+        self.crear_catalogo(2)
+        etag = Client().get('/api/v1/elementos/')['ETag']
+
+        response = Client().get('/api/v1/elementos/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+        subir_generacion(GEN_CATALOGO)
+        response = Client().get('/api/v1/elementos/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_fields_proyecta_los_campos_pedidos(self):
+        self.crear_catalogo(2)
+        resultados = Client().get('/api/v1/elementos/', {'fields': 'titulo,anio'}).json()['resultados']
+        self.assertEqual(len(resultados), 2)
+        self.assertEqual({tuple(sorted(r)) for r in resultados}, {('anio', 'id', 'titulo')})
+
+    def test_fields_desconocido_es_400(self):
+        response = Client().get('/api/v1/elementos/', {'fields': 'titulo,contrasena'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('contrasena', response.json()['error'])
+
+    def test_los_votos_solo_cambian_el_etag_si_se_pide_el_resumen(self):
+        self.crear_catalogo(2)
+        etag = lambda **parametros: Client().get('/api/v1/elementos/', parametros)['ETag']
+        sin_resumen, con_resumen, todos = etag(fields='titulo,anio'), etag(fields='titulo,resumen'), etag()
+
+        subir_generacion(GEN_VALORACIONES)
+
+        self.assertEqual(etag(fields='titulo,anio'), sin_resumen)
+        self.assertNotEqual(etag(fields='titulo,resumen'), con_resumen)
+        self.assertNotEqual(etag(), todos)
+
+
+# --- PANEL DE RANKING ---
+class PanelRankingTests(MongoTestCase):
+    def test_la_pagina_lleva_su_desplazamiento_para_renumerar(self):
+        self.crear_catalogo(5)
+        cliente = Client()
+        cliente.force_login(User.objects.create_superuser('admin', password='x'))
+        response = cliente.get('/ranking-gestion/', {'categoria': str(self.categoria.id), 'pagina': 2, 'por_pagina': 2})
+        self.assertContains(response, 'data-desde="2"')
+        self.assertContains(response, '#3</span>')
+
+    def test_solo_un_superusuario_puede_ordenar(self):
+        elementos = self.crear_catalogo(3)
+        cliente = Client()
+        cliente.force_login(User.objects.create_user('normal', password='x'))
+        ids = [str(el.id) for el in elementos]
+        response = cliente.post(f'/ranking-gestion/ordenar/{self.categoria.id}/', json.dumps({'ids': ids}),
+                                content_type='application/json')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual([el.orden for el in Elemento.objects.order_by('titulo')], [0, 1, 2])
+
+    def test_solo_un_superusuario_ve_el_panel_y_cambia_el_orden(self):
+        elemento = self.crear_catalogo(1)[0]
+        cliente = Client()
+        cliente.force_login(User.objects.create_user('normal', password='x'))
+        self.assertEqual(cliente.get('/ranking-gestion/').status_code, 302)
+        self.assertEqual(cliente.post(f'/ranking-gestion/cambiar/{elemento.id}/subir/').status_code, 302)
+        self.assertEqual(Elemento.objects.get(id=elemento.id).orden, 0)
+
+    def test_cambiar_el_orden_solo_por_post(self):
+        elemento = self.crear_catalogo(1)[0]
+        cliente = Client()
+        cliente.force_login(User.objects.create_superuser('admin', password='x'))
+        # Un GET (un <img src> desde otra web, sin CSRF) no cambia nada
+        self.assertEqual(cliente.get(f'/ranking-gestion/cambiar/{elemento.id}/subir/').status_code, 405)
+        self.assertEqual(Elemento.objects.get(id=elemento.id).orden, 0)
+        response = cliente.post(f'/ranking-gestion/cambiar/{elemento.id}/subir/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.json()['orden'], 1)
+
+
+# --- BÚSQUEDA ---
+class BusquedaTests(MongoTestCase):
+    def test_sin_tildes_y_por_prefijo(self):
+        categoria = Categoria(nombre='Acción').save()
+        Elemento(titulo='Misión Acción', categoria=categoria, director='Íñigo Pérez').save()
+        Elemento(titulo='Comedia', categoria=categoria).save()
+
+        self.assertEqual([e.titulo for e in buscar(Elemento.objects, 'accion')[0]], ['Misión Acción'])
+        self.assertEqual([e.titulo for e in buscar(Elemento.objects, 'inigo')[0]], ['Misión Acción'])
+        self.assertEqual([e.titulo for e in buscar(Elemento.objects, 'mis acc')[0]], ['Misión Acción'])
+
+    @override_settings(BUSQUEDA_MAX_CANDIDATOS=20)
+    def test_el_titulo_exacto_no_se_pierde_por_el_limite_de_candidatos(self):
+        categoria = Categoria(nombre='Bélica').save()
+        # Más candidatos que el límite, creados antes que el título buscado (salen antes en orden natural)
+        for i in range(50):
+            Elemento(titulo=f'Otra guerra {i}', categoria=categoria, actores='Guerra Sánchez').save()
+        Elemento(titulo='Guerra y paz 2', categoria=categoria).save()
+        Elemento(titulo='Guerra y paz', categoria=categoria).save()
+
+        pagina, _, siguiente = buscar(Elemento.objects, 'guerra y paz', tamano=5)
+        self.assertEqual([e.titulo for e in pagina[:2]], ['Guerra y paz', 'Guerra y paz 2'])
+
+        pagina, _, _ = buscar(Elemento.objects, 'guerra', tamano=3)
+        self.assertEqual(pagina[0].titulo, 'Guerra y paz')
+
+
+# --- AUTOCOMPLETADO ---
+class AutocompletarTests(MongoTestCase):
+    def titulos(self, texto):
+        return [s['titulo'] for s in autocompletar.sugerencias(texto)]
+
+    def test_sugerencias_no_esperan_a_la_reconstruccion(self):
+        self.crear_catalogo(1)
+        self.assertEqual(self.titulos('titulo'), ['Título 0'])
+        # Otro worker cambia el catálogo y a este le toca comprobar la generación
+        Elemento(titulo='Título nuevo', categoria=self.categoria).save()
+        subir_generacion(autocompletar.CLAVE_GENERACION)
+        autocompletar._estado = dict(autocompletar._estado, comprobado=0.0)
+
+        empezada, seguir = threading.Event(), threading.Event()
+        construir = autocompletar._construir
+
+        def construir_despacio(version):
+            empezada.set()
+            seguir.wait(5)
+            return construir(version)
+
+        with mock.patch.object(autocompletar, '_construir', construir_despacio):
+            hilo = threading.Thread(target=autocompletar.sugerencias, args=('titulo',))
+            hilo.start()
+            self.assertTrue(empezada.wait(5))
+            # Mientras se reconstruye, el índice anterior y sin esperar
+            self.assertEqual(self.titulos('titulo'), ['Título 0'])
+            seguir.set()
+            hilo.join()
+        self.assertEqual(self.titulos('titulo'), ['Título 0', 'Título nuevo'])
+
+    def test_editar_no_habla_con_mongo_con_el_lock_cogido(self):
+        elemento = self.crear_catalogo(1)[0]
+        self.titulos('titulo')
+        subir = autocompletar._subir_version
+
+        def comprobar_lock():
+            self.assertFalse(autocompletar._lock.locked())
+            return subir()
+
+        with mock.patch.object(autocompletar, '_subir_version', comprobar_lock):
+            elemento.titulo = 'Otro nombre'
+            autocompletar.indexar_elemento(elemento)
+        self.assertEqual(self.titulos('otro'), ['Otro nombre'])
+        # Solo la hemos tocado nosotros: el índice sigue al día sin reconstruir
+        self.assertIsNotNone(autocompletar._estado['version'])
+
+
+# --- LISTAS PERSONALES ---
+class ListasTests(MongoTestCase):
+    def test_posicion_enorme_lleva_al_final(self):
+        elementos = self.crear_catalogo(3)
+        ranking = Ranking(usuario_id=1, nombre='Favoritas', elementos=[el.id for el in elementos]).save()
+        coleccion = Ranking._get_collection()
+        with mock.patch.object(coleccion, 'update_one', wraps=coleccion.update_one) as update_one:
+            self.assertTrue(mover_en_lista(ranking.id, 1, elementos[0].id, 2 ** 70))
+        # Los argumentos de $slice caben en un int32, como exige mongod
+        argumentos = update_one.call_args.args[1][0]['$set']['elementos']['$concatArrays']
+        self.assertLessEqual(max(argumentos[0]['$slice'][1], *argumentos[2]['$slice'][1:]), 2 ** 31 - 1)
+        self.assertEqual(coleccion.find_one({'_id': ranking.id})['elementos'],
+                         [elementos[1].id, elementos[2].id, elementos[0].id])
+
+
+# --- LISTAS PERSONALES CON MUCHOS HILOS ---
+class ListasConcurrentesTests(MongoTestCase):
+    HILOS = 12
+
+    def en_paralelo(self, *funciones):
+        """Lanza las funciones a la vez (cada una en su hilo) y propaga el primer error"""
+        salida = threading.Barrier(len(funciones))
+        errores = []
+
+        def ejecutar(funcion):
+            try:
+                salida.wait()
+                funcion()
+            except Exception as e:  # Se comprueba al final, en el hilo del test
+                errores.append(e)
+
+        hilos = [threading.Thread(target=ejecutar, args=(funcion,)) for funcion in funciones]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        if errores:
+            raise errores[0]
+
+    def test_altas_y_bajas_simultaneas_no_se_pisan(self):
+        elementos = self.crear_catalogo(self.HILOS * 4 + 1)
+        comun = elementos[-1]
+        ranking = Ranking(usuario_id=1, nombre='Favoritas').save()
+        cambios = []
+
+        def trabajar(propios):
+            def funcion():
+                for elemento in propios:
+                    cambios.append(anadir_a_lista(ranking.id, 1, elemento.id))
+                    cambios.append(anadir_a_lista(ranking.id, 1, comun.id))
+                # Cada hilo quita el último de los suyos
+                cambios.append(quitar_de_lista(ranking.id, 1, propios[-1].id))
+            return funcion
+
+        self.en_paralelo(*[trabajar(elementos[i * 4:i * 4 + 4]) for i in range(self.HILOS)])
+
+        esperados = {el.id for i in range(self.HILOS) for el in elementos[i * 4:i * 4 + 3]} | {comun.id}
+        guardados = Ranking._get_collection().find_one({'_id': ranking.id})['elementos']
+        self.assertEqual(len(guardados), len(set(guardados)))
+        self.assertEqual(set(guardados), esperados)
+        # Un cambio efectivo, una subida del contador de las listas del usuario (ni más ni menos)
+        generacion = Generacion.objects(clave=gen_rankings_usuario(1)).scalar('valor').first()
+        self.assertEqual(generacion, cambios.count(True))
+
+    def test_lectores_nunca_ven_una_lista_rota_ni_anterior_a_su_generacion(self):
+        elementos = self.crear_catalogo(30)
+        ranking = Ranking(usuario_id=1, nombre='Favoritas', elementos=[el.id for el in elementos]).save()
+        clave = gen_rankings_usuario(1)
+        subir_generacion(clave)
+
+        # historia[g] es la lista tal como queda al subir la generación g. Cada movimiento lleva el último
+        # al principio, así que el escritor la apunta antes de hacerlo (solo él sube este contador)
+        historia = {1: [str(el.id) for el in elementos]}
+        terminado = threading.Event()
+
+        def escritor():
+            try:
+                for generacion in range(2, 42):
+                    anterior = historia[generacion - 1]
+                    historia[generacion] = anterior[-1:] + anterior[:-1]
+                    self.assertTrue(mover_en_lista(ranking.id, 1, anterior[-1], 0))
+            finally:
+                terminado.set()
+
+        def lector():
+            usuario = SimpleNamespace(id=1, is_authenticated=True)
+            while not terminado.is_set():
+                request = RequestFactory().get('/api/v1/rankings/mios/')
+                request.user = usuario
+                response = api.mis_rankings(request)
+                version = request._generaciones[clave]
+                lista = [e['id'] for e in json.loads(response.content)['resultados'][0]['elementos']]
+                # Nunca a medias: siempre los 30, sin repetidos ni huecos
+                self.assertEqual(sorted(lista), sorted(historia[1]))
+                # Nunca más antigua que la generación bajo la que se ha cacheado
+                self.assertIn(lista, [historia[g] for g in sorted(historia) if g >= version])
+
+        self.en_paralelo(escritor, *[lector] * self.HILOS)
+
+
+# --- VISTAS ASÍNCRONAS (MOTOR) ---
+@override_settings(MONGO_DB=BASE_DATOS_TEST)
+class VistasAsyncTests(MongoTestCase):
+    """Las vistas de core/vistas_async.py sirven el mismo HTML que las síncronas (Motor simulado sobre la conexión de pruebas)"""
+
+    def setUp(self):
+        super().setUp()
+        parche = mock.patch('core.asincrono.cliente', soporte_pruebas.ClienteMotor)
+        parche.start()
+        self.addCleanup(parche.stop)
+        self.elementos = self.crear_catalogo(5)
+        for i, elemento in enumerate(self.elementos):
+            for usuario_id in range(1, i + 2):
+                Valoracion(usuario_id=usuario_id, elemento=elemento, puntuacion=usuario_id % 5 + 1,
+                           comentario=f'Reseña {usuario_id}').save()
+        sincronizar_resumenes()
+        calcular_clasificaciones()
+
+    def html(self, response):
+        self.assertEqual(response.status_code, 200)
+        # Lo único que cambia entre dos peticiones es el token CSRF
+        return re.sub(r'name="csrfmiddlewaretoken" value="[^"]*"', '', response.content.decode())
+
+    def comparar(self, ruta):
+        cache.clear()
+        sincrona = self.html(Client().get(ruta))
+        self.assertIn(self.elementos[-1].titulo, sincrona)  # Las tres páginas enseñan el título más votado
+        cache.clear()  # Si no, la asíncrona devolvería la página que acaba de cachear la síncrona
+        with override_settings(ROOT_URLCONF='cinerank.urls_async'):
+            response = async_to_sync(AsyncClient().get)(ruta)
+            # resolver_match se resuelve al leerlo: dentro del override
+            self.assertEqual(response.resolver_match.func.__module__, 'core.vistas_async')
+        self.assertEqual(self.html(response), sincrona)
+
+    def test_home(self):
+        self.comparar('/')
+
+    def test_ranking_global(self):
+        self.comparar('/ranking/')
+
+    def test_detalle_elemento(self):
+        self.comparar(f'/elemento/{self.elementos[-1].id}/')
+
+
+# --- MÉTRICAS MONGO (WSGI Y ASGI) ---
+@override_settings(METRICAS_MONGO_MUESTREO=1.0, METRICAS_MONGO_SERVER_TIMING=True)
+class MetricasMongoTests(MongoTestCase):
+    def comandos_de(self, response):
+        return int(re.search(r'desc="(\d+) comandos"', response['Server-Timing']).group(1))
+
+    def test_middleware_sincrono_y_asincrono_cuentan_lo_mismo(self):
+        self.crear_catalogo(3)
+        with self.assertLogs('core.metricas', 'INFO'):
+            Client().get('/api/v1/elementos/')  # Deja cargadas las categorías del proceso
+            cache.clear()
+            sincrono = self.comandos_de(Client().get('/api/v1/elementos/'))
+            cache.clear()
+            asincrono = self.comandos_de(async_to_sync(AsyncClient().get)('/api/v1/elementos/'))
+        self.assertGreater(sincrono, 0)
+        self.assertEqual(sincrono, asincrono)
+
+    def test_cuenta_los_comandos_lanzados_desde_hilos_como_motor(self):
+        self.crear_catalogo(3)
+
+        def contar():
+            return Elemento._get_collection().count_documents({})
+
+        async def vista(request):
+            # Como Motor: cada operación en un hilo del executor con una copia del contexto, varias a la vez
+            bucle = asyncio.get_running_loop()
+            await asyncio.gather(*[bucle.run_in_executor(None, contextvars.copy_context().run, contar)
+                                   for _ in range(8)])
+            return HttpResponse()
+
+        middleware = MetricasMongoMiddleware(vista)
+        self.assertTrue(iscoroutinefunction(middleware))
+        with self.assertLogs('core.metricas', 'INFO'):
+            response = async_to_sync(middleware)(RequestFactory().get('/'))
+        self.assertEqual(self.comandos_de(response), 8)
+
+
+# --- SALUD DE MONGO ---
+@override_settings(SALUD_MONGO_TOKEN='secreto')
+class SaludMongoTests(MongoTestCase):
+    def test_anonimo_solo_ve_si_mongo_responde(self):
+        datos = Client().get('/salud/mongo/').json()
+        self.assertEqual(datos['mongo'], 'ok')
+        self.assertEqual(set(datos), {'mongo', 'ping_ms'})
+        # Un token equivocado cuenta como anónimo
+        datos = Client().get('/salud/mongo/', HTTP_AUTHORIZATION='Bearer otro').json()
+        self.assertNotIn('pool', datos)
+
+    def test_detalle_con_token_o_superusuario(self):
+        self.assertIn('pool', Client().get('/salud/mongo/', HTTP_AUTHORIZATION='Bearer secreto').json())
+        admin = Client()
+        admin.force_login(User.objects.create_superuser('admin', password='x'))
+        self.assertIn('pool', admin.get('/salud/mongo/').json())
+
+    @override_settings(SALUD_MONGO_TOKEN='')
+    def test_sin_token_configurado_no_vale_uno_vacio(self):
+        self.assertNotIn('pool', Client().get('/salud/mongo/', HTTP_AUTHORIZATION='Bearer ').json())
+
+    def test_utilizacion_por_cliente(self):
+        evento = SimpleNamespace(address=('mongo', 27017))
+        with mock.patch('core.metricas._medidores_pool', []):
+            mongoengine, motor = MedidorPool('mongoengine', max_pool=4), MedidorPool('motor', max_pool=2)
+            for medidor in (mongoengine, motor):
+                for _ in range(2):
+                    medidor.connection_checked_out(evento)
+            pools = {pool['cliente']: pool for pool in estado_pools()['pools']}
+        # Cada pool contra su propio límite: sumadas serían 4 conexiones de 4 y el motor no llegaría al 100%
+        self.assertEqual(pools['mongoengine']['servidores']['mongo:27017']['utilizacion'], 0.5)
+        self.assertEqual(pools['motor']['servidores']['mongo:27017']['utilizacion'], 1.0)
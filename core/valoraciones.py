@@ -0,0 +1,122 @@
+import datetime
+
+from pymongo import UpdateOne
+
+from .cache_paginas import GEN_VALORACIONES, gen_elemento, subir_generacion
+from .models import Elemento, Valoracion
+
+
+# --- MANTENIMIENTO INCREMENTAL DEL RESUMEN ---
+def _actualizar_resumen(elemento_id, incrementos):
+    """Aplica los $inc al resumen del elemento en una sola operación atómica"""
+    incrementos = {campo: n for campo, n in incrementos.items() if n}
+    if not incrementos:
+        return
+    Elemento.objects(id=elemento_id).update_one(__raw__={
+        '$inc': incrementos,
+        '$set': {'resumen.actualizado': datetime.datetime.now()},
+    })
+    # El ranking y las estadísticas cacheadas ya no valen, ni nada de lo que se sirve del elemento
+    subir_generacion(GEN_VALORACIONES, gen_elemento(elemento_id))
+
+
+def registrar_valoracion(elemento_id, puntuacion, anterior=None):
+    """Suma un voto nuevo al resumen, o mueve un voto existente de 'anterior' a 'puntuacion'"""
+    if anterior is None:
+        _actualizar_resumen(elemento_id, {
+            'resumen.suma': puntuacion,
+            'resumen.votos': 1,
+            f'resumen.histograma.{puntuacion}': 1,
+        })
+    elif anterior != puntuacion:
+        _actualizar_resumen(elemento_id, {
+            'resumen.suma': puntuacion - anterior,
+            f'resumen.histograma.{anterior}': -1,
+            f'resumen.histograma.{puntuacion}': 1,
+        })
+    else:
+        # Solo ha cambiado el comentario: el resumen sigue igual, pero las reseñas del elemento no
+        subir_generacion(gen_elemento(elemento_id))
+
+
+def retirar_valoracion(elemento_id, puntuacion):
+    """Descuenta del resumen un voto borrado"""
+    _actualizar_resumen(elemento_id, {
+        'resumen.suma': -puntuacion,
+        'resumen.votos': -1,
+        f'resumen.histograma.{puntuacion}': -1,
+    })
+
+
+def retirar_valoraciones(votos_por_puntuacion):
+    """Descuenta de una vez los votos de un borrado masivo: {(elemento_id, puntuacion): votos}"""
+    incrementos = {}
+    for (elemento_id, puntuacion), votos in votos_por_puntuacion.items():
+        inc = incrementos.setdefault(elemento_id, {'resumen.suma': 0, 'resumen.votos': 0})
+        inc['resumen.suma'] -= puntuacion * votos
+        inc['resumen.votos'] -= votos
+        inc[f'resumen.histograma.{puntuacion}'] = -votos
+    if not incrementos:
+        return
+    ahora = datetime.datetime.now()
+    Elemento._get_collection().bulk_write([
+        UpdateOne({'_id': elemento_id}, {'$inc': inc, '$set': {'resumen.actualizado': ahora}})
+        for elemento_id, inc in incrementos.items()
+    ], ordered=False)
+    subir_generacion(GEN_VALORACIONES, *map(gen_elemento, incrementos))
+
+
+# --- RECONSTRUCCIÓN COMPLETA ---
+def calcular_resumenes():
+    """Recalcula desde cero los resúmenes de todos los elementos con una agregación"""
+    pipeline = [
+        {'$group': {
+            '_id': {'elemento': '$elemento', 'puntuacion': '$puntuacion'},
+            'votos': {'$sum': 1},
+        }},
+    ]
+    resumenes = {}
+    for fila in Valoracion.objects.aggregate(pipeline):
+        elemento_id = fila['_id']['elemento']
+        puntuacion = fila['_id']['puntuacion']
+        resumen = resumenes.setdefault(elemento_id, {'suma': 0, 'votos': 0, 'histograma': {}})
+        resumen['suma'] += puntuacion * fila['votos']
+        resumen['votos'] += fila['votos']
+        resumen['histograma'][str(puntuacion)] = fila['votos']
+    return resumenes
+
+
+def _resumen_guardado(doc):
+    resumen = doc.get('resumen') or {}
+    return {
+        'suma': resumen.get('suma', 0),
+        'votos': resumen.get('votos', 0),
+        'histograma': {k: v for k, v in (resumen.get('histograma') or {}).items() if v},
+    }
+
+
+def sincronizar_resumenes(corregir=True, tamano_lote=1000):
+    """Compara los resúmenes guardados con los reales y devuelve los ids desfasados (corrigiéndolos si se pide)"""
+    reales = calcular_resumenes()
+    vacio = {'suma': 0, 'votos': 0, 'histograma': {}}
+    coleccion = Elemento._get_collection()
+
+    desfasados = []
+    operaciones = []
+    ahora = datetime.datetime.now()
+    for doc in coleccion.find({}, {'resumen': 1}):
+        real = reales.get(doc['_id'], vacio)
+        if _resumen_guardado(doc) == real:
+            continue
+        desfasados.append(doc['_id'])
+        if corregir:
+            operaciones.append(UpdateOne({'_id': doc['_id']}, {'$set': {'resumen': dict(real, actualizado=ahora)}}))
+            if len(operaciones) >= tamano_lote:
+                coleccion.bulk_write(operaciones, ordered=False)
+                operaciones = []
+
+    if operaciones:
+        coleccion.bulk_write(operaciones, ordered=False)
+    if desfasados and corregir:
+        subir_generacion(GEN_VALORACIONES, *map(gen_elemento, desfasados))
+    return desfasados
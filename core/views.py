@@ -1,89 +1,205 @@
-import csv
-import io
+import hmac
+import json
+import time
+from urllib.parse import urlencode
 
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import PyMongoError
+
+from django.conf import settings
+from django.core.cache import cache
 from django.shortcuts import render, redirect
-from django.http import Http404
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.http import Http404, JsonResponse
 from django.contrib.auth import login, logout
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
+from django.views.decorators.http import require_POST
 
 # Importaciones de MongoEngine
-from mongoengine import DoesNotExist
-from .models import Elemento, Valoracion, Categoria, Ranking
+from mongoengine import DoesNotExist, ValidationError
+from .models import Elemento, Valoracion, Categoria, Ranking, TrabajoImportacion
 from .forms import ValoracionForm, ElementoForm
+from .autocompletar import sugerencias, indexar_elemento, retirar_elemento, invalidar_autocompletar
+from .busqueda import buscar
+from .cache_paginas import (GEN_CATALOGO, GEN_CATEGORIAS, GEN_VALORACIONES, cachear_pagina_anonima,
+                            dependencias_ranking, fragmento, gen_rankings_usuario, subir_generacion, versiones)
+from .categorias import obtener_categorias, obtener_categoria, invalidar_categorias
+from .conexion import lectura_catalogo
+from .estadisticas import obtener_estadisticas
+from .importacion import lanzar_importacion, marcar_trabajos_colgados
+from .listas import anadir_a_lista, quitar_de_lista, mover_en_lista
+from .metricas import estado_pools
+from .paginacion import paginar_por_cursor, paginar_por_fecha, tamano_pagina
+from .precarga import precargar
+from .rankings import MODOS, clasificacion_en_vivo, obtener_clasificacion
+from .valoraciones import registrar_valoracion
 
 # --- AUXILIAR PARA GÉNEROS ---
-def obtener_categorias_limpias(elementos_queryset):
-    """Extrae IDs únicos de categorías para evitar errores de validación"""
-    ids_categorias = elementos_queryset.distinct('categoria')
-    ids_limpios = [c.id if hasattr(c, 'id') else c for c in ids_categorias if c]
-    return Categoria.objects(id__in=ids_limpios).order_by('nombre')
-
-
-# --- VISTA 1: HOME (PELÍCULAS) ---
-def home(request):
-    elementos_base = Elemento.objects(tipo='P')
-    elementos = elementos_base
-
-    query = request.GET.get('q')
+def obtener_categorias_limpias(request, tipo):
+    """Categorías con algún elemento del tipo dado, cacheadas por tipo para no hacer distinct() en cada visita"""
+    # Con las generaciones en la clave, como las páginas: vale para todos los workers sin borrar nada
+    generaciones = versiones(request, (GEN_CATALOGO, GEN_CATEGORIAS))
+    clave = f"core:categorias_tipo:{tipo}:{'.'.join(map(str, generaciones))}"
+    categorias = cache.get(clave)
+    if categorias is None:
+        # distinct directo sobre la colección: devuelve ids sin desreferenciar cada categoría.
+        # Del primario, como todo lo que se cachea bajo una generación (core/conexion.py)
+        ids_limpios = set(Elemento._get_collection().distinct('categoria', {'tipo': tipo})) - {None}
+        categorias = [{'id': str(c.id), 'nombre': c.nombre}
+                      for c in obtener_categorias() if c.id in ids_limpios]
+        cache.set(clave, categorias, getattr(settings, 'CATEGORIAS_CACHE_TTL', 600))
+    return categorias
+
+
+def invalidar_catalogo():
+    """Se llama desde las vistas de administración que cambian categorías o elementos"""
+    subir_generacion(GEN_CATALOGO)  # Caduca las páginas y fragmentos cacheados del catálogo
+
+
+# --- AUXILIAR PARA PELÍCULAS Y SERIES ---
+def filtros_catalogo(request):
+    """Lee ?q=, ?categoria= y ?por_pagina=: (búsqueda, categoría, tamaño de página, parámetros para los enlaces)"""
+    parametros = {}
+
+    query = request.GET.get('q', '').strip()
     if query:
-        elementos = elementos.filter(titulo__icontains=query)
+        parametros['q'] = query
 
     categoria_id = request.GET.get('categoria')
     categoria_activa = None
     if categoria_id:
-        try:
-            elementos = elementos.filter(categoria=categoria_id)
-            categoria_activa = Categoria.objects.get(id=categoria_id)
-        except:
-            pass
+        categoria_activa = obtener_categoria(categoria_id)
+        if categoria_activa:
+            parametros['categoria'] = categoria_id
+
+    por_pagina = tamano_pagina(request.GET.get('por_pagina'),
+                               settings.CATALOGO_TAMANO_PAGINA, settings.CATALOGO_TAMANO_PAGINA_MAX)
+    if por_pagina != settings.CATALOGO_TAMANO_PAGINA:
+        parametros['por_pagina'] = por_pagina
+
+    return query, categoria_activa, por_pagina, parametros
+
+
+def listado_catalogo(request, tipo, titulo_pagina):
+    """Listado paginado por cursor con búsqueda y filtro de categoría (común a home y series)"""
+    query, categoria_activa, por_pagina, parametros = filtros_catalogo(request)
+    elementos = lectura_catalogo(Elemento.objects(tipo=tipo))
+    if categoria_activa:
+        elementos = elementos.filter(categoria=categoria_activa.id)
+
+    despues = request.GET.get('despues')
+    antes = request.GET.get('antes')
+
+    def generar_catalogo():
+        if query:
+            # Con búsqueda el orden es por relevancia (índice de palabras normalizadas)
+            pagina, cursor_anterior, cursor_siguiente = buscar(
+                elementos, query, despues=despues, antes=antes, tamano=por_pagina)
+        else:
+            pagina, cursor_anterior, cursor_siguiente = paginar_por_cursor(
+                elementos, despues=despues, antes=antes, tamano=por_pagina)
+        precargar(pagina, 'categoria')  # Las etiquetas de género se resuelven en bloque, no una por tarjeta
+
+        return render_to_string('fragmentos/catalogo.html', {
+            'elementos': pagina,
+            'parametros': urlencode(parametros),
+            'cursor_anterior': cursor_anterior,
+            'cursor_siguiente': cursor_siguiente
+        })
+
+    # La rejilla es igual para todos: se cachea por filtros y solo se recalcula si cambia el catálogo
+    catalogo = fragmento(request, 'catalogo', (GEN_CATALOGO, GEN_CATEGORIAS),
+                         dict(parametros, tipo=tipo, despues=despues or '', antes=antes or ''), generar_catalogo)
 
     return render(request, 'home.html', {
-        'elementos': elementos,
-        'categorias': obtener_categorias_limpias(elementos_base),
+        'catalogo': catalogo,
+        'categorias': obtener_categorias_limpias(request, tipo),
         'categoria_activa': categoria_activa,
-        'titulo_pagina': 'Películas'
+        'categoria_activa_id': str(categoria_activa.id) if categoria_activa else None,
+        'titulo_pagina': titulo_pagina,
+        'tipo': tipo
     })
 
 
+# --- VISTA 1: HOME (PELÍCULAS) ---
+@cachear_pagina_anonima(GEN_CATALOGO, GEN_CATEGORIAS)
+def home(request):
+    return listado_catalogo(request, 'P', 'Películas')
+
+
 # --- VISTA 2: LISTA DE SERIES ---
+@cachear_pagina_anonima(GEN_CATALOGO, GEN_CATEGORIAS)
 def lista_series(request):
-    elementos_base = Elemento.objects(tipo='S')
-    elementos = elementos_base
+    return listado_catalogo(request, 'S', 'Series')
 
-    query = request.GET.get('q')
-    if query:
-        elementos = elementos.filter(titulo__icontains=query)
 
-    categoria_id = request.GET.get('categoria')
-    categoria_activa = None
-    if categoria_id:
-        try:
-            elementos = elementos.filter(categoria=categoria_id)
-            categoria_activa = Categoria.objects.get(id=categoria_id)
-        except:
-            pass
+# --- AUTOCOMPLETADO DEL BUSCADOR (JSON) ---
+def autocompletar(request):
+    # Se responde desde el índice en memoria del proceso, sin consultar Mongo
+    limite = tamano_pagina(request.GET.get('limite'),
+                           settings.AUTOCOMPLETAR_LIMITE, settings.AUTOCOMPLETAR_LIMITE_MAX)
+    tipo = request.GET.get('tipo')
+    if tipo not in dict(Elemento.TIPO_CHOICES):
+        tipo = None
 
-    return render(request, 'home.html', {
-        'elementos': elementos,
-        'categorias': obtener_categorias_limpias(elementos_base),
-        'categoria_activa': categoria_activa,
-        'titulo_pagina': 'Series'
-    })
+    resultados = sugerencias(request.GET.get('q', ''), limite=limite, tipo=tipo)
+    for resultado in resultados:
+        resultado['url'] = reverse('detalle', args=[resultado['id']])
+    return JsonResponse({'resultados': resultados})
 
 
 # --- VISTA 3: DETALLE (CORREGIDA) ---
+def pipeline_datos_del_usuario(usuario_id, elemento_id):
+    return [
+        {'$match': {'usuario_id': usuario_id, 'elemento': elemento_id}},
+        {'$limit': 1},
+        {'$project': {'puntuacion': 1, 'comentario': 1, 'origen': {'$literal': 'valoracion'}}},
+        # $unionWith (MongoDB 4.4+) añade los rankings en la misma ida y vuelta
+        {'$unionWith': {'coll': Ranking._get_collection_name(), 'pipeline': [
+            {'$match': {'usuario_id': usuario_id}},
+            {'$sort': {'_id': 1}},
+            {'$project': {'nombre': 1, 'origen': {'$literal': 'ranking'}}},
+        ]}},
+    ]
+
+
+def repartir_datos_del_usuario(docs):
+    """Separa lo que devuelve la agregación en (valoración o None, rankings)"""
+    valoracion = None
+    rankings = []
+    for doc in docs:
+        if doc['origen'] == 'valoracion':
+            valoracion = doc
+        else:
+            rankings.append({'id': doc['_id'], 'nombre': doc['nombre']})
+    return valoracion, rankings
+
+
+def datos_del_usuario(usuario_id, elemento_id):
+    """Valoración del usuario para el elemento y nombres de sus rankings en una sola agregación"""
+    return repartir_datos_del_usuario(Valoracion.objects.aggregate(pipeline_datos_del_usuario(usuario_id, elemento_id)))
+
+
 def detalle_elemento(request, elemento_id):
     try:
         elemento = Elemento.objects.get(id=elemento_id)
-    except DoesNotExist:
+    except (DoesNotExist, ValidationError):
         raise Http404("El elemento no existe")
+    precargar([elemento], 'categoria')
 
-    valoraciones = Valoracion.objects(elemento=elemento).order_by('-fecha')
-    promedio = valoraciones.average('puntuacion')
-    promedio = round(promedio, 1) if promedio else 0
+    # Reseñas por páginas, de la más reciente a la más antigua (índice elemento, -fecha)
+    valoraciones, cursor_resenas = paginar_por_fecha(
+        Valoracion.objects(elemento=elemento.id).only('usuario_id', 'puntuacion', 'comentario', 'fecha'),
+        despues=request.GET.get('resenas'),
+        tamano=settings.DETALLE_RESENAS_POR_PAGINA
+    )
+    # La nota sale del resumen precalculado, sin recorrer las valoraciones
+    promedio = elemento.resumen.promedio if elemento.resumen else 0
 
     form = ValoracionForm()
     valoracion_existente = None
@@ -91,8 +207,7 @@ def detalle_elemento(request, elemento_id):
 
     if request.user.is_authenticated:
         # CORRECCIÓN: Usar usuario_id=request.user.id para coincidir con el modelo
-        user_rankings = Ranking.objects(usuario_id=request.user.id)
-        valoracion_existente = Valoracion.objects(usuario_id=request.user.id, elemento=elemento).first()
+        valoracion_existente, user_rankings = datos_del_usuario(request.user.id, elemento.id)
 
         if request.method == 'POST':
             form = ValoracionForm(request.POST)
@@ -101,23 +216,31 @@ def detalle_elemento(request, elemento_id):
                 comentario = form.cleaned_data['comentario']
 
                 if valoracion_existente:
-                    valoracion_existente.update(set__puntuacion=puntuacion, set__comentario=comentario)
+                    # modify devuelve el documento anterior de forma atómica, así el resumen
+                    # mueve el voto desde la puntuación que realmente había guardada
+                    anterior = Valoracion.objects(id=valoracion_existente['_id']).modify(
+                        set__puntuacion=puntuacion, set__comentario=comentario)
+                    if anterior:
+                        registrar_valoracion(elemento.id, puntuacion, anterior=anterior.puntuacion)
                     messages.success(request, "¡Tu valoración ha sido actualizada!")
                 else:
                     # CORRECCIÓN: Crear usando usuario_id
                     nueva_v = Valoracion(usuario_id=request.user.id, elemento=elemento,
                                          puntuacion=puntuacion, comentario=comentario)
                     nueva_v.save()
+                    registrar_valoracion(elemento.id, puntuacion)
                     messages.success(request, "¡Valoración guardada!")
                 return redirect('detalle', elemento_id=elemento.id)
 
         elif valoracion_existente:
-            form = ValoracionForm(initial={'puntuacion': valoracion_existente.puntuacion,
-                                           'comentario': valoracion_existente.comentario})
+            form = ValoracionForm(initial={'puntuacion': valoracion_existente['puntuacion'],
+                                           'comentario': valoracion_existente.get('comentario')})
 
     return render(request, 'detalle.html', {
         'elemento': elemento,
         'valoraciones': valoraciones,
+        'cursor_resenas': cursor_resenas,
+        'primera_pagina_resenas': not request.GET.get('resenas'),
         'form': form,
         'promedio': promedio,
         'mi_valoracion': valoracion_existente,
@@ -126,50 +249,116 @@ def detalle_elemento(request, elemento_id):
 
 
 # --- VISTA 4: RANKING GLOBAL ---
+def filtros_ranking(request):
+    """Lee ?tipo=, ?modo= y ?categoria= del ranking global, con sus valores por defecto"""
+    tipo = request.GET.get('tipo', 'P')
+    if tipo not in dict(Elemento.TIPO_CHOICES):
+        tipo = 'P'
+    modo = request.GET.get('modo')
+    if modo not in MODOS:
+        modo = settings.RANKING_MODO
+    return tipo, modo, obtener_categoria(request.GET.get('categoria') or None)
+
+
+@cachear_pagina_anonima(GEN_CATALOGO, GEN_CATEGORIAS, ranking=True)
 def ranking_global(request):
-    tipo_seleccionado = request.GET.get('tipo', 'P')
-    elementos = Elemento.objects(tipo=tipo_seleccionado)
-
-    lista_ranking = []
-    for item in elementos:
-        vals = Valoracion.objects(elemento=item)
-        promedio = vals.average('puntuacion')
-        if promedio:
-            lista_ranking.append({
-                'elemento': item,
-                'promedio': round(promedio, 1),
-                'total_votos': vals.count()
-            })
-
-    ranking_ordenado = sorted(lista_ranking, key=lambda x: (x['promedio'], x['total_votos']), reverse=True)
+    tipo_seleccionado, modo, categoria = filtros_ranking(request)
+
+    def generar_ranking():
+        # Una lectura por índice de la clasificación precalculada (manage.py calcular_clasificaciones)
+        categoria_id = categoria.id if categoria else None
+        entradas = obtener_clasificacion(modo, tipo_seleccionado, categoria_id, limite=50)
+        if entradas is None:
+            # Aún no se ha calculado ninguna: media simple al momento, como antes
+            entradas = clasificacion_en_vivo(tipo_seleccionado, categoria_id, limite=50)
+        return render_to_string('fragmentos/ranking.html', {'ranking': entradas, 'modo': modo})
+
+    # Las clasificaciones cambian solo al recalcularlas: el fragmento no depende de cada voto (salvo en vivo)
+    ranking = fragmento(
+        request, 'ranking', dependencias_ranking(request),
+        {'tipo': tipo_seleccionado, 'modo': modo, 'categoria': str(categoria.id) if categoria else ''}, generar_ranking
+    )
 
     return render(request, 'ranking_global.html', {
-        'ranking': ranking_ordenado[:50],
-        'tipo_actual': tipo_seleccionado
+        'ranking': ranking,
+        'tipo_actual': tipo_seleccionado,
+        'modo_actual': modo,
+        'modos': MODOS,
+        'categorias': obtener_categorias_limpias(request, tipo_seleccionado),
+        'categoria_actual': str(categoria.id) if categoria else ''
     })
 
 #--- VISTA 5: LISTA DE CATEGORÍAS ---
+def elementos_por_categoria(limite, elementos=None):
+    """Por categoría, su total y sus 'limite' primeros: {categoria_id: (total, primeros)}
+
+    Una sola agregación, haya las categorías que haya: el recuento agrupado (solo lee el índice) y, para
+    cada categoría, un $lookup acotado con $limit sobre el índice (categoria, -orden, _id). Nunca se
+    cargan más de 'limite' elementos de cada una.
+    """
+    if elementos is None:
+        elementos = Elemento.objects  # Desde el primario: el panel de ranking tiene que ver sus propios cambios
+    filas = elementos.aggregate([
+        {'$match': {'categoria': {'$ne': None}}},
+        {'$sort': {'categoria': 1}},
+        {'$group': {'_id': '$categoria', 'total': {'$sum': 1}}},
+        {'$lookup': {
+            'from': Elemento._get_collection_name(),
+            'let': {'categoria': '$_id'},
+            'pipeline': [
+                # Desde MongoDB 5.0 el $eq de un $expr dentro de un $lookup usa el índice
+                {'$match': {'$expr': {'$eq': ['$categoria', '$$categoria']}}},
+                # Mismo orden que el panel de ranking: mayor 'orden' primero
+                {'$sort': {'orden': -1, '_id': 1}},
+                {'$limit': limite},
+                {'$project': {'titulo': 1, 'anio': 1, 'imagen_url': 1, 'tipo': 1, 'orden': 1}},
+            ],
+            'as': 'primeros',
+        }},
+    ])
+
+    return {fila['_id']: (fila['total'], [{
+        'id': doc['_id'],
+        'titulo': doc.get('titulo'),
+        'anio': doc.get('anio'),
+        'imagen_url': doc.get('imagen_url'),
+        'tipo': doc.get('tipo'),
+        'orden': doc.get('orden'),
+    } for doc in fila['primeros']]) for fila in filas}
+
+
+@cachear_pagina_anonima(GEN_CATALOGO, GEN_CATEGORIAS)
 def lista_categorias(request):
-    todas_las_categorias = Categoria.objects.all()
-    categorias_validas = []
-
-    for cat in todas_las_categorias:
-        # Buscamos elementos de esta categoría
-        elementos = Elemento.objects(categoria=cat)
-
-        # SI TIENE ELEMENTOS, la preparamos para el HTML
-        if elementos.count() > 0:
-            cat.elementos_lista = elementos
-            categorias_validas.append(cat)
-
-    return render(request, 'categorias.html', {'categorias': categorias_validas})
+    limite = tamano_pagina(request.GET.get('top'),
+                           settings.CATEGORIAS_TOP_ELEMENTOS, settings.CATEGORIAS_TOP_ELEMENTOS_MAX)
+    es_admin = request.user.is_superuser
+
+    def generar_categorias():
+        agrupados = elementos_por_categoria(limite, lectura_catalogo(Elemento.objects))
+
+        # Solo las categorías con elementos, en el orden (por nombre) de la caché de categorías
+        categorias_validas = []
+        for cat in obtener_categorias():
+            if cat.id in agrupados:
+                total, elementos = agrupados[cat.id]
+                categorias_validas.append({
+                    'id': cat.id,
+                    'nombre': cat.nombre,
+                    'total_elementos': total,
+                    'elementos_lista': elementos
+                })
+        return render_to_string('fragmentos/categorias.html', {'categorias': categorias_validas, 'es_admin': es_admin})
+
+    # Los administradores ven botones de edición: tienen su propia variante del fragmento
+    categorias = fragmento(request, 'categorias', (GEN_CATALOGO, GEN_CATEGORIAS),
+                           {'top': limite, 'admin': es_admin}, generar_categorias)
+
+    return render(request, 'categorias.html', {'categorias': categorias, 'limite': limite})
 
 # --- VISTAS DE RANKINGS PERSONALES ---
 @login_required
 def mis_rankings(request):
     # REQUISITO 27: Crear un nuevo ranking personal
-    rankings = Ranking.objects(usuario_id=request.user.id)
-
     if request.method == 'POST':
         nombre = request.POST.get('nombre_ranking')
         if nombre:
@@ -178,31 +367,40 @@ def mis_rankings(request):
                 usuario_id=request.user.id,
                 elementos=[]
             ).save()
+            subir_generacion(gen_rankings_usuario(request.user.id))
             messages.success(request, f"Lista '{nombre}' creada.")
         return redirect('mis_rankings')
 
+    # Mongo nos da el tamaño de cada lista con $size, sin traernos los ids
+    rankings = [
+        {'id': r['_id'], 'nombre': r['nombre'], 'total_elementos': r['total_elementos']}
+        for r in Ranking.objects(usuario_id=request.user.id).aggregate([
+            {'$project': {'nombre': 1, 'total_elementos': {'$size': {'$ifNull': ['$elementos', []]}}}},
+        ])
+    ]
+
     return render(request, 'mis_rankings.html', {'rankings': rankings})
 
 @login_required
 def agregar_a_ranking(request, id_elemento):
     if request.method == 'POST':
         try:
-            elemento = Elemento.objects.get(id=id_elemento)
+            elemento = Elemento.objects.only('titulo').get(id=id_elemento)
 
             # Validamos que el usuario ya haya valorado este elemento
-            valoracion = Valoracion.objects(usuario_id=request.user.id, elemento=elemento).first()
-            if not valoracion:
+            if not Valoracion.objects(usuario_id=request.user.id, elemento=elemento.id).only('id').first():
                 messages.error(request, f"Debes valorar '{elemento.titulo}' antes de añadirlo a tu ranking.")
                 return redirect('detalle', elemento_id=id_elemento)
 
+            # $addToSet atómico: no leemos la lista ni la reescribimos entera
             ranking_id = request.POST.get('ranking_id')
-            ranking = Ranking.objects.get(id=ranking_id, usuario_id=request.user.id)
+            anadido = anadir_a_lista(ranking_id, request.user.id, elemento.id) \
+                if ObjectId.is_valid(ranking_id) else None
 
-            # Comprobamos que no esté ya en la lista
-            if elemento not in ranking.elementos:
-                ranking.elementos.append(elemento)
-                ranking.save()
-                messages.success(request, f"¡Añadido a tu ranking: {ranking.nombre}!")
+            if anadido is None:
+                messages.error(request, "El ranking no existe o no es tuyo.")
+            elif anadido:
+                messages.success(request, "¡Añadido a tu ranking!")
             else:
                 messages.info(request, "Ya tenías este elemento en tu ranking.")
 
@@ -212,84 +410,52 @@ def agregar_a_ranking(request, id_elemento):
     return redirect('detalle', elemento_id=id_elemento)
 
 
+@login_required
+def quitar_de_ranking(request, ranking_id, elemento_id):
+    if request.method == 'POST' and ObjectId.is_valid(ranking_id) and ObjectId.is_valid(elemento_id):
+        if quitar_de_lista(ranking_id, request.user.id, elemento_id) is None:
+            messages.error(request, "El ranking no existe o no es tuyo.")
+        else:
+            messages.success(request, "Elemento quitado de tu ranking.")
+    return redirect('detalle_ranking_personal', ranking_id=ranking_id)
+
+
+@login_required
+def mover_en_ranking(request, ranking_id, elemento_id):
+    # La posición llega desde 1, como se muestra en la lista
+    if request.method == 'POST' and ObjectId.is_valid(ranking_id) and ObjectId.is_valid(elemento_id):
+        try:
+            posicion = int(request.POST.get('posicion')) - 1
+        except (TypeError, ValueError):
+            messages.error(request, "Indica una posición válida.")
+        else:
+            if not mover_en_lista(ranking_id, request.user.id, elemento_id, posicion):
+                messages.error(request, "Ese elemento no está en tu ranking.")
+    return redirect('detalle_ranking_personal', ranking_id=ranking_id)
+
+
 @login_required
 def detalle_ranking_personal(request, ranking_id):
     try:
         ranking = Ranking.objects.get(id=ranking_id, usuario_id=request.user.id)
-
-        # BLINDAJE: Nos aseguramos de extraer los objetos completos con todos sus datos
-        elementos_completos = []
-        for el in ranking.elementos:
-            if hasattr(el, 'titulo'): # Si ya es el objeto completo
-                elementos_completos.append(el)
-            else: # Si MongoEngine guardó solo el ID, lo buscamos
-                try:
-                    obj = Elemento.objects.get(id=el)
-                    elementos_completos.append(obj)
-                except DoesNotExist:
-                    continue
-
-    except DoesNotExist:
+    except (DoesNotExist, ValidationError):
         messages.error(request, "El ranking no existe o no es tuyo.")
         return redirect('mis_rankings')
 
+    # Todos los elementos con una sola consulta $in, en el orden de la lista y sin los ya borrados
+    precargar([ranking], 'elementos')
+
     return render(request, 'detalle_ranking.html', {
         'ranking': ranking,
-        'elementos_reales': elementos_completos
+        'elementos_reales': ranking.elementos
     })
 
 # --- Panel Estadisticas ---
+@cachear_pagina_anonima(GEN_CATALOGO, GEN_CATEGORIAS, GEN_VALORACIONES)
 def panel_estadisticas(request):
-    # REQUISITO 33: Mostrar número total de valoraciones
-    total_valoraciones = Valoracion.objects.count()
-
-    # REQUISITO 32: Promedio de puntuaciones por categoría
-    datos_categorias = []
-    categorias = Categoria.objects.all()
-
-    for cat in categorias:
-        elementos = Elemento.objects(categoria=cat)
-        cantidad = elementos.count()
-        total_puntos = 0
-        total_votos = 0
-
-        for el in elementos:
-            vals = Valoracion.objects(elemento=el)
-            if vals:
-                total_puntos += vals.sum('puntuacion')
-                total_votos += vals.count()
-
-        promedio_cat = round(total_puntos / total_votos, 1) if total_votos > 0 else 0.0
-
-        datos_categorias.append({
-            'nombre': cat.nombre,
-            'cantidad': cantidad,
-            'promedio': promedio_cat
-        })
-
-    # REQUISITO 31: Mostrar elementos más valorados (Top 10 Global)
-    todos_elementos = Elemento.objects.all()
-    lista_top = []
-
-    for el in todos_elementos:
-        vals = Valoracion.objects(elemento=el)
-        promedio = vals.average('puntuacion')
-        if promedio:
-            lista_top.append({
-                'elemento': el,
-                'promedio': round(promedio, 1),
-                'votos': vals.count()
-            })
-
-    # Ordenamos de mayor a menor promedio (y por número de votos si hay empate)
-    top_elementos = sorted(lista_top, key=lambda x: (x['promedio'], x['votos']), reverse=True)[:10]
-
-    return render(request, 'estadisticas.html', {
-        'total_elementos': Elemento.objects.count(),
-        'total_valoraciones': total_valoraciones, # Pasamos el total (Req 33)
-        'datos_categorias': datos_categorias,     # Pasamos las categorías (Req 32)
-        'top_elementos': top_elementos            # Pasamos el Top 10 (Req 31)
-    })
+    # REQUISITOS 31, 32 y 33: top 10, promedio por categoría y total de valoraciones.
+    # Todo sale de un snapshot cacheado por generaciones: caduca al escribir valoraciones.
+    return render(request, 'estadisticas.html', obtener_estadisticas(request))
 
 # Crear Elemento (Película o Serie)
 @user_passes_test(lambda u: u.is_superuser)
@@ -300,6 +466,8 @@ def crear_elemento(request):
         form = ElementoForm(request.POST)
         if form.is_valid():
             nuevo = form.save()
+            invalidar_catalogo()
+            indexar_elemento(nuevo)
             # Redirigimos a categorías para ver el cambio
             return redirect('lista_categorias')
     else:
@@ -331,10 +499,12 @@ def crear_categoria(request):
             # 1. Crear y guardar la categoría primero
             nueva_cat = Categoria(nombre=nombre, descripcion=descripcion)
             nueva_cat.save()
+            invalidar_categorias()
 
             # 2. Asignar masivamente los elementos seleccionados a esta nueva categoría
             if elementos_ids:
                 Elemento.objects(id__in=elementos_ids).update(set__categoria=nueva_cat)
+                invalidar_catalogo()
 
             messages.success(request, f"Categoría '{nombre}' creada y elementos asignados.")
 
@@ -365,6 +535,7 @@ def editar_categoria(request, categoria_id):
             categoria.nombre = nombre
             categoria.descripcion = descripcion
             categoria.save()
+            invalidar_categorias()
 
             # 2. LOGICA DE ACTUALIZACIÓN DE ELEMENTOS
             # A) Primero: Los elementos que YA estaban en esta categoría pero NO se marcaron ahora,
@@ -380,6 +551,7 @@ def editar_categoria(request, categoria_id):
             # B) Segundo: Asignar los marcados a esta categoría
             if elementos_ids:
                 Elemento.objects(id__in=elementos_ids).update(set__categoria=categoria)
+            invalidar_catalogo()
 
             messages.success(request, f"Categoría '{nombre}' actualizada correctamente.")
             return redirect('lista_categorias')
@@ -395,40 +567,43 @@ def editar_categoria(request, categoria_id):
 def importar_csv(request):
     if request.method == 'POST' and request.FILES.get('archivo_csv'):
         archivo = request.FILES['archivo_csv']
-        data_set = archivo.read().decode('UTF-8')
-        io_string = io.StringIO(data_set)
-        next(io_string) # Saltar cabecera
-
-        count = 0
-        for row in csv.reader(io_string, delimiter=',', quotechar='"'):
-            # NUEVO ORDEN SOLICITADO:
-            # 0:titulo, 1:anio, 2:descripcion, 3:categoria, 4:imagen_url, 5:tipo(P/S), 6:director, 7:actores
-            try:
-                # Buscar o crear categoría
-                cat_obj, _ = Categoria.objects.get_or_create(
-                    nombre=row[3].strip(),
-                    defaults={'descripcion': 'Categoría creada automáticamente'}
-                )
-
-                Elemento(
-                    titulo=row[0].strip(),
-                    anio=int(row[1]),
-                    descripcion=row[2].strip(),
-                    categoria=cat_obj,
-                    imagen_url=row[4].strip(),
-                    tipo=row[5].strip().upper(), # Tipo movido después de imagen_url
-                    director=row[6].strip() if len(row) > 6 else "",
-                    actores=row[7].strip() if len(row) > 7 else ""
-                ).save()
-                count += 1
-            except Exception as e:
-                print(f"Error en fila {row[0] if row else 'desconocida'}: {e}")
-                continue
-
-        messages.success(request, f"¡Éxito! Se han importado {count} elementos.")
-        return redirect('home')
 
-    return render(request, 'admin/importar_csv.html')
+        # La importación corre en segundo plano: devolvemos el ID del trabajo al momento
+        trabajo = TrabajoImportacion(usuario_id=request.user.id, archivo=archivo.name).save()
+        lanzar_importacion(archivo, trabajo, procesos=settings.IMPORTACION_PROCESOS)
+
+        messages.success(request, f"Importación en marcha. ID del trabajo: {trabajo.id}")
+        return redirect(f"{reverse('importar_csv')}?trabajo={trabajo.id}")
+
+    trabajo = None
+    trabajo_id = request.GET.get('trabajo')
+    marcar_trabajos_colgados()
+    if trabajo_id and ObjectId.is_valid(trabajo_id):
+        trabajo = TrabajoImportacion.objects(id=trabajo_id).first()
+
+    return render(request, 'admin/importar_csv.html', {'trabajo': trabajo})
+
+
+@user_passes_test(lambda u: u.is_superuser)
+def estado_importacion(request, trabajo_id):
+    marcar_trabajos_colgados()  # Si el worker que lo importaba murió, que el panel no espere para siempre
+    trabajo = TrabajoImportacion.objects(id=trabajo_id).first() if ObjectId.is_valid(trabajo_id) else None
+    if not trabajo:
+        raise Http404("El trabajo no existe")
+
+    return JsonResponse({
+        'id': str(trabajo.id),
+        'archivo': trabajo.archivo,
+        'estado': trabajo.estado,
+        'filas': trabajo.filas,
+        'nuevos': trabajo.nuevos,
+        'actualizados': trabajo.actualizados,
+        'categorias_creadas': trabajo.categorias_creadas,
+        'total_fallidas': trabajo.total_fallidas,
+        'fallidas': trabajo.fallidas,
+        'mensaje': trabajo.mensaje,
+        'terminado': trabajo.estado in ('terminado', 'error')
+    })
 
 
 #Eliminar elemento (película o serie)
@@ -437,6 +612,8 @@ def eliminar_elemento(request, elemento_id):
     elemento = Elemento.objects(id=elemento_id).first()
     if elemento:
         elemento.delete()
+        invalidar_catalogo()
+        retirar_elemento(elemento_id)
         messages.success(request, "Elemento eliminado correctamente.")
     return redirect('lista_categorias')
 
@@ -447,6 +624,9 @@ def eliminar_categoria(request, categoria_id):
     if cat:
         # El CASCADE del modelo se encarga de los elementos
         cat.delete()
+        invalidar_categorias()
+        invalidar_catalogo()
+        invalidar_autocompletar()  # El CASCADE ha borrado elementos que el índice aún tiene
         messages.success(request, f"Categoría {cat.nombre} y sus elementos eliminados.")
     return redirect('lista_categorias')
 
@@ -485,11 +665,13 @@ def editar_elemento(request, elemento_id):
             # En lugar de guardar el texto directo, buscamos el objeto Categoria real
             categoria_id = form.cleaned_data.get('categoria')
             if categoria_id:
-                categoria_obj = Categoria.objects(id=categoria_id).first()
+                categoria_obj = obtener_categoria(categoria_id)
                 if categoria_obj:
                     elemento.categoria = categoria_obj
 
             elemento.save()
+            invalidar_catalogo()
+            indexar_elemento(elemento)
 
             messages.success(request, f"'{elemento.titulo}' actualizado correctamente.")
             return redirect('lista_categorias')
@@ -504,7 +686,7 @@ def editar_elemento(request, elemento_id):
             'director': getattr(elemento, 'director', ''),
             'reparto': getattr(elemento, 'actores', ''),
             'orden': getattr(elemento, 'orden', 0),
-            'categoria': str(elemento.categoria.id) if elemento.categoria else None,
+            'categoria': str(elemento._data['categoria'].id) if elemento._data.get('categoria') else None,
         }
         form = ElementoForm(initial=initial_data)
 
@@ -529,6 +711,7 @@ def añadir_masivo_categoria(request, categoria_id):
         if elementos_ids:
             # Actualización para MongoEngine
             Elemento.objects(id__in=elementos_ids).update(set__categoria=categoria_destino)
+            invalidar_catalogo()
             messages.success(request, f"Se han movido {len(elementos_ids)} elementos a {categoria_destino.nombre}")
         return redirect('lista_categorias')
 
@@ -541,50 +724,157 @@ def añadir_masivo_categoria(request, categoria_id):
     })
 
 
-@login_required
+@user_passes_test(lambda u: u.is_superuser)
 def panel_ranking(request):
-    # 1. Traemos todo de la base de datos
-    categorias = list(Categoria.objects.all())
-    todos_los_elementos = list(Elemento.objects.all())
-
-    for cat in categorias:
-        elementos_encontrados = []
-        # Obtenemos el ID real de la categoría (como un objeto ObjectId)
-        id_categoria_objetivo = cat.id
-
-        for el in todos_los_elementos:
-            # 2. Extraemos el ID de la categoría del elemento de la forma más cruda posible
-            # Accedemos al diccionario interno de MongoEngine (_data)
-            val_cat = el._data.get('categoria')
+    por_pagina = tamano_pagina(request.GET.get('por_pagina'),
+                               settings.PANEL_RANKING_POR_PAGINA, settings.PANEL_RANKING_POR_PAGINA_MAX)
+    categoria = obtener_categoria(request.GET.get('categoria') or None)
 
-            # Si es un objeto de referencia, sacamos su ID. Si ya es un ID, lo usamos.
-            id_del_elemento = getattr(val_cat, 'id', val_cat)
-
-            # 3. Comparación Directa
-            if id_del_elemento == id_categoria_objetivo:
-                elementos_encontrados.append(el)
-
-        # 4. Ordenamos (mayor orden primero)
-        elementos_encontrados.sort(key=lambda x: getattr(x, 'orden', 0) or 0, reverse=True)
+    if categoria:
+        # Una sola categoría, paginada: find sobre el índice (categoria, -orden, _id) con skip/limit
+        try:
+            pagina = max(1, int(request.GET.get('pagina', 1)))
+        except ValueError:
+            pagina = 1
+        desplazamiento = (pagina - 1) * por_pagina
+        consulta = Elemento.objects(categoria=categoria.id).order_by('-orden', 'id')
+        total = consulta.count()
+        elementos = list(consulta.skip(desplazamiento).limit(por_pagina)
+                         .only('titulo', 'anio', 'imagen_url', 'orden').as_pymongo())
+        for el in elementos:
+            el['id'] = el.pop('_id')
+        categorias = [{'id': categoria.id, 'nombre': categoria.nombre, 'total': total,
+                       'elementos_ranking': elementos, 'desde': desplazamiento}]
+        paginacion = {
+            'pagina': pagina,
+            'anterior': pagina - 1 if pagina > 1 else None,
+            'siguiente': pagina + 1 if desplazamiento + por_pagina < total else None,
+        }
+    else:
+        # Todas: de cada una solo se leen los primeros 'por_pagina' por el mismo índice;
+        # el resto se ve entrando en la categoría.
+        agrupados = elementos_por_categoria(por_pagina)
+        categorias = []
+        for cat in obtener_categorias():
+            total, elementos = agrupados.get(cat.id, (0, []))
+            categorias.append({'id': cat.id, 'nombre': cat.nombre, 'total': total,
+                               'elementos_ranking': elementos, 'desde': 0})
+        paginacion = None
+
+    return render(request, 'admin/panel_ranking.html', {
+        'categorias': categorias,
+        'categoria_actual': categoria,
+        'paginacion': paginacion,
+        'por_pagina': por_pagina
+    })
 
-        # Guardamos la lista en la categoría
-        cat.elementos_ranking = elementos_encontrados
+def _quiere_json(request):
+    # El panel pide JSON (?formato=json o Accept) para actualizar la fila sin recargar la página
+    return request.GET.get('formato') == 'json' or 'application/json' in request.headers.get('Accept', '')
 
-    return render(request, 'admin/panel_ranking.html', {'categorias': categorias})
 
-@login_required
+@user_passes_test(lambda u: u.is_superuser)
+@require_POST
 def cambiar_ranking(request, item_id, accion):
-    elemento = Elemento.objects(id=item_id).first()
-    if elemento:
-        if accion == 'subir':
-            elemento.orden = (elemento.orden or 0) + 1
-        elif accion == 'bajar':
-            elemento.orden = max(0, (elemento.orden or 0) - 1)
-        elemento.save()
-
+    if not ObjectId.is_valid(item_id) or accion not in ('subir', 'bajar'):
+        if _quiere_json(request):
+            return JsonResponse({'error': 'Elemento o acción no válidos'}, status=400)
+        return redirect('panel_ranking')
+
+    # $inc atómico: dos editores a la vez suman los dos pasos en lugar de pisarse el documento entero
+    coleccion = Elemento._get_collection()
+    if accion == 'subir':
+        doc = coleccion.find_one_and_update({'_id': ObjectId(item_id)}, {'$inc': {'orden': 1}},
+                                            projection={'orden': 1}, return_document=ReturnDocument.AFTER)
+    else:
+        # Sin bajar de 0: si ya está en 0 el filtro no coincide y solo leemos el valor actual
+        doc = (coleccion.find_one_and_update({'_id': ObjectId(item_id), 'orden': {'$gt': 0}}, {'$inc': {'orden': -1}},
+                                             projection={'orden': 1}, return_document=ReturnDocument.AFTER)
+               or coleccion.find_one({'_id': ObjectId(item_id)}, {'orden': 1}))
+    if doc:
+        subir_generacion(GEN_CATALOGO)
+
+    if _quiere_json(request):
+        if doc is None:
+            return JsonResponse({'error': 'El elemento no existe'}, status=404)
+        return JsonResponse({'id': item_id, 'orden': doc.get('orden', 0)})
     # Esto te devuelve al panel y refresca la lista con el nuevo orden
     return redirect('panel_ranking')
 
+
+@user_passes_test(lambda u: u.is_superuser)
+def ordenar_categoria(request, categoria_id):
+    """Aplica de una vez el orden completo de una categoría: ids de primero a último"""
+    categoria = obtener_categoria(categoria_id)
+    if request.method != 'POST' or categoria is None:
+        if _quiere_json(request):
+            return JsonResponse({'error': 'Categoría no válida'}, status=400 if categoria else 404)
+        return redirect('panel_ranking')
+
+    if request.content_type == 'application/json':
+        try:
+            ids = json.loads(request.body).get('ids')
+        except (ValueError, AttributeError):
+            ids = None
+    else:
+        ids = request.POST.getlist('ids')
+    if not isinstance(ids, list) or not ids or len(set(ids)) != len(ids) \
+            or not all(isinstance(i, str) and ObjectId.is_valid(i) for i in ids):
+        if _quiere_json(request):
+            return JsonResponse({'error': 'Envía la lista completa de ids, sin repetir'}, status=400)
+        messages.error(request, "El orden enviado no es válido.")
+        return redirect('panel_ranking')
+
+    # El primero recibe el orden más alto. Los de la categoría que no vengan en la lista (p. ej. creados
+    # mientras tanto) pasan a 0, detrás de todos. Un único bulk_write para toda la categoría.
+    total = len(ids)
+    object_ids = [ObjectId(i) for i in ids]
+    operaciones = [UpdateOne({'_id': oid, 'categoria': categoria.id}, {'$set': {'orden': total - posicion}})
+                   for posicion, oid in enumerate(object_ids)]
+    operaciones.append(UpdateMany({'categoria': categoria.id, '_id': {'$nin': object_ids}, 'orden': {'$ne': 0}},
+                                  {'$set': {'orden': 0}}))
+    resultado = Elemento._get_collection().bulk_write(operaciones, ordered=False)
+    subir_generacion(GEN_CATALOGO)
+
+    if _quiere_json(request):
+        return JsonResponse({
+            'categoria': str(categoria.id),
+            'modificados': resultado.modified_count,
+            'orden': {i: total - posicion for posicion, i in enumerate(ids)}
+        })
+    messages.success(request, f"Orden de {categoria.nombre} guardado.")
+    return redirect(f"{reverse('panel_ranking')}?categoria={categoria.id}")
+
+# --- SALUD DEL PROCESO ---
+def _ve_detalle_salud(request):
+    """Superusuarios o quien traiga 'Authorization: Bearer <SALUD_MONGO_TOKEN>' (si hay token configurado)"""
+    if request.user.is_superuser:
+        return True
+    token = settings.SALUD_MONGO_TOKEN
+    recibido = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    return bool(token) and hmac.compare_digest(recibido.encode(), token.encode())
+
+
+def salud_mongo(request):
+    """Ping a Mongo (JSON, 503 si no responde); con permiso, además el uso de los pools de este worker
+
+    A los demás solo se les dice si Mongo responde: nada de pid, direcciones de servidores ni preferencia de lectura.
+    """
+    detalle = _ve_detalle_salud(request)
+    inicio = time.perf_counter()
+    try:
+        Elemento._get_db().command('ping')
+    except PyMongoError as e:
+        datos = {'mongo': 'error'}
+        if detalle:
+            datos.update(detalle=type(e).__name__, pool=estado_pools())
+        return JsonResponse(datos, status=503)
+
+    datos = {'mongo': 'ok', 'ping_ms': round((time.perf_counter() - inicio) * 1000, 1)}
+    if detalle:
+        datos.update(lectura_catalogo=settings.MONGO_LECTURA_CATALOGO, pool=estado_pools())
+    return JsonResponse(datos)
+
 # --- AUTENTICACIÓN ---
 def registro(request):
     form = UserCreationForm(request.POST or None)
@@ -0,0 +1,161 @@
+import asyncio
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from bson import ObjectId
+from django.conf import settings
+from django.http import Http404
+from django.shortcuts import render
+from django.template.loader import render_to_string
+
+from . import views
+from .asincrono import coleccion
+from .cache_paginas import GEN_CATALOGO, GEN_CATEGORIAS, adependencias_ranking, afragmento, cachear_pagina_anonima
+from .forms import ValoracionForm
+from .models import Clasificacion, Elemento, Valoracion
+from .paginacion import apaginar_por_cursor, apaginar_por_fecha
+from .precarga import precargar
+from .rankings import MODOS, clasificacion_en_vivo
+
+# --- VISTAS DE LECTURA ASÍNCRONAS (ASGI) ---
+# Mismas páginas que core/views.py, pero las consultas van por Motor sin ocupar un hilo mientras
+# Mongo responde, y las que no dependen entre sí se lanzan a la vez con asyncio.gather.
+# Lo que pasa por el ORM de Django (sesión, usuario, mensajes en la plantilla) y las escrituras
+# siguen siendo síncronas y se ejecutan con sync_to_async.
+
+
+def _renderizar(request, plantilla, contexto, precarga=()):
+    # Las categorías salen de la caché del proceso; la plantilla puede leer user y messages (ORM)
+    precargar(precarga, 'categoria')
+    return render(request, plantilla, contexto)
+
+
+def _fragmento_catalogo(elementos, contexto):
+    precargar(elementos, 'categoria')
+    return render_to_string('fragmentos/catalogo.html', dict(contexto, elementos=elementos))
+
+
+# --- CATÁLOGO (HOME Y SERIES) ---
+async def listado_catalogo(request, tipo, titulo_pagina):
+    # obtener_categoria recarga las categorías con el ORM cuando cambia su generación: fuera del bucle
+    query, categoria_activa, por_pagina, parametros = await sync_to_async(views.filtros_catalogo)(request)
+    if query:
+        # La búsqueda por relevancia sigue en la vista síncrona
+        return await sync_to_async(views.listado_catalogo)(request, tipo, titulo_pagina)
+
+    despues = request.GET.get('despues')
+    antes = request.GET.get('antes')
+    filtro = {'tipo': tipo}
+    if categoria_activa:
+        filtro['categoria'] = categoria_activa.id
+
+    async def generar_catalogo():
+        docs, cursor_anterior, cursor_siguiente = await apaginar_por_cursor(
+            coleccion(Elemento, catalogo=True), filtro, despues=despues, antes=antes, tamano=por_pagina)
+        return await sync_to_async(_fragmento_catalogo)([Elemento._from_son(doc) for doc in docs], {
+            'parametros': urlencode(parametros),
+            'cursor_anterior': cursor_anterior,
+            'cursor_siguiente': cursor_siguiente
+        })
+
+    catalogo = await afragmento(request, 'catalogo', (GEN_CATALOGO, GEN_CATEGORIAS),
+                                dict(parametros, tipo=tipo, despues=despues or '', antes=antes or ''), generar_catalogo)
+
+    return await sync_to_async(_renderizar)(request, 'home.html', {
+        'catalogo': catalogo,
+        'categorias': await sync_to_async(views.obtener_categorias_limpias)(request, tipo),
+        'categoria_activa': categoria_activa,
+        'categoria_activa_id': str(categoria_activa.id) if categoria_activa else None,
+        'titulo_pagina': titulo_pagina,
+        'tipo': tipo
+    })
+
+
+@cachear_pagina_anonima(GEN_CATALOGO, GEN_CATEGORIAS)
+async def home(request):
+    return await listado_catalogo(request, 'P', 'Películas')
+
+
+@cachear_pagina_anonima(GEN_CATALOGO, GEN_CATEGORIAS)
+async def lista_series(request):
+    return await listado_catalogo(request, 'S', 'Series')
+
+
+# --- RANKING GLOBAL ---
+@cachear_pagina_anonima(GEN_CATALOGO, GEN_CATEGORIAS, ranking=True)
+async def ranking_global(request):
+    tipo, modo, categoria = await sync_to_async(views.filtros_ranking)(request)
+    categoria_id = categoria.id if categoria else None
+
+    async def generar_ranking():
+        doc = await coleccion(Clasificacion, catalogo=True).find_one(
+            {'modo': modo, 'tipo': tipo, 'categoria': categoria_id}, {'entradas': {'$slice': 50}})
+        if doc:
+            entradas = doc['entradas']
+        else:
+            entradas = await sync_to_async(clasificacion_en_vivo)(tipo, categoria_id, limite=50)
+        return render_to_string('fragmentos/ranking.html', {'ranking': entradas, 'modo': modo})
+
+    # Fragmento y categorías de la barra a la vez: no dependen uno de otro
+    ranking, categorias = await asyncio.gather(
+        afragmento(request, 'ranking', await adependencias_ranking(request),
+                   {'tipo': tipo, 'modo': modo, 'categoria': str(categoria_id or '')}, generar_ranking),
+        sync_to_async(views.obtener_categorias_limpias)(request, tipo),
+    )
+
+    return await sync_to_async(_renderizar)(request, 'ranking_global.html', {
+        'ranking': ranking,
+        'tipo_actual': tipo,
+        'modo_actual': modo,
+        'modos': MODOS,
+        'categorias': categorias,
+        'categoria_actual': str(categoria_id or '')
+    })
+
+
+# --- DETALLE ---
+async def _datos_del_usuario(usuario_id, elemento_id):
+    cursor = coleccion(Valoracion).aggregate(views.pipeline_datos_del_usuario(usuario_id, elemento_id))
+    return views.repartir_datos_del_usuario(await cursor.to_list(None))
+
+
+async def _sin_datos():
+    return None, []
+
+
+async def detalle_elemento(request, elemento_id):
+    if request.method == 'POST':
+        # Guardar una valoración es una escritura: la hace la vista síncrona
+        return await sync_to_async(views.detalle_elemento)(request, elemento_id)
+    if not ObjectId.is_valid(elemento_id):
+        raise Http404("El elemento no existe")
+    elemento_id = ObjectId(elemento_id)
+    usuario = await request.auser()
+
+    # Elemento, página de reseñas y datos del usuario no dependen entre sí: tres consultas a la vez
+    doc, (resenas, cursor_resenas), (valoracion_existente, user_rankings) = await asyncio.gather(
+        coleccion(Elemento).find_one({'_id': elemento_id}),
+        apaginar_por_fecha(coleccion(Valoracion), {'elemento': elemento_id},
+                           despues=request.GET.get('resenas'), tamano=settings.DETALLE_RESENAS_POR_PAGINA,
+                           proyeccion={'usuario_id': 1, 'puntuacion': 1, 'comentario': 1, 'fecha': 1}),
+        _datos_del_usuario(usuario.id, elemento_id) if usuario.is_authenticated else _sin_datos(),
+    )
+    if doc is None:
+        raise Http404("El elemento no existe")
+    elemento = Elemento._from_son(doc)
+
+    form = ValoracionForm()
+    if valoracion_existente:
+        form = ValoracionForm(initial={'puntuacion': valoracion_existente['puntuacion'],
+                                       'comentario': valoracion_existente.get('comentario')})
+
+    return await sync_to_async(_renderizar)(request, 'detalle.html', {
+        'elemento': elemento,
+        'valoraciones': [Valoracion._from_son(resena) for resena in resenas],
+        'cursor_resenas': cursor_resenas,
+        'primera_pagina_resenas': not request.GET.get('resenas'),
+        'form': form,
+        'promedio': elemento.resumen.promedio if elemento.resumen else 0,
+        'mi_valoracion': valoracion_existente,
+        'user_rankings': user_rankings
+    }, precarga=[elemento])